@@ -0,0 +1,273 @@
+# ann_index.py
+import math
+import time
+import numpy as np
+import faiss
+from typing import List, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf-flat", "hnsw", "ivf-pq")
+
+# Below this many chunks an exact flat scan is as fast as any ANN structure
+FLAT_MAX_VECTORS = 10_000
+HNSW_MAX_VECTORS = 2_000_000
+HNSW_M = 32
+HNSW_MAX_FILTERED_EF = 2048
+
+def estimate_memory_mb(index_type: str, num_vectors: int, dimension: int) -> float:
+    """Rough resident size of an index in megabytes"""
+    if index_type == "hnsw":
+        per_vector = dimension * 4 + HNSW_M * 2 * 4
+    elif index_type == "ivf-pq":
+        per_vector = _pq_subquantizers(dimension) + 8
+    else:
+        per_vector = dimension * 4 + (8 if index_type == "ivf-flat" else 0)
+    return num_vectors * per_vector / 1e6
+
+def index_type_of(index) -> str:
+    """Which of INDEX_TYPES a built (optionally id-mapped) index is"""
+    base = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    name = type(base).__name__
+    if hasattr(base, "hnsw"):
+        return "hnsw"
+    if name.startswith("IndexIVF"):
+        return "ivf-pq" if "PQ" in name else "ivf-flat"
+    return "flat"
+
+def index_memory_bytes(index) -> int:
+    """Rough resident size of a built (optionally id-mapped) index in bytes"""
+    if index is None:
+        return 0
+    id_bytes = 16 * index.ntotal if hasattr(index, "id_map") else 0  # id map and its reverse lookup
+    return int(estimate_memory_mb(index_type_of(index), index.ntotal, index.d) * 1e6) + id_bytes
+
+def choose_index_type(num_vectors: int, dimension: int, memory_budget_mb: Optional[float] = None) -> str:
+    """
+    Pick an index type for a corpus
+
+    Args:
+        num_vectors: Number of chunks to index
+        dimension: Embedding dimension
+        memory_budget_mb: Optional memory cap for the index
+
+    Returns:
+        One of INDEX_TYPES
+    """
+    def fits(index_type):
+        return memory_budget_mb is None or estimate_memory_mb(index_type, num_vectors, dimension) <= memory_budget_mb
+
+    if num_vectors <= FLAT_MAX_VECTORS and fits("flat"):
+        return "flat"
+    if num_vectors <= HNSW_MAX_VECTORS and fits("hnsw"):
+        return "hnsw"
+    if fits("ivf-flat"):
+        return "ivf-flat"
+    return "ivf-pq"
+
+def _pq_subquantizers(dimension: int) -> int:
+    # Largest common sub-quantizer count dividing the dimension with >= 4 dims per sub-vector
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if dimension % m == 0 and dimension // m >= 4:
+            return m
+    return 1
+
+def _ivf_lists(num_vectors: int) -> int:
+    # ~4*sqrt(n) lists, keeping >= 39 training points per list as faiss recommends
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+def build_index(embeddings: np.ndarray, index_type: str = "auto", memory_budget_mb: Optional[float] = None,
+                nprobe: Optional[int] = None, ef_search: int = 64, ids: Optional[np.ndarray] = None):
+    """
+    Build and train an inner-product FAISS index over normalized embeddings
+
+    Args:
+        embeddings: float32 array of L2-normalized embeddings
+        index_type: One of INDEX_TYPES, or "auto" to choose by corpus size and memory budget
+        memory_budget_mb: Memory cap used by "auto"
+        nprobe: IVF lists visited per search (default: nlist / 16, at least 1)
+        ef_search: HNSW search breadth
+        ids: Optional int64 ids; the index is then wrapped in an IndexIDMap2 so vectors
+            can be updated and removed by id
+
+    Returns:
+        Populated FAISS index
+    """
+    num_vectors, dimension = embeddings.shape
+    if index_type == "auto":
+        index_type = choose_index_type(num_vectors, dimension, memory_budget_mb)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = ef_search
+    elif index_type in ("ivf-flat", "ivf-pq"):
+        nlist = _ivf_lists(num_vectors)
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == "ivf-flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            # 8-bit codes need 256 centroids per sub-quantizer; use fewer bits for small corpora
+            nbits = max(1, min(8, int(math.log2(max(2, num_vectors // 39)))))
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_subquantizers(dimension), nbits,
+                                     faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = nprobe or max(1, nlist // 16)
+    else:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from: auto, {', '.join(INDEX_TYPES)}")
+
+    if not index.is_trained:
+        start = time.perf_counter()
+        index.train(embeddings)
+        logger.info(f"Trained {index_type} index on {num_vectors} vectors in {time.perf_counter() - start:.2f}s")
+
+    if ids is None:
+        index.add(embeddings)
+        return index
+
+    id_map = faiss.IndexIDMap2(index)
+    id_map.add_with_ids(embeddings, np.ascontiguousarray(ids, dtype='int64'))
+    return id_map
+
+def rebuild_index(index, index_type: str = "auto", memory_budget_mb: Optional[float] = None):
+    """
+    Rebuild an id-mapped index from its own vectors, e.g. as another index type
+
+    Vectors are reconstructed rather than re-embedded (approximately, for PQ codes);
+    ids are kept.
+    """
+    try:
+        # IVF lists need a direct map to reconstruct by id; removals leave gaps, hence a hash table
+        faiss.extract_index_ivf(faiss.downcast_index(index.index)).set_direct_map_type(faiss.DirectMap.Hashtable)
+    except (RuntimeError, AttributeError):
+        pass
+    ids = faiss.vector_to_array(index.id_map).astype('int64')
+    vectors = np.vstack([index.reconstruct(int(vector_id)) for vector_id in ids]).astype('float32')
+    return build_index(vectors, index_type, memory_budget_mb, ids=ids)
+
+def supports_remove(index) -> bool:
+    """Whether vectors can be removed from an index in place (HNSW graphs cannot)"""
+    base = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    return not hasattr(base, "hnsw")
+
+def search_parameters(index, selector, selectivity: float = 1.0):
+    """
+    Search parameters restricting a search to the ids accepted by `selector`
+
+    The parameter type must match the underlying index. IVF lists probed and
+    HNSW search breadth are widened by 1 / selectivity, since with a selective
+    filter most visited candidates are rejected and results would come up short.
+
+    Args:
+        index: Index that will be searched
+        selector: faiss.IDSelector over the allowed ids
+        selectivity: Fraction of the indexed vectors the selector accepts
+    """
+    widen = 1.0 / max(selectivity, 1e-6)
+    base = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if hasattr(base, "hnsw"):
+        ef_search = min(HNSW_MAX_FILTERED_EF, math.ceil(base.hnsw.efSearch * widen))
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(ef_search, base.hnsw.efSearch))
+    try:
+        ivf = faiss.extract_index_ivf(base)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(ivf.nlist, math.ceil(ivf.nprobe * widen)))
+    except (RuntimeError, AttributeError):
+        return faiss.SearchParameters(sel=selector)
+
+def describe_index(index) -> Dict:
+    """Summarize an index for status endpoints"""
+    if index is None:
+        return {}
+    base = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    info = {"type": type(base).__name__, "ntotal": int(index.ntotal), "dimension": int(index.d)}
+    try:
+        ivf = faiss.extract_index_ivf(base)
+        info.update({"nlist": int(ivf.nlist), "nprobe": int(ivf.nprobe)})
+    except (RuntimeError, AttributeError):
+        pass
+    if hasattr(base, "hnsw"):
+        info["ef_search"] = int(base.hnsw.efSearch)
+    return info
+
+def recall_latency_report(embeddings: np.ndarray, queries: np.ndarray, k: int = 10,
+                          index_types=INDEX_TYPES) -> List[Dict]:
+    """
+    Measure recall@k and per-query latency of each index type against the exact flat baseline
+
+    Args:
+        embeddings: L2-normalized corpus embeddings
+        queries: L2-normalized query embeddings
+        k: Number of neighbours compared
+        index_types: Index types to evaluate
+
+    Returns:
+        One dictionary per index type with recall, latency percentiles, build time and size
+    """
+    ground_truth = build_index(embeddings, "flat").search(queries, k)[1]
+    report = []
+    for index_type in index_types:
+        try:
+            start = time.perf_counter()
+            index = build_index(embeddings, index_type)
+            build_seconds = time.perf_counter() - start
+        except Exception as e:
+            report.append({"index_type": index_type, "error": str(e)})
+            continue
+
+        latencies = []
+        found = np.empty_like(ground_truth)
+        for i in range(len(queries)):
+            start = time.perf_counter()
+            found[i] = index.search(queries[i:i + 1], k)[1][0]
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        recall = np.mean([len(set(found[i]) & set(ground_truth[i])) / k for i in range(len(queries))])
+        report.append({
+            "index_type": index_type,
+            "recall_at_k": float(recall),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "build_seconds": build_seconds,
+            "size_mb": faiss.serialize_index(index).nbytes / 1e6
+        })
+    return report
+
+def synthetic_embeddings(num_vectors: int, dimension: int = 384, clusters: int = 100, seed: int = 0) -> np.ndarray:
+    """Clustered random unit vectors that mimic the structure of real text embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype('float32')
+    vectors = centers[rng.integers(0, clusters, num_vectors)] + 0.5 * rng.standard_normal((num_vectors, dimension)).astype('float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+# Recall-vs-latency report, e.g. `python ann_index.py --vectors 200000 --queries 500`
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Compare FAISS index types against the flat baseline")
+    parser.add_argument("--vectors", type=int, default=50_000, help="Synthetic corpus size")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    # Queries are drawn from the same distribution as the corpus and held out of it
+    vectors = synthetic_embeddings(args.vectors + args.queries, args.dimension)
+    corpus, queries = vectors[:args.vectors], vectors[args.vectors:]
+    results = recall_latency_report(corpus, queries, args.k)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{args.vectors} vectors, dim {args.dimension}, recall@{args.k} vs flat "
+              f"(auto picks: {choose_index_type(args.vectors, args.dimension)})")
+        for row in results:
+            if "error" in row:
+                print(f"  {row['index_type']:<9} failed: {row['error']}")
+            else:
+                print(f"  {row['index_type']:<9} recall {row['recall_at_k']:.3f}  p50 {row['p50_ms']:.3f}ms  "
+                      f"p95 {row['p95_ms']:.3f}ms  build {row['build_seconds']:.1f}s  size {row['size_mb']:.1f}MB")
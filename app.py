@@ -1,13 +1,28 @@
 # app.py - Updated with RAG integration
-from flask import Flask, request, jsonify, send_from_directory, render_template
-import google.generativeai as genai
+import time
+_import_start = time.perf_counter()
+
+from flask import Flask, request, jsonify, send_from_directory, render_template, Response, stream_with_context, g, abort
 import os
-import smtplib
-from email.mime.text import MIMEText
+import json
 from flask_cors import CORS  
 from dotenv import load_dotenv
-from rag_system import RAGSystem
+from rag_system import RAGSystem, RetrievalResult, AssembledContext, estimate_tokens
+from ann_index import describe_index
+from response_cache import SemanticResponseCache
+from outbox import EmailOutbox, OutboxSender
+from metrics import registry, stage_timer, observe_stage
+from static_assets import StaticAssets
+from kb_registry import KnowledgeBaseRegistry, UnknownKnowledgeBaseError
+from upstream_guard import UpstreamGuard, UpstreamUnavailable
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 import logging
+import queue
+import threading
+from typing import Optional, Tuple
+
+# Startup phase timings in milliseconds, reported on /rag/status
+startup_timings = {"imports": (time.perf_counter() - _import_start) * 1000}
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,21 +31,276 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env
 load_dotenv()
 
-app = Flask(__name__, static_folder="static", template_folder="templates")
+# No built-in static route: /static/ goes through serve_static so built files are served precompressed
+app = Flask(__name__, static_folder=None, template_folder="templates")
 CORS(app)  
 
+# Private runtime data such as queued contact messages; must never be inside a served directory
+DATA_DIR = os.getenv("DATA_DIR", "data")
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# LLM_BACKEND=fake swaps Gemini for the local stub in fake_llm.py (benchmarks and load tests)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
 # Load Gemini API Key securely from environment variable
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
+if not GEMINI_API_KEY and LLM_BACKEND != "fake":
     raise ValueError("Missing GEMINI_API_KEY. Set it as an environment variable.")
 
-genai.configure(api_key=GEMINI_API_KEY)
+_llm = None
+_llm_lock = threading.Lock()
 
-# Load the model 
-model = genai.GenerativeModel("gemini-1.5-flash")
+def get_llm():
+    """Return the Gemini model, importing and configuring the client on first use"""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                start = time.perf_counter()
+                if LLM_BACKEND == "fake":
+                    from fake_llm import FakeGenerativeModel
+                    _llm = FakeGenerativeModel()
+                else:
+                    import google.generativeai as genai
+                    genai.configure(api_key=GEMINI_API_KEY)
+                    _llm = genai.GenerativeModel("gemini-1.5-flash")
+                startup_timings["llm_client"] = (time.perf_counter() - start) * 1000
+    return _llm
 
-# Initialize RAG system
-rag_system = RAGSystem()
+# Admission control for Gemini: bounded concurrency and wait queue, a per-call deadline and a
+# circuit breaker. Shed calls get a retrieval-only answer instead of queueing behind a slow upstream.
+llm_guard = UpstreamGuard(
+    "llm",
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "16")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_S", "2")),
+    deadline=float(os.getenv("LLM_DEADLINE_S", "20")),
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    recovery_time=float(os.getenv("LLM_BREAKER_RECOVERY_S", "30"))
+)
+
+# Initialize RAG system (the embedding model itself loads lazily)
+_rag_start = time.perf_counter()
+# Index and retrieval settings, shared by every knowledge base
+rag_options = dict(
+    cache_size=int(os.getenv("RAG_CACHE_SIZE", "256")),
+    cache_ttl=float(os.getenv("RAG_CACHE_TTL")) if os.getenv("RAG_CACHE_TTL") else None,
+    index_type=os.getenv("RAG_INDEX_TYPE", "auto"),
+    memory_budget_mb=float(os.getenv("RAG_INDEX_MEMORY_MB")) if os.getenv("RAG_INDEX_MEMORY_MB") else None,
+    build_workers=int(os.getenv("RAG_BUILD_WORKERS", "1")),
+    retrieval_mode=os.getenv("RAG_RETRIEVAL_MODE", "dense"),
+    min_score=float(os.getenv("RAG_MIN_SCORE", "0.2")),
+    rerank=os.getenv("RAG_RERANK", "0") == "1",
+    rerank_candidates=int(os.getenv("RAG_RERANK_CANDIDATES", "20")),
+    rerank_budget_ms=float(os.getenv("RAG_RERANK_BUDGET_MS", "150"))
+)
+rag_system = RAGSystem(
+    embedding_backend=os.getenv("RAG_EMBEDDING_BACKEND", "sentence-transformers"),
+    max_concurrent_encodes=int(os.getenv("RAG_MAX_CONCURRENT_ENCODES", "2")),
+    reranker_model=os.getenv("RAG_RERANK_MODEL"),
+    **rag_options
+)
+startup_timings["rag_init"] = (time.perf_counter() - _rag_start) * 1000
+
+# Further named knowledge bases ("kb" in chat requests), opened lazily and encoding through rag_system
+kb_registry = KnowledgeBaseRegistry(
+    rag_system,
+    root_dir=os.getenv("RAG_KB_DIR", "knowledge_bases"),
+    memory_budget_mb=float(os.getenv("RAG_KB_MEMORY_MB", "512")),
+    rag_options=rag_options
+)
+
+def warm_up(mode: str):
+    """
+    Warm heavy dependencies according to RAG_WARMUP:
+        background - load the embedding model and Gemini client in a thread while serving (default)
+        eager      - load both before the app starts serving
+        preload    - load model weights only; use with gunicorn preload_app so forked
+                     workers share them copy-on-write (see gunicorn.conf.py)
+        lazy       - load on the first request that needs them
+    """
+    if mode == "lazy":
+        return
+    if mode == "preload":
+        rag_system.warm_up(encode=False)
+        return
+    if mode == "eager":
+        rag_system.warm_up()
+        get_llm()
+        return
+    rag_system.warm_up(background=True)
+    threading.Thread(target=get_llm, name="llm-warmup", daemon=True).start()
+
+warm_up(os.getenv("RAG_WARMUP", "background"))
+
+class RetrievalBatcher:
+    """
+    Coalesce concurrent retrieval requests into one batched encode + FAISS search.
+    
+    Requests that arrive within `window_ms` of the first queued request are
+    collected (up to `max_batch_size`) and served by one
+    `RAGSystem.retrieve_batch` call per knowledge base on a background thread.
+    The thread only runs the first stage; cross-encoder reranking happens in
+    `finish` on the caller's thread, so one slow rerank never holds up the batch.
+    """
+    
+    def __init__(self, rag: RAGSystem, window_ms: float = 5.0, max_batch_size: int = 32, timeout: float = 30.0):
+        self.rag = rag
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout  # longest a blocking `retrieve` waits for the batch thread
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+    
+    def submit(self, query: str, top_k: int = 3, rag: Optional[RAGSystem] = None) -> Future:
+        """
+        Queue a query and return a Future resolving to its first-stage RetrievalResult
+        
+        The Future can be awaited from asyncio code with `asyncio.wrap_future`;
+        pass the result to `finish` for the final top_k.
+        
+        Args:
+            rag: Knowledge base to search (default: the batcher's RAGSystem); when it
+                reranks, the result holds its `candidate_count` first-stage chunks
+        """
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((query, top_k, future, rag or self.rag))
+        return future
+    
+    def finish(self, candidates: RetrievalResult, top_k: int = 3, rag: Optional[RAGSystem] = None) -> RetrievalResult:
+        """Rerank a result from `submit` when its knowledge base reranks, and keep the best top_k"""
+        rag = rag or self.rag
+        if rag.rerank:
+            return rag.rerank_results([candidates], top_k)[0]
+        return candidates.truncate(top_k)
+    
+    def retrieve(self, query: str, top_k: int = 3, rag: Optional[RAGSystem] = None) -> RetrievalResult:
+        """
+        Blocking equivalent of `RAGSystem.retrieve` served through the batcher
+        
+        Raises:
+            concurrent.futures.TimeoutError: If the batch thread did not answer within `timeout`
+        """
+        future = self.submit(query, top_k, rag)
+        try:
+            candidates = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()  # Dropped from the batch if it has not started yet
+            raise
+        return self.finish(candidates, top_k, rag)
+    
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="retrieval-batcher", daemon=True)
+                self._worker.start()
+    
+    def _collect_batch(self, batch: list):
+        """Fill `batch` in place, so the caller can fail what was dequeued if this raises"""
+        batch.append(self._queue.get())
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+    
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                self._collect_batch(batch)
+                # Skip requests whose callers already gave up
+                batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+                groups = {}
+                for item in batch:
+                    groups.setdefault(id(item[3]), []).append(item)
+                for group in groups.values():
+                    self._retrieve_group(group)
+            except Exception as e:
+                # Keep the thread alive; fail this batch's callers instead of leaving them waiting
+                logger.error(f"Retrieval batcher error, failing {len(batch)} queued queries: {e}")
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    def _retrieve_group(self, group):
+        # Search once with the largest top_k; results are ordered so smaller requests slice
+        rag = group[0][3]
+        top_k = max(rag.candidate_count(item_top_k) for _, item_top_k, _, _ in group)
+        try:
+            results = rag.retrieve_batch([query for query, _, _, _ in group], top_k=top_k, rerank=False)
+        except Exception as e:
+            logger.error(f"Batched retrieval failed for {len(group)} queries: {e}")
+            for _, _, future, _ in group:
+                future.set_exception(e)
+            return
+        for (_, item_top_k, future, _), result in zip(group, results):
+            future.set_result(result.truncate(rag.candidate_count(item_top_k)))
+
+# Semantic answer cache; it holds visitors' questions, so it lives in the private data directory
+response_cache = SemanticResponseCache(
+    index_file=os.path.join(DATA_DIR, "response_cache.bin"),
+    entries_file=os.path.join(DATA_DIR, "response_cache.json"),
+    threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "500")),
+    flush_interval=float(os.getenv("RESPONSE_CACHE_FLUSH_S", "5"))
+)
+
+retrieval_batcher = RetrievalBatcher(
+    rag_system,
+    window_ms=float(os.getenv("RAG_BATCH_WINDOW_MS", "5")),
+    max_batch_size=int(os.getenv("RAG_MAX_BATCH_SIZE", "32")),
+    timeout=float(os.getenv("RAG_RETRIEVAL_TIMEOUT_S", "30"))
+)
+
+# Request metrics; component state is read at scrape time so the request path only pays for timers
+IN_FLIGHT = registry.gauge("http_requests_in_flight", "Requests currently being served", ("endpoint",))
+REQUEST_SECONDS = registry.histogram("http_request_duration_seconds", "HTTP request duration in seconds",
+                                     ("endpoint", "status"))
+
+def cache_hit_rates():
+    stats = rag_system.cache_stats()
+    return {
+        ("embedding",): stats["embedding_cache"]["hit_rate"],
+        ("retrieval",): stats["retrieval_cache"]["hit_rate"],
+        ("response",): response_cache.stats()["hit_rate"]
+    }
+
+registry.gauge("rag_cache_hit_rate", "Hit rate of each cache since startup", ("cache",), callback=cache_hit_rates)
+registry.gauge("rag_index_vectors", "Vectors in the FAISS index",
+               callback=lambda: rag_system.index.ntotal if rag_system.index is not None else 0)
+registry.gauge("rag_index_chunks", "Chunks in the chunk store", callback=lambda: len(rag_system.chunks))
+registry.gauge("rag_index_version", "Version of the served index", callback=lambda: rag_system.index_version)
+registry.gauge("rag_model_loaded", "Whether the embedding model is loaded", callback=lambda: int(rag_system.model_loaded))
+registry.gauge("rag_encodes_active", "Encode calls holding one of the concurrency slots",
+               callback=lambda: rag_system.concurrency_stats()["encodes_active"])
+registry.gauge("rag_encodes_waiting", "Encode calls queued for a concurrency slot",
+               callback=lambda: rag_system.concurrency_stats()["encodes_waiting"])
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.endpoint = request.endpoint or "unknown"
+    IN_FLIGHT.inc(g.endpoint)
+
+@app.after_request
+def record_request_duration(response):
+    if "request_start" in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, g.endpoint, str(response.status_code))
+    return response
+
+@app.teardown_request
+def finish_request(exc=None):
+    if "endpoint" in g:
+        IN_FLIGHT.dec(g.endpoint)
 
 def initialize_rag():
     """Initialize RAG system on startup"""
@@ -43,27 +313,15 @@ def initialize_rag():
         logger.error(f"Failed to initialize RAG system: {e}")
         return False
 
-def generate_rag_prompt(user_question: str, max_chunks: int = 3) -> str:
-    """
-    Generate prompt using RAG - retrieve relevant chunks and create focused prompt
-    
-    Args:
-        user_question: User's question
-        max_chunks: Maximum number of relevant chunks to retrieve
-        
-    Returns:
-        Optimized prompt with only relevant context
-    """
-    try:
-        # Retrieve relevant context using RAG
-        relevant_context = rag_system.generate_context(user_question, top_k=max_chunks)
-        
-        prompt = f"""
+# Hard cap on the estimated size of the RAG prompt sent to Gemini
+PROMPT_TOKEN_BUDGET = int(os.getenv("RAG_PROMPT_TOKEN_BUDGET", "1024"))
+
+RAG_PROMPT_TEMPLATE = """
 Based on the following relevant information about Devendra Bainda:
 
-{relevant_context}
+{context}
 
-User Question: "{user_question}"
+User Question: "{question}"
 
 Instructions:
 1. Answer the user's question using ONLY the provided relevant information above
@@ -74,8 +332,51 @@ Instructions:
 
 Provide a helpful and professional response:
 """
+
+def build_rag_prompt(user_question: str, retrieval: RetrievalResult, max_prompt_tokens: int = PROMPT_TOKEN_BUDGET,
+                     rag: Optional[RAGSystem] = None) -> Tuple[str, AssembledContext]:
+    """
+    Build the RAG prompt within a token budget
+    
+    Args:
+        user_question: User's question
+        retrieval: Retrieved chunks for the question
+        max_prompt_tokens: Budget for the whole prompt; the context gets what the template and question leave
+        rag: Knowledge base the chunks came from (default: rag_system)
+        
+    Returns:
+        Tuple (prompt, assembled context with token statistics)
+    """
+    overhead = estimate_tokens(RAG_PROMPT_TEMPLATE.format(context="", question=user_question))
+    assembled = (rag or rag_system).assemble_context(retrieval, max_tokens=max(0, max_prompt_tokens - overhead))
+    prompt = RAG_PROMPT_TEMPLATE.format(context=assembled.text, question=user_question)
+    assembled.stats["prompt_tokens"] = estimate_tokens(prompt)
+    
+    stats = assembled.stats
+    logger.info(f"Context for '{user_question[:50]}...': {stats['chunks_used']}/{stats['chunks_retrieved']} chunks, "
+                f"{stats['context_tokens']} tokens ({stats['tokens_saved']} saved; {stats['dropped_low_score']} below "
+                f"score cutoff, {stats['dropped_redundant']} redundant, {stats['dropped_budget']} over budget)")
+    return prompt, assembled
+
+def generate_rag_prompt(user_question: str, max_chunks: int = 3, retrieval: RetrievalResult = None,
+                        rag: Optional[RAGSystem] = None) -> str:
+    """
+    Generate prompt using RAG - retrieve relevant chunks and create focused prompt
+    
+    Args:
+        user_question: User's question
+        max_chunks: Maximum number of relevant chunks to retrieve
+        retrieval: Already-retrieved chunks for the question; skips a second retrieval
+        rag: Knowledge base to answer from (default: rag_system)
         
-        logger.info(f"Generated RAG prompt for question: '{user_question[:50]}...'")
+    Returns:
+        Optimized prompt with only relevant context
+    """
+    try:
+        # Retrieve relevant context using RAG (coalesced with concurrent requests)
+        if retrieval is None:
+            retrieval = retrieval_batcher.retrieve(user_question, top_k=max_chunks, rag=rag)
+        prompt, _ = build_rag_prompt(user_question, retrieval, rag=rag)
         return prompt
         
     except Exception as e:
@@ -89,13 +390,55 @@ Provide a helpful and professional response:
         Please ask about his skills, projects, education, or contact information, and I'll do my best to help.
         """
 
+DEGRADED_CONTEXT_TOKENS = 400
+DEGRADED_RESPONSE = ("The AI assistant is busy right now, so here is the most relevant information I found "
+                     "for your question:\n\n{context}")
+DEGRADED_EMPTY_RESPONSE = "The AI assistant is busy right now. Please try again in a moment."
+
+def degraded_answer(user_question: str, retrieval: RetrievalResult, rag: Optional[RAGSystem] = None) -> str:
+    """
+    Retrieval-only answer served when the LLM call is shed or misses its deadline
+    
+    Args:
+        user_question: User's question
+        retrieval: Retrieved chunks for the question
+        rag: Knowledge base the chunks came from (default: rag_system)
+        
+    Returns:
+        The best matching excerpts with a short notice, without calling the LLM
+    """
+    # Same selection as the LLM context (score cutoff, de-duplication, budget), without the "[Context n]" labels
+    assembled = (rag or rag_system).assemble_context(retrieval, max_tokens=DEGRADED_CONTEXT_TOKENS)
+    if not assembled.chunks:
+        return DEGRADED_EMPTY_RESPONSE
+    return DEGRADED_RESPONSE.format(context="\n\n".join(assembled.chunks))
+
+# Fingerprinted, precompressed front end built by `python static_assets.py`, served from memory
+static_assets = StaticAssets(os.getenv("STATIC_DIST_DIR", "dist"))
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    response = static_assets.page_response("index.html")
+    return response if response is not None else render_template('index.html')
+
+@app.route("/assets/<path:filename>")
+def hashed_asset(filename):
+    response = static_assets.asset_response(filename)
+    if response is None:
+        abort(404)
+    return response
+
+@app.route("/static/<path:filename>", endpoint="static")
+def serve_static(filename):
+    response = static_assets.source_response(filename)
+    return response if response is not None else send_from_directory("static", filename)
 
 @app.route("/<path:filename>")
 def serve_files(filename):
-    return send_from_directory(".", filename)   
+    # Only the front end is public: the project root also holds indexes, caches and private data
+    if filename.startswith("dist/"):
+        return send_from_directory(static_assets.dist_dir, filename[len("dist/"):])
+    return serve_static(filename)
 
 @app.route("/chatbot", methods=["POST"])
 def chatbot():
@@ -108,17 +451,42 @@ def chatbot():
         return jsonify({"error": "No question provided"}), 400
 
     try:
-        # Use RAG to generate focused prompt
-        prompt = generate_rag_prompt(user_question)
+        # "kb" selects a named knowledge base; answers are cached per retrieved context, so they never cross KBs
+        rag = kb_registry.get(data.get("kb"))
+        
+        # Serve near-duplicate questions with the same retrieved context from the answer cache
+        with stage_timer("retrieval"):
+            retrieval = retrieval_batcher.retrieve(user_question, top_k=3, rag=rag)
+        with stage_timer("response_cache"):
+            context_key = SemanticResponseCache.context_key(retrieval)
+            cached_answer = response_cache.lookup(retrieval.embedding, context_key)
+        if cached_answer is not None:
+            return jsonify({"response": cached_answer, "cached": True})
         
-        # Generate response using Gemini
-        response = model.generate_content(prompt)
+        # Use RAG to generate focused prompt from the same retrieval
+        with stage_timer("prompt_build"):
+            prompt = generate_rag_prompt(user_question, retrieval=retrieval, rag=rag)
+        
+        # Generate response using Gemini; when it is saturated or failing, answer from retrieval alone
+        start = time.perf_counter()
+        try:
+            response = llm_guard.call(get_llm().generate_content, prompt)
+        except UpstreamUnavailable as e:
+            logger.warning(f"Serving retrieval-only answer: {e}")
+            return jsonify({"response": degraded_answer(user_question, retrieval, rag), "degraded": True,
+                            "reason": e.reason})
+        # Only answered calls count as LLM latency; shed and timed-out calls are in upstream_shed/calls_total
+        observe_stage("llm", time.perf_counter() - start)
+        response_cache.store(user_question, retrieval.embedding, context_key, response.text)
         
         # Log successful interaction
         logger.info(f"Successfully processed question: '{user_question[:30]}...'")
         
-        return jsonify({"response": response.text})
+        with stage_timer("serialize"):
+            return jsonify({"response": response.text})
         
+    except UnknownKnowledgeBaseError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         logger.error(f"Error generating response: {str(e)}")
         return jsonify({
@@ -126,6 +494,85 @@ def chatbot():
             "response": "Sorry, I'm having trouble connecting right now. Please try again later."
         }), 500
 
+def sse_event(payload: dict, event: str = None) -> str:
+    """Format a server-sent event carrying a JSON payload"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+@app.route("/chatbot/stream", methods=["POST"])
+def chatbot_stream():
+    """Stream the answer to the browser token by token as server-sent events"""
+    data = request.json
+    user_question = data.get("question") or data.get("message")
+    
+    if not user_question:
+        return jsonify({"error": "No question provided"}), 400
+
+    try:
+        rag = kb_registry.get(data.get("kb"))
+        with stage_timer("retrieval"):
+            retrieval = retrieval_batcher.retrieve(user_question, top_k=3, rag=rag)
+        with stage_timer("response_cache"):
+            context_key = SemanticResponseCache.context_key(retrieval)
+            cached_answer = response_cache.lookup(retrieval.embedding, context_key)
+        with stage_timer("prompt_build"):
+            prompt = None if cached_answer is not None else generate_rag_prompt(user_question, retrieval=retrieval, rag=rag)
+    except UnknownKnowledgeBaseError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error preparing streamed response: {str(e)}")
+        return jsonify({
+            "error": str(e),
+            "response": "Sorry, I'm having trouble connecting right now. Please try again later."
+        }), 500
+
+    def generate():
+        if cached_answer is not None:
+            yield sse_event({"token": cached_answer})
+            yield sse_event({"cached": True}, event="done")
+            return
+        
+        parts = []
+        start = time.perf_counter()
+        chunks = None
+        try:
+            try:
+                # Admission, the circuit and the first chunk are settled before any token is sent
+                chunks = llm_guard.stream(lambda: get_llm().generate_content(prompt, stream=True))
+            except UpstreamUnavailable as e:
+                logger.warning(f"Streaming retrieval-only answer: {e}")
+                yield sse_event({"token": degraded_answer(user_question, retrieval, rag)})
+                yield sse_event({"cached": False, "degraded": True, "reason": e.reason}, event="done")
+                return
+            # Forward tokens as soon as Gemini produces them
+            for chunk in chunks:
+                text = chunk.text
+                if text:
+                    if not parts:
+                        observe_stage("llm_first_token", time.perf_counter() - start)
+                    parts.append(text)
+                    yield sse_event({"token": text})
+            observe_stage("llm", time.perf_counter() - start)
+            
+            response_cache.store(user_question, retrieval.embedding, context_key, "".join(parts))
+            logger.info(f"Successfully streamed answer to question: '{user_question[:30]}...'")
+            yield sse_event({"cached": False}, event="done")
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            yield sse_event({
+                "error": str(e),
+                "response": "Sorry, I'm having trouble connecting right now. Please try again later."
+            }, event="error")
+        finally:
+            # Frees the concurrency slot if the client disconnected mid-stream
+            if chunks is not None:
+                chunks.close()
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Disable proxy buffering so tokens reach the browser immediately
+    })
+
 @app.route("/chatbot/debug", methods=["POST"])
 def chatbot_debug():
     """Debug endpoint to see RAG retrieval results"""
@@ -136,36 +583,62 @@ def chatbot_debug():
         return jsonify({"error": "No question provided"}), 400
 
     try:
-        # Get relevant chunks for debugging
-        relevant_chunks = rag_system.retrieve_relevant_chunks(user_question, top_k=3)
-        
-        debug_info = {
-            "query": user_question,
-            "retrieved_chunks": [
-                {
-                    "content": chunk[:200] + "..." if len(chunk) > 200 else chunk,
-                    "similarity_score": score,
-                    "metadata": metadata
-                }
-                for chunk, score, metadata in relevant_chunks
-            ],
-            "context": rag_system.generate_context(user_question, top_k=3)
-        }
+        # Retrieve once and build the context from the same result; "mode" picks dense, lexical or hybrid,
+        # "section", "category" and "min_importance" restrict the search and "rerank" toggles the cross-encoder
+        filters = {"section": data.get("section"), "category": data.get("category"),
+                   "min_importance": data.get("min_importance")}
+        # JSON or form-style flags: "false" and "0" must not switch the rerank on
+        rerank = None if data.get("rerank") is None else str(data["rerank"]).lower() in ("1", "true", "yes")
+        rag = kb_registry.get(data.get("kb"))
+        retrieval = rag.retrieve(user_question, top_k=3, mode=data.get("mode"), rerank=rerank, **filters)
+        
+        debug_info = retrieval.to_dict(preview_chars=200)
+        debug_info["kb"] = data.get("kb") or kb_registry.default_name
+        if retrieval.rerank is not None:
+            # First-stage top 3 for comparison (reuses the cached query embedding)
+            first_stage = rag.retrieve(user_question, top_k=3, mode=data.get("mode"), rerank=False, **filters)
+            debug_info["first_stage"] = first_stage.to_dict(preview_chars=200)["retrieved_chunks"]
+        _, assembled = build_rag_prompt(user_question, retrieval, rag=rag)
+        debug_info["context"] = assembled.text
+        debug_info["context_assembly"] = assembled.stats
         
         return jsonify(debug_info)
         
+    except UnknownKnowledgeBaseError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of stage latencies, request counts and cache/index state (per process)"""
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/rag/status")
 def rag_status():
     """Check RAG system status"""
     try:
         status = {
             "rag_initialized": rag_system.index is not None,
+            "index": describe_index(rag_system.index),
             "total_chunks": len(rag_system.chunks),
             "index_file_exists": os.path.exists(rag_system.index_file),
-            "chunks_file_exists": os.path.exists(rag_system.chunks_file)
+            "chunks_file_exists": os.path.exists(rag_system.chunks_file),
+            "model_loaded": rag_system.model_loaded,
+            "embedding_backend": rag_system.embedding_backend,
+            "retrieval_mode": rag_system.retrieval_mode,
+            "lexical_index": rag_system.lexical_index.stats() if rag_system.lexical_index else None,
+            "startup_timings_ms": {"app": startup_timings, "rag": rag_system.startup_timings},
+            "cache": rag_system.cache_stats(),
+            "concurrency": rag_system.concurrency_stats(),
+            # Polling status must not create the reranker (and its executor) when rerank is off
+            "reranker": {"enabled": rag_system.rerank, "candidates": rag_system.rerank_candidates,
+                         **(rag_system.reranker.stats() if rag_system.rerank or rag_system.reranker_loaded else {})},
+            "response_cache": response_cache.stats(),
+            "knowledge_bases": kb_registry.stats(),
+            "upstream": llm_guard.stats()
         }
         return jsonify(status)
     except Exception as e:
@@ -173,13 +646,52 @@ def rag_status():
 
 @app.route("/rag/reinitialize", methods=["POST"])
 def reinitialize_rag():
-    """Reinitialize RAG system (useful for updates)"""
+    """
+    Reinitialize RAG system (useful for updates)
+    
+    Only new or edited chunks are re-embedded; pass ?full=1 to rebuild the index from scratch.
+    """
     try:
-        rag_system.create_embeddings(force_recreate=True)
-        return jsonify({"message": "RAG system reinitialized successfully"})
+        if request.args.get("full") == "1":
+            rag_system.create_embeddings(force_recreate=True)
+            return jsonify({"message": "RAG system rebuilt successfully"})
+        
+        stats = rag_system.refresh_builtin_chunks()
+        return jsonify({"message": "RAG system reinitialized successfully", "update": stats})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def email_credentials():
+    """Return (sender_email, sender_password, receiver_email) from the environment"""
+    sender_email = os.getenv("SENDER_EMAIL")
+    sender_password = os.getenv("SENDER_PASSWORD")
+    receiver_email = os.getenv("RECEIVER_EMAIL", sender_email)
+    return sender_email, sender_password, receiver_email
+
+# Contact messages are queued in a persistent outbox and sent by a background worker
+email_outbox = EmailOutbox(os.getenv("OUTBOX_DB", os.path.join(DATA_DIR, "outbox.db")))
+email_sender = OutboxSender(
+    email_outbox,
+    host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+    port=int(os.getenv("SMTP_PORT", "465")),
+    username=os.getenv("SENDER_EMAIL"),
+    password=os.getenv("SENDER_PASSWORD"),
+    use_ssl=os.getenv("SMTP_USE_SSL", "1") != "0"
+)
+# Not started at import: a thread started in a preloading gunicorn master does not survive the fork.
+# Serving processes start it themselves (gunicorn.conf.py post_fork, the ASGI lifespan, __main__).
+
+def queue_contact_email(name: str, email: str, message: str) -> int:
+    """Queue a contact form submission for background delivery and return its outbox ID"""
+    sender_email, _, receiver_email = email_credentials()
+
+    email_content = f"New message from {name} ({email}):\n\n{message}"
+
+    message_id = email_outbox.enqueue(sender_email, receiver_email, f"New message from {name}", email_content)
+    email_sender.ensure_started()
+    email_sender.wake()
+    return message_id
+
 @app.route("/contact", methods=["POST"])
 def contact():
     data = request.get_json()
@@ -191,31 +703,21 @@ def contact():
         return jsonify({"message": "Missing fields"}), 400
 
     try:
-        sender_email = os.getenv("SENDER_EMAIL")
-        sender_password = os.getenv("SENDER_PASSWORD")
-        receiver_email = os.getenv("RECEIVER_EMAIL", sender_email)
+        sender_email, sender_password, _ = email_credentials()
 
         if not sender_email or not sender_password:
             return jsonify({"message": "Email credentials not set in environment"}), 500
 
-        email_content = f"New message from {name} ({email}):\n\n{message}"
-
-        msg = MIMEText(email_content)
-        msg["Subject"] = f"New message from {name}"
-        msg["From"] = sender_email
-        msg["To"] = receiver_email
-
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(sender_email, sender_password)
-            smtp.send_message(msg)
+        queue_contact_email(name, email, message)
 
-        return jsonify({"message": "Message sent successfully!"}), 200
+        return jsonify({"message": "Message received and queued for delivery!"}), 202
 
     except Exception as e:
-        logger.error(f"Email sending error: {e}")
+        logger.error(f"Email queueing error: {e}")
         return jsonify({"message": "Failed to send message."}), 500
 
 if __name__ == "__main__":
     # Local run only
+    email_sender.ensure_started()
     app.run(host="0.0.0.0", port=5000)
     
\ No newline at end of file
@@ -0,0 +1,213 @@
+# asgi.py - asyncio serving mode
+#
+# Run with:  uvicorn asgi:app --host 0.0.0.0 --port 5000
+#
+# The chat and contact endpoints are served natively on the event loop: Gemini
+# calls are awaited, retrieval is coalesced by the shared RetrievalBatcher and
+# remaining FAISS / outbox work runs in bounded executors, so one process can hold
+# many in-flight requests. Every other route falls through to the Flask app.
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, Mount
+
+from app import (
+    app as flask_app, get_llm, llm_guard, retrieval_batcher, response_cache, kb_registry,
+    generate_rag_prompt, degraded_answer, sse_event, email_credentials, queue_contact_email, email_sender,
+    IN_FLIGHT, REQUEST_SECONDS
+)
+from kb_registry import UnknownKnowledgeBaseError
+from upstream_guard import UpstreamUnavailable
+from metrics import stage_timer, observe_stage
+from response_cache import SemanticResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Bounded pools for CPU-bound index work and blocking I/O
+rag_executor = ThreadPoolExecutor(max_workers=int(os.getenv("RAG_EXECUTOR_WORKERS", "4")), thread_name_prefix="rag")
+io_executor = ThreadPoolExecutor(max_workers=int(os.getenv("IO_EXECUTOR_WORKERS", "8")), thread_name_prefix="io")
+
+ERROR_RESPONSE = "Sorry, I'm having trouble connecting right now. Please try again later."
+
+async def run_in(executor: ThreadPoolExecutor, func, *args):
+    """Run a blocking function in the given executor without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+async def read_question(request):
+    """Return (question, knowledge base name) from a chat request body"""
+    data = await request.json()
+    return data.get("question") or data.get("message"), data.get("kb")
+
+async def prepare_answer(user_question: str, rag):
+    """
+    Retrieve context from a knowledge base and check the response cache for a question
+
+    Returns:
+        Tuple (retrieval, context_key, cached_answer)
+    """
+    with stage_timer("retrieval"):
+        retrieval = await asyncio.wait_for(asyncio.wrap_future(retrieval_batcher.submit(user_question, top_k=3, rag=rag)),
+                                           timeout=retrieval_batcher.timeout)
+        if rag.rerank:
+            # The cross-encoder wait runs on this request's behalf, not on the shared batcher thread
+            retrieval = await run_in(rag_executor, retrieval_batcher.finish, retrieval, 3, rag)
+        else:
+            retrieval = retrieval_batcher.finish(retrieval, 3, rag)
+    with stage_timer("response_cache"):
+        context_key = SemanticResponseCache.context_key(retrieval)
+        cached_answer = await run_in(rag_executor, response_cache.lookup, retrieval.embedding, context_key)
+    return retrieval, context_key, cached_answer
+
+def instrumented(endpoint: str, handler):
+    """Track in-flight count and duration of a native route, like the Flask request hooks do"""
+    async def wrapper(request):
+        IN_FLIGHT.inc(endpoint)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await handler(request)
+            status = response.status_code
+            return response
+        finally:
+            IN_FLIGHT.dec(endpoint)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, str(status))
+    return wrapper
+
+async def chatbot(request):
+    user_question, kb = await read_question(request)
+
+    if not user_question:
+        return JSONResponse({"error": "No question provided"}, status_code=400)
+
+    try:
+        # Opening a knowledge base reads its index from disk, so it happens off the event loop
+        rag = await run_in(rag_executor, kb_registry.get, kb)
+        retrieval, context_key, cached_answer = await prepare_answer(user_question, rag)
+        if cached_answer is not None:
+            return JSONResponse({"response": cached_answer, "cached": True})
+
+        with stage_timer("prompt_build"):
+            prompt = generate_rag_prompt(user_question, retrieval=retrieval, rag=rag)
+        start = time.perf_counter()
+        try:
+            response = await llm_guard.call_async(lambda: get_llm().generate_content_async(prompt))
+        except UpstreamUnavailable as e:
+            logger.warning(f"Serving retrieval-only answer: {e}")
+            answer = await run_in(rag_executor, degraded_answer, user_question, retrieval, rag)
+            return JSONResponse({"response": answer, "degraded": True, "reason": e.reason})
+        # Only answered calls count as LLM latency; shed and timed-out calls are in upstream_shed/calls_total
+        observe_stage("llm", time.perf_counter() - start)
+        await run_in(rag_executor, response_cache.store, user_question, retrieval.embedding, context_key, response.text)
+
+        logger.info(f"Successfully processed question: '{user_question[:30]}...'")
+        return JSONResponse({"response": response.text})
+
+    except UnknownKnowledgeBaseError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+    except Exception as e:
+        logger.error(f"Error generating response: {str(e)}")
+        return JSONResponse({"error": str(e), "response": ERROR_RESPONSE}, status_code=500)
+
+async def chatbot_stream(request):
+    user_question, kb = await read_question(request)
+
+    if not user_question:
+        return JSONResponse({"error": "No question provided"}, status_code=400)
+
+    try:
+        rag = await run_in(rag_executor, kb_registry.get, kb)
+        retrieval, context_key, cached_answer = await prepare_answer(user_question, rag)
+        with stage_timer("prompt_build"):
+            prompt = None if cached_answer is not None else generate_rag_prompt(user_question, retrieval=retrieval, rag=rag)
+    except UnknownKnowledgeBaseError as e:
+        return JSONResponse({"error": str(e)}, status_code=404)
+    except Exception as e:
+        logger.error(f"Error preparing streamed response: {str(e)}")
+        return JSONResponse({"error": str(e), "response": ERROR_RESPONSE}, status_code=500)
+
+    async def generate():
+        if cached_answer is not None:
+            yield sse_event({"token": cached_answer})
+            yield sse_event({"cached": True}, event="done")
+            return
+
+        parts = []
+        start = time.perf_counter()
+        chunks = None
+        try:
+            try:
+                chunks = await llm_guard.stream_async(lambda: get_llm().generate_content_async(prompt, stream=True))
+            except UpstreamUnavailable as e:
+                logger.warning(f"Streaming retrieval-only answer: {e}")
+                answer = await run_in(rag_executor, degraded_answer, user_question, retrieval, rag)
+                yield sse_event({"token": answer})
+                yield sse_event({"cached": False, "degraded": True, "reason": e.reason}, event="done")
+                return
+            async for chunk in chunks:
+                text = chunk.text
+                if text:
+                    if not parts:
+                        observe_stage("llm_first_token", time.perf_counter() - start)
+                    parts.append(text)
+                    yield sse_event({"token": text})
+            observe_stage("llm", time.perf_counter() - start)
+
+            await run_in(rag_executor, response_cache.store, user_question, retrieval.embedding, context_key, "".join(parts))
+            logger.info(f"Successfully streamed answer to question: '{user_question[:30]}...'")
+            yield sse_event({"cached": False}, event="done")
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            yield sse_event({"error": str(e), "response": ERROR_RESPONSE}, event="error")
+        finally:
+            if chunks is not None:
+                await chunks.aclose()
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+async def contact(request):
+    data = await request.json()
+    name = data.get("name")
+    email = data.get("email")
+    message = data.get("message")
+
+    if not name or not email or not message:
+        return JSONResponse({"message": "Missing fields"}, status_code=400)
+
+    try:
+        sender_email, sender_password, _ = email_credentials()
+
+        if not sender_email or not sender_password:
+            return JSONResponse({"message": "Email credentials not set in environment"}, status_code=500)
+
+        await run_in(io_executor, queue_contact_email, name, email, message)
+
+        return JSONResponse({"message": "Message received and queued for delivery!"}, status_code=202)
+
+    except Exception as e:
+        logger.error(f"Email queueing error: {e}")
+        return JSONResponse({"message": "Failed to send message."}, status_code=500)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Each serving process runs its own outbox sender, so queued mail goes out without waiting for a new submission
+    email_sender.ensure_started()
+    yield
+
+app = Starlette(lifespan=lifespan, middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])], routes=[
+    Route("/chatbot", instrumented("chatbot", chatbot), methods=["POST"]),
+    Route("/chatbot/stream", instrumented("chatbot_stream", chatbot_stream), methods=["POST"]),
+    Route("/contact", instrumented("contact", contact), methods=["POST"]),
+    # Everything else (pages, static files, debug and admin endpoints) is served by Flask
+    Mount("/", app=WSGIMiddleware(flask_app, workers=int(os.getenv("WSGI_WORKERS", "10"))))
+])
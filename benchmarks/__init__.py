@@ -0,0 +1,3 @@
+# Benchmark harness; run the scripts as modules from the repository root, e.g.
+#   python -m benchmarks.bench_retrieval --output before.json
+#   python -m benchmarks.compare before.json after.json
@@ -0,0 +1,145 @@
+# benchmarks/bench_retrieval.py - micro-benchmarks for encode, search and context assembly
+#
+#   python -m benchmarks.bench_retrieval --output results.json
+#   python -m benchmarks.bench_retrieval --sizes 10,10000 --skip-encode
+#
+# Corpora are synthetic and seeded, so runs on the same machine are comparable
+# across commits (see benchmarks/compare.py). The 1M-chunk corpus needs ~2.5GB RAM.
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import faiss
+import logging
+
+from ann_index import build_index, describe_index, search_parameters, synthetic_embeddings
+from bm25_index import BM25Index
+from rag_system import RAGSystem, RetrievalResult, TEST_QUERIES
+from benchmarks.common import time_calls, write_results, print_table
+
+DEFAULT_SIZES = (10, 10_000, 1_000_000)
+
+# Real portfolio terms mixed with a synthetic long tail, so BM25 postings have a realistic skew
+DOMAIN_TERMS = ("python machine learning computer vision yolo resnet50 flask faiss pytorch cnn lstm nlp "
+                "speech agent tracking kalman stock prediction lung cancer classification iit roorkee").split()
+
+def synthetic_texts(count: int, seed: int = 0, vocabulary_size: int = 20_000):
+    """Seeded chunk texts of 20-80 words"""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(DOMAIN_TERMS + [f"term{i}" for i in range(vocabulary_size)])
+    # Zipf-like term frequencies: low ranks (domain terms first) are drawn most often
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    lengths = rng.integers(20, 81, count)
+    words = rng.choice(len(vocabulary), size=int(lengths.sum()), p=weights)
+    texts, start = [], 0
+    for length in lengths:
+        texts.append(" ".join(vocabulary[words[start:start + length]]))
+        start += length
+    return texts
+
+def bench_encode(backend: str, model_name: str, repeat: int):
+    from embedding_backends import create_backend
+
+    try:
+        start = time.perf_counter()
+        model = create_backend(backend, model_name)
+        load_seconds = time.perf_counter() - start
+    except Exception as e:
+        return [{"name": f"encode_single/{backend}", "error": str(e)}]
+
+    queries = list(TEST_QUERIES)
+    batch = (queries * 7)[:32]
+    return [
+        {"name": f"encode_single/{backend}", "load_seconds": load_seconds,
+         **time_calls(lambda: model.encode(queries[:1]), repeat)},
+        {"name": f"encode_batch32/{backend}", **time_calls(lambda: model.encode(batch, batch_size=32), max(10, repeat // 10))}
+    ]
+
+def bench_size(size: int, dimension: int, top_k: int, repeat: int, rag: RAGSystem, seed: int = 0):
+    results = []
+    rng = np.random.default_rng(seed)
+
+    # Dense search over the index type production would pick for this corpus size
+    vectors = synthetic_embeddings(size + repeat, dimension, seed=seed)
+    corpus, queries = vectors[:size], vectors[size:]
+    ids = np.arange(size, dtype='int64')
+    start = time.perf_counter()
+    index = build_index(corpus, "auto", ids=ids)
+    build_seconds = time.perf_counter() - start
+    index_type = describe_index(index)["type"]
+    del corpus, vectors
+
+    cursor = iter(range(10 ** 9))
+    def search():
+        i = next(cursor) % repeat
+        index.search(queries[i:i + 1], top_k)
+    results.append({"name": f"search/{size}", "size": size, "index_type": index_type,
+                    "build_seconds": build_seconds, **time_calls(search, repeat)})
+
+    # Metadata-filtered search with a 10% selector, as used by section/category filters
+    allowed = np.ascontiguousarray(rng.choice(size, max(1, size // 10), replace=False).astype('int64'))
+    selector = faiss.IDSelectorBatch(allowed)
+    params = search_parameters(index, selector, selectivity=len(allowed) / size)
+    def filtered_search():
+        i = next(cursor) % repeat
+        index.search(queries[i:i + 1], top_k, params=params)
+    results.append({"name": f"search_filtered/{size}", "size": size, "index_type": index_type,
+                    **time_calls(filtered_search, repeat)})
+    del index
+
+    # BM25 lookups over synthetic texts
+    texts = synthetic_texts(size, seed)
+    start = time.perf_counter()
+    lexical = BM25Index.build(texts)
+    lexical_build_seconds = time.perf_counter() - start
+    lexical_queries = [f"{DOMAIN_TERMS[i % len(DOMAIN_TERMS)]} term{i}" for i in range(repeat)]
+    def lexical_search():
+        lexical.search(lexical_queries[next(cursor) % repeat], top_k)
+    results.append({"name": f"lexical/{size}", "size": size, "build_seconds": lexical_build_seconds,
+                    **time_calls(lexical_search, repeat)})
+    del lexical
+
+    # Context assembly over a top-10 retrieval drawn from the corpus
+    def context_assembly():
+        picks = rng.choice(size, min(10, size), replace=False)
+        retrieval = RetrievalResult(query="benchmark", top_k=len(picks), chunks=[texts[i] for i in picks],
+                                    scores=sorted(rng.uniform(0.2, 0.9, len(picks)).tolist(), reverse=True),
+                                    metadata=[{} for _ in picks])
+        rag.assemble_context(retrieval, max_tokens=800)
+    results.append({"name": f"context_assembly/{size}", "size": size, **time_calls(context_assembly, repeat)})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval micro-benchmarks")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated corpus sizes")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per benchmark")
+    parser.add_argument("--backend", default="sentence-transformers", help="Embedding backend for encode benchmarks")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--skip-encode", action="store_true", help="Skip benchmarks that load the embedding model")
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+    results = []
+    if not args.skip_encode:
+        results += bench_encode(args.backend, args.model, args.repeat)
+        print_table(results)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Empty system used only for context assembly; it never loads a model or index
+        rag = RAGSystem(index_file=os.path.join(tmp, "index.bin"), chunks_file=os.path.join(tmp, "chunks.bin"))
+        for size in (int(size) for size in args.sizes.split(",")):
+            print(f"Corpus of {size} chunks:", file=sys.stderr)
+            rows = bench_size(size, args.dimension, args.top_k, args.repeat, rag)
+            print_table(rows)
+            results += rows
+
+    write_results("retrieval", results, args.output)
+
+if __name__ == "__main__":
+    main()
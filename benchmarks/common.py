@@ -0,0 +1,83 @@
+# benchmarks/common.py - shared helpers for the benchmark scripts
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+from typing import Dict, List, Optional
+
+import numpy as np
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    """Summarize latency samples in milliseconds"""
+    samples = np.asarray(samples_ms, dtype='float64')
+    if len(samples) == 0:
+        return {"count": 0}
+    return {
+        "count": int(len(samples)),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "max_ms": float(samples.max())
+    }
+
+def time_calls(func, repeat: int, warmup: int = 3) -> Dict[str, float]:
+    """Call func repeatedly and return its latency percentiles"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment() -> Dict:
+    """Describe the machine and revision a benchmark ran on"""
+    info = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__
+    }
+    try:
+        import faiss
+        info["faiss"] = faiss.__version__
+    except (ImportError, AttributeError):
+        pass
+    return info
+
+def write_results(suite: str, results: List[Dict], output: Optional[str] = None):
+    """
+    Write a benchmark report as JSON (to `output`, or stdout)
+
+    Every result carries a "name" that identifies it across runs, see compare.py.
+    """
+    report = {"suite": suite, "environment": environment(), "results": results}
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {len(results)} results to {output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+def print_table(results: List[Dict]):
+    """Human-readable summary on stderr, keeping stdout for JSON"""
+    for row in results:
+        if "error" in row:
+            print(f"  {row['name']:<40} failed: {row['error']}", file=sys.stderr)
+        elif "p50_ms" in row:
+            print(f"  {row['name']:<40} p50 {row['p50_ms']:9.3f}ms  p95 {row['p95_ms']:9.3f}ms  "
+                  f"p99 {row['p99_ms']:9.3f}ms  (n={row['count']})", file=sys.stderr)
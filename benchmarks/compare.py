@@ -0,0 +1,69 @@
+# benchmarks/compare.py - compare two benchmark reports and flag latency regressions
+#
+#   python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+#
+# Exits with status 1 when any matched benchmark's p50 or p95 grew by more than the threshold.
+import sys
+import json
+import argparse
+
+METRICS = ("p50_ms", "p95_ms")
+
+def load(path: str):
+    with open(path) as f:
+        report = json.load(f)
+    return report, {row["name"]: row for row in report["results"] if "error" not in row}
+
+def compare(baseline: dict, candidate: dict, threshold: float):
+    """
+    Returns:
+        (rows, regressions): one row per benchmark present in both reports, and the regressed subset
+    """
+    rows, regressions = [], []
+    for name in baseline:
+        if name not in candidate:
+            continue
+        row = {"name": name}
+        for metric in METRICS:
+            before, after = baseline[name].get(metric), candidate[name].get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            row[metric] = (before, after, change)
+            if change > threshold:
+                row["regressed"] = True
+        rows.append(row)
+        if row.get("regressed"):
+            regressions.append(row)
+    return rows, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    baseline_report, baseline = load(args.baseline)
+    candidate_report, candidate = load(args.candidate)
+    print(f"{baseline_report['environment'].get('commit')} -> {candidate_report['environment'].get('commit')}")
+    if baseline_report["environment"].get("platform") != candidate_report["environment"].get("platform"):
+        print("warning: reports come from different platforms; timings may not be comparable")
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    for row in rows:
+        cells = [f"{metric[:3]} {before:9.3f} -> {after:9.3f}ms ({change:+6.1%})"
+                 for metric, (before, after, change) in ((m, row[m]) for m in METRICS if m in row)]
+        print(f"{'REGRESSED' if row.get('regressed') else 'ok':<9} {row['name']:<40} " + "  ".join(cells))
+
+    missing = sorted(set(baseline) ^ set(candidate))
+    if missing:
+        print(f"not compared (present in one report only): {', '.join(missing)}")
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print("no regressions")
+
+if __name__ == "__main__":
+    main()
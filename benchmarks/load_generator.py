@@ -0,0 +1,105 @@
+# benchmarks/load_generator.py - drive /chatbot with concurrent requests
+#
+# Start the server against the local Gemini stub, then run the load generator:
+#   LLM_BACKEND=fake FAKE_LLM_LATENCY_MS=300 gunicorn app:app      (or: uvicorn asgi:app --port 5000)
+#   python -m benchmarks.load_generator --url http://127.0.0.1:5000 --concurrency 16 --requests 500
+#
+# To exercise load shedding, make the stub slow relative to the LLM limits, e.g.
+#   LLM_BACKEND=fake FAKE_LLM_LATENCY_MS=3000 LLM_MAX_CONCURRENCY=4 LLM_MAX_QUEUE=4 gunicorn app:app
+#   python -m benchmarks.load_generator --concurrency 32 --unique
+import sys
+import time
+import uuid
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+
+import requests
+
+from rag_system import TEST_QUERIES
+from benchmarks.common import percentiles, write_results, print_table
+
+def run_load(url: str, concurrency: int, total: int, unique: bool, timeout: float, endpoint: str = "/chatbot"):
+    """
+    Send `total` questions with `concurrency` client threads
+
+    Returns:
+        Latency percentiles of full answers, throughput, counts per status and error,
+        and retrieval-only answers served while the LLM was shedding load, per reason
+    """
+    local = threading.local()
+    statuses = Counter()
+    degraded = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def one(i: int):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        question = TEST_QUERIES[i % len(TEST_QUERIES)]
+        if unique:
+            question += f" ({uuid.uuid4().hex[:8]})"  # defeat the response cache
+        start = time.perf_counter()
+        reason = None
+        try:
+            response = local.session.post(url + endpoint, json={"question": question}, timeout=timeout)
+            status = response.status_code
+            if status == 200 and endpoint == "/chatbot" and response.json().get("degraded"):
+                reason = response.json().get("reason")
+        except requests.RequestException as e:
+            status = type(e).__name__
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            statuses[str(status)] += 1
+            if reason is not None:
+                degraded[reason] += 1
+            elif status == 200:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall_seconds = time.perf_counter() - start
+
+    return {
+        "name": f"load{endpoint}/c{concurrency}{'/unique' if unique else ''}",
+        "concurrency": concurrency,
+        "requests": total,
+        "wall_seconds": wall_seconds,
+        "throughput_rps": total / wall_seconds,
+        "statuses": dict(statuses),
+        "error_rate": 1 - statuses.get("200", 0) / total,
+        "degraded": dict(degraded),
+        "degraded_rate": sum(degraded.values()) / total,
+        **percentiles(latencies)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the chat endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--endpoint", default="/chatbot")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated client thread counts")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--unique", action="store_true", help="Make every question unique so the response cache misses")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        requests.get(args.url + "/rag/status", timeout=5).raise_for_status()
+    except requests.RequestException as e:
+        sys.exit(f"Server at {args.url} is not reachable: {e}")
+
+    results = []
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+        row = run_load(args.url, concurrency, args.requests, args.unique, args.timeout, args.endpoint)
+        print_table([row])
+        print(f"    {row['throughput_rps']:.1f} req/s, statuses {row['statuses']}, degraded {row['degraded']}",
+              file=sys.stderr)
+        results.append(row)
+
+    write_results("load", results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# bm25_index.py
+import os
+import re
+import math
+import mmap
+import bisect
+import struct
+import numpy as np
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Identifier-like tokens ("yolov11n", "resnet50", "name@example.com") are kept whole
+# and also split into their parts, so exact and partial keyword queries both match
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._@+\-][a-z0-9]+)*")
+_PART_PATTERN = re.compile(r"[a-z0-9]+")
+MAX_TERM_LENGTH = 64
+
+# File layout (little endian):
+#   MAGIC | num_docs, num_terms, num_postings (3 x uint64) | term offsets (num_terms + 1 x int64)
+#   | posting offsets (num_terms + 1 x int64) | docs (num_postings x int32) | weights (num_postings x float32)
+#   | vocabulary (UTF-8 terms back to back, sorted)
+# The file is memory-mapped like the chunk store, so worker processes share its pages.
+MAGIC = b"RAGBM251"
+_HEADER = struct.Struct("<3Q")
+
+class BM25IndexError(Exception):
+    """Raised when a BM25 index file is missing, malformed or in an older format"""
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase text into BM25 terms"""
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token[:MAX_TERM_LENGTH])
+        parts = _PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            terms.extend(part[:MAX_TERM_LENGTH] for part in parts)
+    return terms
+
+class _Vocabulary:
+    """Sorted terms stored back to back in one UTF-8 buffer, searchable with bisect"""
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray):
+        self.buffer = buffer  # uint8
+        self.offsets = offsets  # term i is buffer[offsets[i]:offsets[i + 1]]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def find(self, term: str) -> int:
+        """Position of `term`, or -1 if it is not in the vocabulary"""
+        key = term.encode("utf-8")
+        i = bisect.bisect_left(self, key)
+        return i if i < len(self) and self[i] == key else -1
+
+    @property
+    def nbytes(self) -> int:
+        return self.buffer.nbytes + self.offsets.nbytes
+
+class BM25Index:
+    """
+    Precomputed BM25 inverted index over chunk texts
+
+    Every posting stores its final BM25 weight (idf and length normalization
+    applied at build time), so a query is a few binary searches over the sorted
+    vocabulary plus a sum of posting weights; the embedding model is never used.
+    Documents are chunk store positions. Loaded indexes are memory-mapped.
+    """
+
+    def __init__(self, terms: _Vocabulary, offsets: np.ndarray, docs: np.ndarray, weights: np.ndarray, num_docs: int,
+                 mapping: Optional[mmap.mmap] = None):
+        self.terms = terms  # sorted vocabulary
+        self.offsets = offsets  # postings of terms[i] are docs/weights[offsets[i]:offsets[i + 1]]
+        self.docs = docs
+        self.weights = weights
+        self.num_docs = num_docs
+        self._mm = mapping  # backs the arrays of a loaded index
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """
+        Build an index from chunk texts in chunk store order
+
+        Args:
+            texts: Chunk texts
+            k1: Term frequency saturation
+            b: Document length normalization strength
+
+        Returns:
+            BM25Index
+        """
+        postings = defaultdict(list)  # term -> [(doc, term frequency)]
+        doc_lengths = []
+        for doc, text in enumerate(texts):
+            terms = tokenize(text)
+            doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings[term].append((doc, tf))
+
+        num_docs = len(doc_lengths)
+        lengths = np.array(doc_lengths, dtype='float32')
+        avg_length = float(lengths.mean()) if num_docs and lengths.mean() > 0 else 1.0
+
+        vocabulary = sorted(postings)
+        offsets = np.zeros(len(vocabulary) + 1, dtype='int64')
+        docs, weights = [], []
+        for i, term in enumerate(vocabulary):
+            entries = np.array(postings.pop(term), dtype='int64')
+            df = len(entries)
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            tf = entries[:, 1].astype('float32')
+            norm = k1 * (1 - b + b * lengths[entries[:, 0]] / avg_length)
+            docs.append(entries[:, 0].astype('int32'))
+            weights.append((idf * tf * (k1 + 1) / (tf + norm)).astype('float32'))
+            offsets[i + 1] = offsets[i] + df
+
+        encoded = [term.encode("utf-8") for term in vocabulary]  # code point order is UTF-8 byte order
+        term_offsets = np.zeros(len(encoded) + 1, dtype='int64')
+        np.cumsum([len(term) for term in encoded], out=term_offsets[1:])
+        return cls(
+            _Vocabulary(np.frombuffer(b"".join(encoded), dtype='uint8'), term_offsets),
+            offsets,
+            np.concatenate(docs) if docs else np.zeros(0, dtype='int32'),
+            np.concatenate(weights) if weights else np.zeros(0, dtype='float32'),
+            num_docs
+        )
+
+    def _postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        i = self.terms.find(term)
+        if i < 0:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.docs[start:end], self.weights[start:end]
+
+    def search(self, query: str, top_k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score documents containing any query term
+
+        Args:
+            query: Query text
+            top_k: Maximum number of documents returned
+            mask: Optional boolean array over documents; only documents set in it are scored
+
+        Returns:
+            (positions, scores) of the best documents, highest score first
+        """
+        matches = [postings for postings in map(self._postings, set(tokenize(query))) if postings is not None]
+        if mask is not None:
+            matches = [(docs[mask[docs]], weights[mask[docs]]) for docs, weights in matches]
+            matches = [(docs, weights) for docs, weights in matches if len(docs)]
+        if not matches or top_k <= 0:
+            return np.zeros(0, dtype='int64'), np.zeros(0, dtype='float32')
+
+        if len(matches) == 1:
+            docs, scores = matches[0]
+        else:
+            docs, inverse = np.unique(np.concatenate([docs for docs, _ in matches]), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate([weights for _, weights in matches]))
+
+        if len(docs) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(docs))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return docs[best].astype('int64'), scores[best].astype('float32')
+
+    def save(self, path: str):
+        """Write the index atomically"""
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(MAGIC)
+                f.write(_HEADER.pack(self.num_docs, len(self.terms), len(self.docs)))
+                for table, dtype in ((self.terms.offsets, '<i8'), (self.offsets, '<i8'), (self.docs, '<i4'),
+                                     (self.weights, '<f4'), (self.terms.buffer, 'u1')):
+                    f.write(np.ascontiguousarray(table, dtype=dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """
+        Memory-map an index written by `save`
+
+        Raises:
+            BM25IndexError: If the file is empty, malformed or in an older format
+        """
+        with open(path, "rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise BM25IndexError(f"{path} is empty")
+        if len(mm) < len(MAGIC) + _HEADER.size or mm[:len(MAGIC)] != MAGIC:
+            mm.close()
+            raise BM25IndexError(f"{path} is not a BM25 index in the current format")
+        num_docs, num_terms, num_postings = _HEADER.unpack_from(mm, len(MAGIC))
+
+        layout = (('<i8', num_terms + 1), ('<i8', num_terms + 1), ('<i4', num_postings), ('<f4', num_postings))
+        vocabulary_start = len(MAGIC) + _HEADER.size + sum(np.dtype(dtype).itemsize * count for dtype, count in layout)
+        last_term_end = len(MAGIC) + _HEADER.size + 8 * num_terms
+        if len(mm) < vocabulary_start or len(mm) != vocabulary_start + struct.unpack_from("<q", mm, last_term_end)[0]:
+            mm.close()
+            raise BM25IndexError(f"{path} is truncated or corrupt")
+
+        position = len(MAGIC) + _HEADER.size
+        tables = []
+        for dtype, count in layout:
+            tables.append(np.frombuffer(mm, dtype=dtype, count=count, offset=position))
+            position += tables[-1].nbytes
+        term_offsets, offsets, docs, weights = tables
+        buffer = np.frombuffer(mm, dtype='uint8', count=len(mm) - vocabulary_start, offset=vocabulary_start)
+        return cls(_Vocabulary(buffer, term_offsets), offsets, docs, weights, num_docs, mm)
+
+    def stats(self) -> Dict:
+        return {"documents": self.num_docs, "terms": len(self.terms), "postings": len(self.docs)}
+
+    def memory_bytes(self) -> int:
+        """Size of the arrays (pages of a loaded index are shared through the OS page cache)"""
+        return self.terms.nbytes + self.offsets.nbytes + self.docs.nbytes + self.weights.nbytes
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse ranked lists of chunk positions by reciprocal rank fusion
+
+    Args:
+        rankings: Ranked positions from each retriever, best first
+        k: Damping constant; larger values flatten the contribution of top ranks
+
+    Returns:
+        (position, fused score) pairs, best first
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, position in enumerate(ranking):
+            fused[position] += 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
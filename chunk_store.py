@@ -0,0 +1,157 @@
+# chunk_store.py
+import os
+import sys
+import mmap
+import json
+import struct
+import numpy as np
+from array import array
+from typing import Dict, Iterable, Iterator, Optional
+
+# File layout:
+#   MAGIC | record 0 | record 1 | ... | offsets (count + 1 x uint64) | [ids (count x int64)] | count (uint64) | MAGIC
+# Records are UTF-8 JSON objects; offsets are relative to the end of the leading MAGIC.
+# The offset table sits at the end so records can be streamed to disk without
+# knowing the chunk count up front. Version 2 files (MAGIC_WITH_IDS) also carry the
+# FAISS id of every record so search hits map to records without decoding them.
+MAGIC = b"RAGCHNK1"
+MAGIC_WITH_IDS = b"RAGCHNK2"
+_UINT64 = struct.Struct("<Q")
+
+class ChunkStoreError(Exception):
+    """Raised when a chunk store file is missing or malformed"""
+
+class _FieldView:
+    """Read-only sequence over one field of every record in a ChunkStore"""
+
+    def __init__(self, store: "ChunkStore", field: str):
+        self._store = store
+        self._field = field
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._store.record(i).get(self._field)
+
+    def __iter__(self) -> Iterator:
+        for i in range(len(self)):
+            yield self[i]
+
+class ChunkStore:
+    """
+    Memory-mapped, read-only store of chunk records
+
+    The file is mapped with mmap so its pages live in the OS page cache and are
+    shared by every worker process; records are decoded on access instead of
+    unpickling the whole store into each process.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Path of a file written by `ChunkStore.write`
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ChunkStoreError(f"{path} is empty")
+
+        size = len(self._mm)
+        magic = self._mm[:len(MAGIC)] if size >= len(MAGIC) else b""
+        if size < 2 * len(MAGIC) + 2 * _UINT64.size or magic not in (MAGIC, MAGIC_WITH_IDS) or self._mm[-len(MAGIC):] != magic:
+            self.close()
+            raise ChunkStoreError(f"{path} is not a chunk store file")
+
+        self._count = _UINT64.unpack_from(self._mm, size - len(MAGIC) - _UINT64.size)[0]
+        ids_size = self._count * _UINT64.size if magic == MAGIC_WITH_IDS else 0
+        self._offsets_start = size - len(MAGIC) - _UINT64.size - ids_size - (self._count + 1) * _UINT64.size
+        if self._offsets_start < len(MAGIC):
+            self.close()
+            raise ChunkStoreError(f"{path} has a corrupt offset table")
+
+        # Zero-copy view of the FAISS id table, or None for files written without ids
+        self.ids = None
+        if ids_size:
+            self.ids = np.frombuffer(self._mm, dtype='<i8', count=self._count,
+                                     offset=self._offsets_start + (self._count + 1) * _UINT64.size)
+
+        self.texts = _FieldView(self, "content")
+        self.metadata = _FieldView(self, "metadata")
+        self.categories = _FieldView(self, "category")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _offset(self, i: int) -> int:
+        return len(MAGIC) + _UINT64.unpack_from(self._mm, self._offsets_start + i * _UINT64.size)[0]
+
+    def record(self, i: int) -> Dict:
+        """Decode record i"""
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(f"chunk index {i} out of range")
+        return json.loads(self._mm[self._offset(i):self._offset(i + 1)])
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(self._count):
+            yield self.record(i)
+
+    def memory_bytes(self) -> int:
+        """Size of the mapping (pages are shared through the OS page cache)"""
+        return len(self._mm) if self._mm is not None else 0
+
+    def close(self):
+        """Unmap the file"""
+        mm = getattr(self, "_mm", None)
+        if mm is not None:
+            self.ids = None  # Release the buffer export before unmapping
+            mm.close()
+            self._mm = None
+        self._file.close()
+
+    @staticmethod
+    def write(path: str, records: Iterable[Dict], id_field: Optional[str] = None) -> int:
+        """
+        Stream records to a new chunk store file, replacing `path` atomically
+
+        Args:
+            path: Destination path
+            records: Iterable of JSON-serializable dictionaries
+            id_field: Record field holding an int64 FAISS id to store in the id table
+
+        Returns:
+            Number of records written
+        """
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        magic = MAGIC_WITH_IDS if id_field else MAGIC
+        offsets = array('Q', [0])
+        ids = array('q')
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(magic)
+                for record in records:
+                    data = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                    f.write(data)
+                    offsets.append(offsets[-1] + len(data))
+                    if id_field:
+                        ids.append(record[id_field])
+                for table in (offsets, ids):
+                    if sys.byteorder != "little":
+                        table.byteswap()
+                    f.write(table.tobytes())
+                f.write(_UINT64.pack(len(offsets) - 1))
+                f.write(magic)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return len(offsets) - 1
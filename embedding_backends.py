@@ -0,0 +1,134 @@
+# embedding_backends.py
+import os
+import numpy as np
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBackend:
+    """Interface for query/chunk encoders used by RAGSystem"""
+
+    name = "base"
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Encode texts into embeddings
+
+        Args:
+            texts: Texts to encode
+            batch_size: Number of texts per forward pass
+
+        Returns:
+            float32 array of shape (len(texts), dimension); not normalized
+        """
+        raise NotImplementedError
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Float32 PyTorch model through sentence-transformers (the reference backend)"""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        embeddings = self.model.encode(texts, batch_size=batch_size, convert_to_tensor=False)
+        return np.asarray(embeddings, dtype='float32')
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    ONNX Runtime backend with mean pooling, optionally int8-quantized
+
+    The transformer is exported to ONNX once (this needs torch) and cached in
+    `model_dir`; afterwards serving only needs onnxruntime and a tokenizer.
+    Dynamic int8 quantization shrinks the weights about 4x and speeds up
+    CPU inference at a small accuracy cost, see `RAGSystem.compare_embedding_backend`.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name: str, model_dir: str = "onnx_models", quantize: bool = False, max_length: int = 256):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        self.max_length = max_length
+        if quantize:
+            self.name = "onnx-int8"
+
+        os.makedirs(model_dir, exist_ok=True)
+        base_path = os.path.join(model_dir, self.model_id.replace("/", "__") + ".onnx")
+        model_path = base_path.replace(".onnx", "-int8.onnx") if quantize else base_path
+
+        if not os.path.exists(model_path):
+            if not os.path.exists(base_path):
+                self.export(self.model_id, base_path)
+            if quantize:
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                quantize_dynamic(base_path, model_path, weight_type=QuantType.QInt8)
+                logger.info(f"Quantized {base_path} to int8 at {model_path}")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    @staticmethod
+    def export(model_id: str, path: str):
+        """Export a Hugging Face transformer to ONNX with dynamic batch and sequence axes"""
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_id)
+        model = AutoModel.from_pretrained(model_id).eval()
+        inputs = tokenizer(["export"], return_tensors="pt")
+
+        # Positional inputs must follow the forward() signature order
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in inputs]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+        with torch.no_grad():
+            torch.onnx.export(
+                model, tuple(inputs[name] for name in input_names), path,
+                input_names=input_names, output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes, opset_version=14
+            )
+        logger.info(f"Exported {model_id} to {path}")
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                     max_length=self.max_length, return_tensors="np")
+            feed = {name: encoded[name].astype('int64') for name in self.input_names}
+            token_embeddings = self.session.run(None, feed)[0]
+
+            # Mean pooling over non-padding tokens, as in sentence-transformers
+            mask = encoded["attention_mask"][..., None].astype('float32')
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            outputs.append(pooled.astype('float32'))
+        return np.concatenate(outputs) if outputs else np.zeros((0, 0), dtype='float32')
+
+BACKENDS = ("sentence-transformers", "onnx", "onnx-int8")
+
+def create_backend(name: str, model_name: str, **kwargs) -> EmbeddingBackend:
+    """
+    Create an embedding backend by name
+
+    Args:
+        name: One of BACKENDS
+        model_name: Sentence transformer model name
+        **kwargs: Backend-specific options (e.g. model_dir for ONNX backends)
+
+    Returns:
+        EmbeddingBackend instance
+    """
+    if name == "sentence-transformers":
+        return SentenceTransformerBackend(model_name)
+    if name == "onnx":
+        return OnnxBackend(model_name, **kwargs)
+    if name == "onnx-int8":
+        return OnnxBackend(model_name, quantize=True, **kwargs)
+    raise ValueError(f"Unknown embedding backend '{name}'. Choose from: {', '.join(BACKENDS)}")
@@ -0,0 +1,82 @@
+# fake_llm.py - local stand-in for the Gemini model (LLM_BACKEND=fake)
+#
+# Lets benchmarks and load tests drive the full chat pipeline without network
+# calls, API quota or cost. Latency is injected so upstream behaviour can be
+# simulated: FAKE_LLM_LATENCY_MS (default 800), FAKE_LLM_JITTER_MS (default 0)
+# and FAKE_LLM_FAILURE_RATE (default 0, fraction of calls that raise).
+import os
+import time
+import random
+import asyncio
+from typing import Iterator, List
+
+class FakeResponse:
+    """Mimics the `.text` of a google.generativeai response or stream chunk"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeGenerativeModel:
+    """Drop-in replacement for genai.GenerativeModel with injectable latency"""
+
+    def __init__(self, latency_ms: float = None, jitter_ms: float = None, failure_rate: float = None,
+                 answer_words: int = 60, stream_chunks: int = 8):
+        """
+        Args:
+            latency_ms: Mean time until the full answer is produced
+            jitter_ms: Uniform random variation added to each call's latency (+/-)
+            failure_rate: Fraction of calls that raise, to simulate upstream errors
+            answer_words: Length of the generated answer
+            stream_chunks: Number of chunks a streamed answer is split into
+        """
+        self.latency_ms = float(os.getenv("FAKE_LLM_LATENCY_MS", "800")) if latency_ms is None else latency_ms
+        self.jitter_ms = float(os.getenv("FAKE_LLM_JITTER_MS", "0")) if jitter_ms is None else jitter_ms
+        self.failure_rate = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0")) if failure_rate is None else failure_rate
+        self.answer_words = answer_words
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+
+    def _delay(self) -> float:
+        self.calls += 1
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError("Fake LLM upstream error")
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def _answer(self, prompt: str) -> str:
+        words = f"Fake answer to a {len(prompt)}-character prompt.".split()
+        while len(words) < self.answer_words:
+            words.append("lorem")
+        return " ".join(words)
+
+    def _chunks(self, text: str) -> List[str]:
+        words = text.split(" ")
+        size = max(1, len(words) // self.stream_chunks)
+        return [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        delay = self._delay()
+        answer = self._answer(prompt)
+        if not stream:
+            time.sleep(delay)
+            return FakeResponse(answer)
+
+        def chunks() -> Iterator[FakeResponse]:
+            parts = self._chunks(answer)
+            for part in parts:
+                time.sleep(delay / len(parts))
+                yield FakeResponse(part)
+        return chunks()
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        delay = self._delay()
+        answer = self._answer(prompt)
+        if not stream:
+            await asyncio.sleep(delay)
+            return FakeResponse(answer)
+
+        async def chunks():
+            parts = self._chunks(answer)
+            for part in parts:
+                await asyncio.sleep(delay / len(parts))
+                yield FakeResponse(part)
+        return chunks()
@@ -0,0 +1,29 @@
+# gunicorn.conf.py - used automatically by `gunicorn app:app`
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Request threads share one RAGSystem per worker: searches read an immutable index
+# snapshot without locking, and at most RAG_MAX_CONCURRENT_ENCODES of them encode at once
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# Preloaded/forked-worker mode: import the app once in the master so the embedding
+# model weights, FAISS index and chunk store pages are shared copy-on-write.
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+if preload_app:
+    # Load weights in the master but defer the first encode to the workers,
+    # since torch thread pools started before fork are unusable in children
+    os.environ.setdefault("RAG_WARMUP", "preload")
+
+def when_ready(server):
+    # Move everything loaded so far to the permanent generation so the garbage
+    # collector does not touch (and copy) those pages in forked workers
+    if preload_app:
+        gc.freeze()
+
+def post_fork(server, worker):
+    # Background threads do not survive fork, so each worker starts its own outbox
+    # sender (with preload_app the app module is already imported here)
+    from app import email_sender
+    email_sender.ensure_started()
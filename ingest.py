@@ -0,0 +1,279 @@
+# ingest.py - stream documents into the RAG index
+#
+# Usage: python ingest.py static/resume.pdf templates/index.html README.md
+import os
+import re
+import hashlib
+from html.parser import HTMLParser
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (section, text) pairs produced by the parsers
+Block = Tuple[str, str]
+
+# Sections whose chunks matter most for questions about the portfolio owner
+HIGH_IMPORTANCE_SECTIONS = {"about", "home", "summary", "education", "skills", "projects", "experience"}
+LOW_IMPORTANCE_SECTIONS = {"footer", "nav", "navigation", "license", "installation", "customization"}
+
+RESUME_HEADINGS = {
+    "education", "skills", "technical skills", "projects", "experience", "work experience", "internships",
+    "achievements", "positions of responsibility", "certifications", "summary", "about", "contact",
+    "extracurricular activities", "publications", "courses", "coursework"
+}
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_TEMPLATE_PATTERN = re.compile(r"\{\{.*?\}\}|\{%.*?%\}")
+
+def count_tokens(text: str) -> int:
+    """Approximate model token count (words and punctuation marks; subword splits are not counted)"""
+    return len(_TOKEN_PATTERN.findall(text))
+
+def slugify(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_") or "general"
+
+def section_importance(section: str) -> str:
+    if section in HIGH_IMPORTANCE_SECTIONS:
+        return "high"
+    if section in LOW_IMPORTANCE_SECTIONS:
+        return "low"
+    return "medium"
+
+def parse_pdf(path: str) -> Iterator[Block]:
+    """Yield (section, text) blocks page by page, starting a section at each resume heading"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    section = "general"
+    for page in reader.pages:
+        lines = []
+        for line in (page.extract_text() or "").splitlines():
+            stripped = line.strip(" :•\t")
+            if stripped.lower() in RESUME_HEADINGS:
+                if lines:
+                    yield section, " ".join(lines)
+                    lines = []
+                section = slugify(stripped)
+            elif stripped:
+                lines.append(stripped)
+        if lines:
+            yield section, " ".join(lines)
+
+class _HTMLBlockParser(HTMLParser):
+    """Collect visible text per <section id> or heading, one block per block-level element"""
+
+    BLOCK_TAGS = {"p", "li", "div", "h1", "h2", "h3", "h4", "h5", "h6", "td", "section", "article", "footer", "header"}
+    SKIP_TAGS = {"script", "style", "noscript", "svg", "head"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.section = "general"
+        self.blocks: List[Block] = []
+        self._text: List[str] = []
+        self._skip_depth = 0
+        self._heading = None
+
+    def _flush(self):
+        text = _TEMPLATE_PATTERN.sub("", " ".join(self._text))
+        text = " ".join(text.split())
+        if text:
+            self.blocks.append((self.section, text))
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if tag in self.BLOCK_TAGS:
+            self._flush()
+        attrs = dict(attrs)
+        if tag in ("section", "footer", "nav") and (attrs.get("id") or tag != "section"):
+            self.section = slugify(attrs.get("id") or tag)
+        if tag in ("h1", "h2") and self.section == "general":
+            self._heading = []
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if self._heading is not None and tag in ("h1", "h2"):
+            self.section = slugify(" ".join(self._heading))
+            self._heading = None
+        if tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self._text.append(data)
+        if self._heading is not None:
+            self._heading.append(data)
+
+def parse_html(path: str, read_size: int = 64 * 1024) -> Iterator[Block]:
+    """Yield (section, text) blocks while feeding the file to the parser in pieces"""
+    parser = _HTMLBlockParser()
+    with open(path, encoding="utf-8") as f:
+        while True:
+            data = f.read(read_size)
+            if not data:
+                break
+            parser.feed(data)
+            yield from parser.blocks
+            parser.blocks = []
+    parser.close()
+    parser._flush()
+    yield from parser.blocks
+
+def parse_markdown(path: str) -> Iterator[Block]:
+    """Yield (section, paragraph) blocks, using the latest heading as the section"""
+    section = "general"
+    paragraph = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stripped = line.strip()
+            heading = re.match(r"^#{1,6}\s+(.*)", stripped)
+            if heading or not stripped:
+                if paragraph:
+                    yield section, " ".join(paragraph)
+                    paragraph = []
+                if heading:
+                    section = slugify(heading.group(1))
+                continue
+            paragraph.append(re.sub(r"^(?:[-*+>]|\d+\.)\s+", "", stripped))
+    if paragraph:
+        yield section, " ".join(paragraph)
+
+PARSERS = {".pdf": parse_pdf, ".html": parse_html, ".htm": parse_html, ".md": parse_markdown, ".markdown": parse_markdown}
+
+def parse_document(path: str) -> Iterator[Block]:
+    """Dispatch to the parser for the file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in PARSERS:
+        raise ValueError(f"Unsupported document type '{extension}' for {path}")
+    return PARSERS[extension](path)
+
+def chunk_blocks(blocks: Iterable[Block], source: str, max_tokens: int = 160, overlap_tokens: int = 32) -> Iterator[Dict]:
+    """
+    Split blocks into overlapping, token-bounded chunks that never span sections
+
+    Chunk boundaries are chosen by content rather than word position: a block
+    is a boundary candidate with a probability proportional to its size
+    (decided by a hash of its text, about one per max_tokens / 2 tokens), and a
+    chunk of at least max_tokens / 4 ends after a candidate or before a block
+    that would not fit. Only blocks longer than a chunk are split, with
+    overlap. Editing one paragraph therefore changes the chunks around it
+    instead of shifting every later chunk of the section, and since ids hash
+    the section and text, unchanged chunks keep their ids (and embeddings).
+
+    Args:
+        blocks: (section, text) pairs in document order
+        source: Document path, stored on every chunk
+        max_tokens: Maximum approximate tokens per chunk
+        overlap_tokens: Approximate tokens repeated at the start of the next chunk
+
+    Yields:
+        Chunk dictionaries ready for `RAGSystem.update_chunks`
+    """
+    occurrences = {}  # repeated (section, text) pairs get a numbered id
+    min_tokens, boundary_spacing = max_tokens // 4, max_tokens // 2
+    section = None
+    words, tokens = [], []
+    after_boundary = False  # the last block added is a content-defined place to end a chunk
+
+    def emit():
+        content = " ".join(words)
+        digest = hashlib.sha1(f"{section}\n{content}".encode("utf-8")).hexdigest()[:16]
+        occurrences[digest] = occurrences.get(digest, 0) + 1
+        return {
+            "id": f"{source}#{section}#{digest}" + (f"-{occurrences[digest]}" if occurrences[digest] > 1 else ""),
+            "source": source,
+            "content": content,
+            "category": section,
+            "metadata": {"section": section, "importance": section_importance(section), "source": source}
+        }
+
+    for block_section, text in blocks:
+        block_tokens = count_tokens(text)
+        if block_section != section or (sum(tokens) >= min_tokens
+                                        and (after_boundary or sum(tokens) + block_tokens > max_tokens)):
+            if words:
+                yield emit()
+            section, words, tokens = block_section, [], []
+        draw = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "little") / 2 ** 32
+        after_boundary = draw < block_tokens / boundary_spacing
+
+        for word in text.split():
+            word_tokens = count_tokens(word)
+            if words and sum(tokens) + word_tokens > max_tokens:
+                yield emit()
+                # Carry the tail of the previous chunk over as overlap
+                keep = 0
+                while keep < len(tokens) and sum(tokens[len(tokens) - keep - 1:]) <= overlap_tokens:
+                    keep += 1
+                words, tokens = words[len(words) - keep:] if keep else [], tokens[len(tokens) - keep:] if keep else []
+            words.append(word)
+            tokens.append(word_tokens)
+
+    if words:
+        yield emit()
+
+def iter_chunks(paths: Iterable[str], max_tokens: int = 160, overlap_tokens: int = 32) -> Iterator[Dict]:
+    """Stream chunks from several documents without loading them fully into memory"""
+    for path in paths:
+        logger.info(f"Ingesting {path}")
+        yield from chunk_blocks(parse_document(path), path, max_tokens, overlap_tokens)
+
+def ingest(rag, paths: List[str], max_tokens: int = 160, overlap_tokens: int = 32, batch_size: int = 64,
+           workers: Optional[int] = None) -> Dict:
+    """
+    Parse, chunk and embed documents into a RAGSystem's existing index files
+
+    Chunks of these documents that are no longer produced are deleted, and
+    unchanged chunks keep their embeddings.
+
+    Args:
+        rag: RAGSystem to update
+        paths: Document paths (.pdf, .html, .md)
+        max_tokens: Maximum approximate tokens per chunk
+        overlap_tokens: Approximate token overlap between consecutive chunks
+        batch_size: Number of chunks embedded per forward pass
+        workers: Embedding processes for large document sets (default: the RAGSystem's build_workers)
+
+    Returns:
+        Update statistics from `RAGSystem.update_chunks`
+    """
+    return rag.update_chunks(iter_chunks(paths, max_tokens, overlap_tokens),
+                             replace_sources=set(paths), batch_size=batch_size, workers=workers)
+
+if __name__ == "__main__":
+    import argparse
+    from rag_system import RAGSystem
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Stream documents into the RAG index")
+    parser.add_argument("paths", nargs="+", help="PDF, HTML or Markdown files")
+    parser.add_argument("--max-tokens", type=int, default=160)
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None, help="Embedding processes (default: 1)")
+    parser.add_argument("--dry-run", action="store_true", help="Print chunks instead of indexing them")
+    parser.add_argument("--kb", help="Index into this named knowledge base instead of the default one")
+    parser.add_argument("--kb-dir", default="knowledge_bases", help="Directory holding named knowledge bases")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        for chunk in iter_chunks(args.paths, args.max_tokens, args.overlap):
+            print(f"[{chunk['id']}] ({count_tokens(chunk['content'])} tokens) {chunk['content'][:100]}")
+    else:
+        if args.kb:
+            from kb_registry import knowledge_base_paths
+            index_file, chunks_file = knowledge_base_paths(args.kb, args.kb_dir)
+            os.makedirs(os.path.dirname(index_file), exist_ok=True)
+            rag = RAGSystem(index_file=index_file, chunks_file=chunks_file)
+        else:
+            rag = RAGSystem()
+        stats = ingest(rag, args.paths, args.max_tokens, args.overlap, args.batch_size, args.workers)
+        print(f"Indexed {stats['total']} chunks: {stats['added']} added, {stats['updated']} updated, "
+              f"{stats['unchanged']} unchanged, {stats['deleted']} deleted "
+              f"({stats['embedded']} embedded at {stats['chunks_per_sec']:.1f} chunks/s)")
@@ -0,0 +1,194 @@
+# kb_registry.py
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from rag_system import RAGSystem
+from ann_index import describe_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KB_DIR = "knowledge_bases"
+INDEX_FILENAME = "faiss_index.bin"
+CHUNKS_FILENAME = "chunks.bin"
+KB_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+class UnknownKnowledgeBaseError(ValueError):
+    """Requested knowledge base name is invalid or has no index on disk"""
+
+def knowledge_base_paths(name: str, root_dir: str = DEFAULT_KB_DIR) -> Tuple[str, str]:
+    """
+    Index and chunk store paths of a named knowledge base
+
+    Raises:
+        UnknownKnowledgeBaseError: If the name is not a plain identifier (it becomes a directory name)
+    """
+    if not KB_NAME_PATTERN.match(name or ""):
+        raise UnknownKnowledgeBaseError(f"Invalid knowledge base name '{name}': use letters, digits, '-' and '_'")
+    directory = os.path.join(root_dir, name)
+    return os.path.join(directory, INDEX_FILENAME), os.path.join(directory, CHUNKS_FILENAME)
+
+class KnowledgeBaseRegistry:
+    """
+    Named knowledge bases served from one process, sharing one embedding model
+
+    The default knowledge base is the app's main RAGSystem and is always loaded.
+    Others live in `root_dir/<name>/` (built with `python ingest.py --kb <name> ...`),
+    are opened on their first request as RAGSystems that encode through the
+    default one, and are evicted least recently used first once the loaded
+    indexes exceed `memory_budget_mb`. Eviction only drops the registry's
+    reference, so requests already holding an evicted system finish normally.
+    """
+
+    def __init__(self, default: RAGSystem, root_dir: str = DEFAULT_KB_DIR, memory_budget_mb: Optional[float] = 512,
+                 default_name: str = "default", rag_options: Optional[Dict] = None):
+        """
+        Args:
+            default: RAGSystem served for requests without a knowledge base name
+            root_dir: Directory holding one subdirectory per knowledge base
+            memory_budget_mb: Cap on the approximate memory of all loaded indexes, or None for no cap
+            default_name: Name that also selects the default knowledge base
+            rag_options: Keyword arguments for the RAGSystems opened by the registry
+        """
+        self.default = default
+        self.default_name = default_name
+        self.root_dir = root_dir
+        self.memory_budget_mb = memory_budget_mb
+        self.rag_options = rag_options or {}
+        self._loaded = OrderedDict()  # name -> RAGSystem, least recently used first
+        self._loading = {}  # name -> lock held while that knowledge base is opened
+        self._lock = threading.Lock()
+        self._stats = {}  # name -> request/load/eviction counters
+        self.loads = 0
+        self.evictions = 0
+
+    def names(self) -> List[str]:
+        """The default name plus every knowledge base with an index on disk"""
+        names = [self.default_name]
+        if os.path.isdir(self.root_dir):
+            for name in sorted(os.listdir(self.root_dir)):
+                if name != self.default_name and KB_NAME_PATTERN.match(name) and \
+                        all(os.path.exists(path) for path in knowledge_base_paths(name, self.root_dir)):
+                    names.append(name)
+        return names
+
+    def _record(self, name: str, **updates):
+        entry = self._stats.setdefault(name, {"requests": 0, "loads": 0, "evictions": 0, "last_used": None,
+                                              "load_ms": None})
+        for key, value in updates.items():
+            entry[key] = entry[key] + value if key in ("requests", "loads", "evictions") else value
+
+    def get(self, name: Optional[str] = None) -> RAGSystem:
+        """
+        RAGSystem of a knowledge base, opening it on first use
+
+        Args:
+            name: Knowledge base name; None, "" or the default name select the default
+
+        Raises:
+            UnknownKnowledgeBaseError: If no knowledge base of that name exists
+        """
+        if not name or name == self.default_name:
+            with self._lock:
+                self._record(self.default_name, requests=1, last_used=time.time())
+            return self.default
+
+        with self._lock:
+            rag = self._loaded.get(name)
+            if rag is not None:
+                self._loaded.move_to_end(name)
+                self._record(name, requests=1, last_used=time.time())
+                return rag
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        # Concurrent first requests wait for one load; the registry stays available meanwhile
+        with loading:
+            with self._lock:
+                rag = self._loaded.get(name)
+                if rag is not None:
+                    self._loaded.move_to_end(name)
+                    self._record(name, requests=1, last_used=time.time())
+                    return rag
+            start = time.perf_counter()
+            try:
+                rag = self._open(name)
+            except Exception:
+                with self._lock:
+                    self._loading.pop(name, None)
+                raise
+            load_ms = (time.perf_counter() - start) * 1000
+            # Publish and stop loading in one step, so no request sees neither and opens it again
+            with self._lock:
+                self._loaded[name] = rag
+                self._loading.pop(name, None)
+                self.loads += 1
+                self._record(name, requests=1, loads=1, last_used=time.time(), load_ms=load_ms)
+                self._evict()
+            logger.info(f"Opened knowledge base '{name}' ({len(rag.chunks)} chunks, "
+                        f"{rag.memory_bytes() / 1e6:.1f}MB) in {load_ms:.0f}ms")
+            return rag
+
+    def _open(self, name: str) -> RAGSystem:
+        index_file, chunks_file = knowledge_base_paths(name, self.root_dir)
+        if not (os.path.exists(index_file) and os.path.exists(chunks_file)):
+            raise UnknownKnowledgeBaseError(f"Unknown knowledge base '{name}'")
+        rag = RAGSystem(index_file=index_file, chunks_file=chunks_file, embedder=self.default, **self.rag_options)
+        if rag.index is None:
+            # Never let a request fall into RAGSystem's cold start, which would index the built-in resume here
+            raise RuntimeError(f"Knowledge base '{name}' could not be loaded from {os.path.dirname(index_file)}")
+        return rag
+
+    def _evict(self):
+        """Drop least recently used knowledge bases until the loaded ones fit the budget (lock held)"""
+        if self.memory_budget_mb is None:
+            return
+        sizes = {name: rag.memory_bytes() for name, rag in self._loaded.items()}
+        total = self.default.memory_bytes() + sum(sizes.values())
+        budget = self.memory_budget_mb * 1e6
+        # The most recently used knowledge base is kept even when it alone exceeds the budget
+        while total > budget and len(self._loaded) > 1:
+            name, _ = self._loaded.popitem(last=False)
+            total -= sizes[name]
+            self.evictions += 1
+            self._record(name, evictions=1)
+            logger.info(f"Evicted knowledge base '{name}' ({sizes[name] / 1e6:.1f}MB) to stay within "
+                        f"{self.memory_budget_mb:g}MB")
+        if total > budget:
+            logger.warning(f"Loaded knowledge bases use {total / 1e6:.1f}MB, over the {self.memory_budget_mb:g}MB budget")
+
+    def stats(self) -> Dict:
+        """Registry totals and per knowledge base usage, size and cache counters"""
+        with self._lock:
+            loaded = dict(self._loaded)
+            counters = {name: dict(entry) for name, entry in self._stats.items()}
+            loads, evictions = self.loads, self.evictions
+        loaded[self.default_name] = self.default
+
+        knowledge_bases = {}
+        for name in dict.fromkeys(self.names() + list(counters)):
+            entry = {"loaded": name in loaded, **counters.get(name, {"requests": 0, "loads": 0, "evictions": 0})}
+            rag = loaded.get(name)
+            if rag is not None:
+                entry.update({
+                    "chunks": len(rag.chunks),
+                    "index": describe_index(rag.index),
+                    "memory_mb": rag.memory_bytes() / 1e6,
+                    "index_version": rag.index_version,
+                    "retrieval_cache": rag.retrieval_cache.stats()
+                })
+            knowledge_bases[name] = entry
+
+        return {
+            "default": self.default_name,
+            "root_dir": self.root_dir,
+            "memory_budget_mb": self.memory_budget_mb,
+            "memory_used_mb": sum(rag.memory_bytes() for rag in loaded.values()) / 1e6,
+            "loaded": len(loaded),
+            "loads": loads,
+            "evictions": evictions,
+            "knowledge_bases": knowledge_bases
+        }
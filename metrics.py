@@ -0,0 +1,232 @@
+# metrics.py
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Latency buckets in seconds, from 0.1ms to 30s (roughly x2.5 apart)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelValues = Tuple[str, ...]
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Monotonic counter, optionally split by label values"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in values]
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down
+
+    A gauge created with `callback` is evaluated at scrape time instead, so
+    values owned by other components (cache hit rates, index size) cost nothing
+    on the request path. The callback returns a number, or a dict mapping label
+    value tuples to numbers.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), callback: Optional[Callable] = None):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, *label_values: str):
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def _samples(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                values = self._callback()
+            except Exception:
+                return []
+            values = values if isinstance(values, dict) else {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labels, key)} {float(value)}" for key, value in sorted(values.items())]
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram with p50/p95/p99 estimates
+
+    Observing is one binary search and a few increments under a lock.
+    Quantiles are interpolated within buckets at scrape time and exported as
+    a separate `<name>_quantile` gauge family next to the standard buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, list] = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *label_values: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values: str):
+        """Observe the duration of a with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside the bucket containing it"""
+        with self._lock:
+            series = list(self._series.get(label_values) or [])
+        return self._quantile(q, series)
+
+    def _quantile(self, q: float, series: list) -> Optional[float]:
+        counts = series[:-1]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            series = {key: list(value) for key, value in self._series.items()}
+        lines += [f"# HELP {self.name}_quantile Estimated {self.help.lower()} quantiles",
+                  f"# TYPE {self.name}_quantile gauge"]
+        for key, values in sorted(series.items()):
+            for q in QUANTILES:
+                labels = _format_labels(self.labels, key, f'quantile="{q}"')
+                value = self._quantile(q, values)
+                lines.append(f"{self.name}_quantile{labels} {'NaN' if value is None else value}")
+        return lines
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = {key: list(value) for key, value in self._series.items()}
+        lines = []
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {values[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Tuple[str, ...] = (), callback: Optional[Callable] = None) -> Gauge:
+        return self._register(Gauge(name, help_text, labels, callback))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        """Render every metric (values are per process)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry shared by RAGSystem and the web apps
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram("rag_stage_duration_seconds", "Duration of request pipeline stages in seconds", ("stage",))
+
+def observe_stage(stage: str, seconds: float):
+    """Record the duration of one pipeline stage"""
+    STAGE_SECONDS.observe(seconds, stage)
+
+def stage_timer(stage: str):
+    """Context manager timing a pipeline stage, e.g. `with stage_timer("llm"): ...`"""
+    return STAGE_SECONDS.time(stage)
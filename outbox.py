@@ -0,0 +1,268 @@
+# outbox.py
+import time
+import sqlite3
+import smtplib
+import threading
+from contextlib import closing
+from email.mime.text import MIMEText
+from typing import List, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EmailOutbox:
+    """
+    Persistent SQLite queue of outgoing emails
+
+    Messages survive restarts and are claimed atomically, so several worker
+    processes can share one outbox file without sending a message twice.
+    """
+
+    def __init__(self, db_file: str = "outbox.db", claim_timeout: float = 300.0):
+        """
+        Args:
+            db_file: Path of the SQLite database holding queued messages
+            claim_timeout: Seconds after which a message claimed by a crashed sender is retried
+        """
+        self.db_file = db_file
+        self.claim_timeout = claim_timeout
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sender TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    claimed_at REAL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue(self, sender: str, recipient: str, subject: str, body: str) -> int:
+        """
+        Add a message to the outbox
+
+        Returns:
+            ID of the queued message
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO outbox (sender, recipient, subject, body, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (sender, recipient, subject, body, now, now)
+            )
+            return cursor.lastrowid
+
+    def claim_batch(self, limit: int = 10) -> List[Dict]:
+        """
+        Atomically claim up to `limit` messages that are due for sending
+
+        Returns:
+            Claimed messages as dictionaries
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                """SELECT * FROM outbox
+                   WHERE (status = 'pending' AND next_attempt_at <= ?)
+                      OR (status = 'sending' AND claimed_at <= ?)
+                   ORDER BY next_attempt_at LIMIT ?""",
+                (now, now - self.claim_timeout, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, row["id"]) for row in rows]
+            )
+            conn.execute("COMMIT")
+            return [dict(row) for row in rows]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def mark_sent(self, message_id: int):
+        """Record a successful delivery"""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL WHERE id = ?",
+                (message_id,)
+            )
+
+    def mark_failed(self, message_id: int, error: str, retry_in: Optional[float]):
+        """
+        Record a failed delivery attempt
+
+        Args:
+            message_id: ID of the message
+            error: Error description
+            retry_in: Seconds until the next attempt, or None to give up
+        """
+        with closing(self._connect()) as conn:
+            if retry_in is None:
+                conn.execute(
+                    "UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    (error, message_id)
+                )
+            else:
+                conn.execute(
+                    """UPDATE outbox SET status = 'pending', attempts = attempts + 1, last_error = ?,
+                       next_attempt_at = ? WHERE id = ?""",
+                    (error, time.time() + retry_in, message_id)
+                )
+
+    def release(self, message_ids: List[int]):
+        """Return claimed messages to the queue without counting an attempt"""
+        with closing(self._connect()) as conn:
+            conn.executemany("UPDATE outbox SET status = 'pending' WHERE id = ?", [(message_id,) for message_id in message_ids])
+
+    def stats(self) -> Dict:
+        """Return message counts per status"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS count FROM outbox GROUP BY status").fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+class OutboxSender:
+    """
+    Background worker that drains an EmailOutbox over one reused SMTP connection
+
+    Due messages are sent in batches over a single authenticated connection,
+    which is kept open between batches and closed after `idle_timeout`.
+    Failures are retried with exponential backoff up to `max_attempts`.
+    Point it at a local stand-in server (e.g. `python -m aiosmtpd -n -l localhost:1025`
+    with SMTP_USE_SSL=0) to test without real mail delivery.
+    """
+
+    def __init__(self, outbox: EmailOutbox, host: str = "smtp.gmail.com", port: int = 465,
+                 username: Optional[str] = None, password: Optional[str] = None, use_ssl: bool = True,
+                 batch_size: int = 10, poll_interval: float = 5.0, idle_timeout: float = 60.0,
+                 max_attempts: int = 5, base_backoff: float = 2.0, max_backoff: float = 600.0):
+        self.outbox = outbox
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._smtp = None
+        self._last_used = 0.0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def ensure_started(self):
+        """Start the background sender thread if it is not running"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping.clear()
+                self._worker = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+                self._worker.start()
+
+    def wake(self):
+        """Ask the sender to check the outbox immediately"""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the sender thread and close the SMTP connection"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            self._close()
+
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        smtp = smtp_class(self.host, self.port, timeout=30)
+        smtp.ehlo()
+        if self.username and self.password and smtp.has_extn("auth"):
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+        logger.info(f"Opened SMTP connection to {self.host}:{self.port}")
+        return smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _backoff(self, attempts: int) -> Optional[float]:
+        if attempts >= self.max_attempts:
+            return None
+        return min(self.base_backoff * (2 ** (attempts - 1)), self.max_backoff)
+
+    def send_batch(self) -> int:
+        """
+        Send one batch of due messages
+
+        Returns:
+            Number of messages claimed
+        """
+        batch = self.outbox.claim_batch(self.batch_size)
+        for i, row in enumerate(batch):
+            msg = MIMEText(row["body"])
+            msg["Subject"] = row["subject"]
+            msg["From"] = row["sender"]
+            msg["To"] = row["recipient"]
+
+            try:
+                self._connection().send_message(msg)
+                self._last_used = time.monotonic()
+                self.outbox.mark_sent(row["id"])
+            except (smtplib.SMTPException, OSError) as e:
+                attempts = row["attempts"] + 1
+                retry_in = self._backoff(attempts)
+                logger.warning(f"Email {row['id']} attempt {attempts} failed: {e}"
+                               + (f"; retrying in {retry_in:.0f}s" if retry_in is not None else "; giving up"))
+                self.outbox.mark_failed(row["id"], str(e), retry_in)
+                self._close()
+                # The server is likely unavailable; release the rest of the batch for a later retry
+                self.outbox.release([pending["id"] for pending in batch[i + 1:]])
+                break
+        return len(batch)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                if self.send_batch() == self.batch_size:
+                    continue  # More messages may be due
+            except Exception as e:
+                logger.error(f"Outbox sender error: {e}")
+
+            if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                self._close()
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+        self._close()
@@ -0,0 +1,138 @@
+# parallel_embed.py
+import os
+import math
+import time
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import logging
+from embedding_backends import EmbeddingBackend, create_backend
+
+logger = logging.getLogger(__name__)
+
+# A batch costs roughly batch_size x longest text in tokens, so batches of
+# short chunks can be larger for the same amount of work
+TOKENS_PER_BATCH = 8192
+MIN_BATCH_SIZE = 8
+MAX_BATCH_SIZE = 256
+
+# Model loaded once per worker process by `_init_worker`
+_worker_model = None
+
+def _init_worker(backend: str, model_name: str, threads: int):
+    global _worker_model
+    # Split the cores between workers instead of every process using all of them
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = create_backend(backend, model_name)
+
+def _encode_shard(texts: List[str], batch_size: int) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=batch_size)
+
+def estimate_tokens(text: str) -> int:
+    """Approximate wordpiece count (~4 characters per token plus [CLS]/[SEP])"""
+    return len(text) // 4 + 2
+
+def tuned_batch_size(texts: List[str], tokens_per_batch: int = TOKENS_PER_BATCH) -> int:
+    """Batch size that keeps padded batches of these texts near `tokens_per_batch` tokens"""
+    longest = max(estimate_tokens(text) for text in texts)
+    return int(np.clip(tokens_per_batch // longest, MIN_BATCH_SIZE, MAX_BATCH_SIZE))
+
+class ParallelEncoder(EmbeddingBackend):
+    """
+    Encode large chunk sets across a pool of worker processes, each holding its own model
+
+    Texts are sorted by length and cut into contiguous shards so every batch
+    holds texts of similar length (little padding), then the shard embeddings
+    are merged back into input order. Workers are started with the spawn
+    method, since forked copies of a loaded model do not work reliably.
+    """
+
+    name = "parallel"
+
+    def __init__(self, backend: str, model_name: str, workers: Optional[int] = None, shard_size: int = 512,
+                 tokens_per_batch: int = TOKENS_PER_BATCH):
+        """
+        Args:
+            backend: Embedding backend name loaded in every worker, see embedding_backends.BACKENDS
+            model_name: Sentence transformer model name
+            workers: Number of worker processes (default: CPU count)
+            shard_size: Maximum texts sent to a worker per task
+            tokens_per_batch: Padded token budget used to tune each shard's batch size
+        """
+        self.backend = backend
+        self.model_name = model_name
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.tokens_per_batch = tokens_per_batch
+        self.encoded = 0
+        self.encode_seconds = 0.0
+        self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.backend, self.model_name, threads)
+            )
+            logger.info(f"Started {self.workers} embedding workers ({threads} threads each)")
+        return self._executor
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Encode texts in parallel
+
+        Args:
+            texts: Texts to encode
+            batch_size: Fixed batch size, or None to tune it per shard from text lengths
+
+        Returns:
+            float32 array of shape (len(texts), dimension) in input order; not normalized
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype='float32')
+
+        start = time.perf_counter()
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        shard_size = min(self.shard_size, math.ceil(len(texts) / self.workers))
+        shards = [order[i:i + shard_size] for i in range(0, len(order), shard_size)]
+
+        pool = self._pool()
+        futures = []
+        for shard in shards:
+            shard_texts = [texts[i] for i in shard]
+            futures.append(pool.submit(_encode_shard, shard_texts,
+                                       batch_size or tuned_batch_size(shard_texts, self.tokens_per_batch)))
+
+        embeddings = None
+        for shard, future in zip(shards, futures):
+            result = future.result()
+            if embeddings is None:
+                embeddings = np.empty((len(texts), result.shape[1]), dtype='float32')
+            embeddings[shard] = result
+
+        self.encoded += len(texts)
+        self.encode_seconds += time.perf_counter() - start
+        return embeddings
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.encoded / self.encode_seconds if self.encode_seconds else 0.0
+
+    def close(self):
+        """Shut down the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
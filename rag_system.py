@@ -3,34 +3,631 @@ import os
 import json
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Hashable, Any, Iterable
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 import pickle
 import logging
+from chunk_store import ChunkStore
+from embedding_backends import create_backend
+from parallel_embed import ParallelEncoder
+from bm25_index import BM25Index, BM25IndexError, reciprocal_rank_fusion, tokenize
+from metrics import observe_stage
+from ann_index import (build_index, describe_index, supports_remove, search_parameters, index_memory_bytes,
+                       choose_index_type, index_type_of, rebuild_index)
+import threading
+import time
+import hashlib
+from contextlib import contextmanager, nullcontext
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run a single worker
+    fcntl = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Source tag of the hardcoded resume chunks from `RAGSystem.chunk_resume_data`
+BUILTIN_SOURCE = "builtin"
+
+# dense: embedding search; lexical: BM25 only (never loads the model); hybrid: both fused by RRF
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+
+# Chunk importance levels, lowest first
+IMPORTANCE_LEVELS = ("low", "medium", "high")
+
+@contextmanager
+def file_lock(path: str, exclusive: bool = True):
+    """Advisory lock on `path` shared by every process using it (a no-op without fcntl)"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def chunk_id(chunk: Dict) -> str:
+    """Stable ID of a chunk: its explicit "id", else derived from source, category and project name"""
+    if chunk.get("id"):
+        return chunk["id"]
+    parts = [chunk.get("source") or BUILTIN_SOURCE, chunk.get("category") or "chunk"]
+    project_name = (chunk.get("metadata") or {}).get("project_name")
+    if project_name:
+        parts.append(project_name)
+    return ":".join(parts)
+
+def faiss_id(stable_id: str) -> int:
+    """Map a stable chunk ID to a non-negative int64 FAISS id"""
+    digest = hashlib.blake2b(stable_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & 0x7FFF_FFFF_FFFF_FFFF
+
+def make_record(chunk: Dict) -> Dict:
+    """Build the chunk store record for a chunk, with its stable ID, FAISS id and content hash"""
+    stable_id = chunk_id(chunk)
+    return {
+        "id": stable_id,
+        "faiss_id": faiss_id(stable_id),
+        "hash": hashlib.sha1(chunk["content"].encode("utf-8")).hexdigest(),
+        "source": chunk.get("source") or BUILTIN_SOURCE,
+        "content": chunk["content"],
+        "category": chunk.get("category"),
+        "metadata": chunk.get("metadata") or {}
+    }
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count (~4 characters per token)"""
+    return (len(text) + 3) // 4
+
+def normalize_query(query: str) -> str:
+    """Normalize query text for cache keys (case and whitespace insensitive)"""
+    return " ".join(query.lower().split())
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache with an optional TTL and hit/miss counters
+    """
+    
+    def __init__(self, max_size: int = 256, ttl: Optional[float] = None):
+        """
+        Args:
+            max_size: Maximum number of entries kept before evicting the least recently used
+            ttl: Seconds an entry stays valid, or None to keep entries until evicted
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key: Hashable, value: Any):
+        """Store value under key, evicting the least recently used entries if full"""
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        """Return size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+@dataclass
+class RetrievalResult:
+    """
+    Chunks retrieved for one query, carried through the whole request pipeline
+    
+    Iterating yields (chunk_text, similarity_score, metadata) tuples, so a result
+    can be used anywhere the list returned by `retrieve_relevant_chunks` is.
+    """
+    query: str
+    top_k: int
+    chunks: List[str] = field(default_factory=list)
+    scores: List[float] = field(default_factory=list)
+    metadata: List[Dict] = field(default_factory=list)
+    embedding: Optional[np.ndarray] = None  # L2-normalized query embedding
+    timings: Dict[str, float] = field(default_factory=dict)  # milliseconds per stage
+    cached: bool = False
+    mode: str = "dense"  # retrieval mode that produced the result; lexical results have no embedding
+    rerank_scores: Optional[List[float]] = None  # cross-encoder scores when reranked; `scores` stay first-stage
+    rerank: Optional[Dict] = None  # reranker status, latency and first-stage ranks, see `RAGSystem.retrieve_batch`
+    
+    def __iter__(self):
+        return iter(zip(self.chunks, self.scores, self.metadata))
+    
+    def __len__(self) -> int:
+        return len(self.chunks)
+    
+    def __getitem__(self, i: int) -> Tuple[str, float, Dict]:
+        return self.chunks[i], self.scores[i], self.metadata[i]
+    
+    def truncate(self, top_k: int) -> "RetrievalResult":
+        """Return a copy limited to the best top_k chunks"""
+        return replace(self, top_k=top_k, chunks=self.chunks[:top_k], scores=self.scores[:top_k],
+                       metadata=self.metadata[:top_k],
+                       rerank_scores=self.rerank_scores[:top_k] if self.rerank_scores is not None else None)
+    
+    def to_dict(self, preview_chars: Optional[int] = None) -> Dict:
+        """Serialize for JSON responses, optionally truncating chunk content"""
+        result = {
+            "query": self.query,
+            "top_k": self.top_k,
+            "cached": self.cached,
+            "mode": self.mode,
+            "timings_ms": self.timings,
+            "retrieved_chunks": [
+                {
+                    "content": chunk[:preview_chars] + "..." if preview_chars and len(chunk) > preview_chars else chunk,
+                    "similarity_score": score,
+                    "metadata": metadata
+                }
+                for chunk, score, metadata in self
+            ]
+        }
+        if self.rerank is not None:
+            result["rerank"] = self.rerank
+            for chunk, score in zip(result["retrieved_chunks"], self.rerank_scores or []):
+                chunk["rerank_score"] = score
+        return result
+
+@dataclass(frozen=True)
+class ChunkFilter:
+    """
+    Metadata restriction applied inside the search (hashable, so it can be part of cache keys)
+    
+    Each field is None (no restriction) or a tuple of accepted values; a chunk
+    must match every given field.
+    """
+    section: Optional[Tuple[str, ...]] = None
+    category: Optional[Tuple[str, ...]] = None
+    min_importance: Optional[str] = None
+    
+    @classmethod
+    def create(cls, section=None, category=None, min_importance: Optional[str] = None) -> Optional["ChunkFilter"]:
+        """
+        Build a filter from single values or lists of values
+        
+        Returns:
+            ChunkFilter, or None when no restriction is given
+        """
+        def values(value):
+            if not value:
+                return None
+            return (value,) if isinstance(value, str) else tuple(sorted(value))
+        
+        if min_importance is not None and min_importance not in IMPORTANCE_LEVELS:
+            raise ValueError(f"Unknown importance '{min_importance}'. Choose from: {', '.join(IMPORTANCE_LEVELS)}")
+        chunk_filter = cls(values(section), values(category), min_importance)
+        return chunk_filter if chunk_filter != cls() else None
+
+@dataclass
+class AssembledContext:
+    """Context selected from a RetrievalResult for a prompt, with what was dropped and why"""
+    text: str
+    chunks: List[str] = field(default_factory=list)
+    scores: List[float] = field(default_factory=list)
+    metadata: List[Dict] = field(default_factory=list)
+    stats: Dict[str, int] = field(default_factory=dict)
+
+class IndexSnapshot:
+    """
+    One immutable version of the FAISS index, its chunk store and BM25 index
+    
+    Updates build a new snapshot and swap it in with a single assignment, so a
+    reader that took a snapshot always searches a consistent index/chunk pair.
+    Readers take no lock: they read `RAGSystem._snapshot` once per request and
+    use only that object, which stays valid (and its files mapped) for as long
+    as they hold it, even after newer versions are published.
+    """
+    
+    def __init__(self, index=None, store: Optional[ChunkStore] = None, lexical: Optional[BM25Index] = None):
+        self.index = index
+        self.store = store
+        self.lexical = lexical
+        self.version = 0
+        self._facets = None  # (field, value) -> boolean mask over chunk positions, see `mask`
+        self._facets_lock = threading.Lock()
+        
+        # Sorted FAISS ids for vectorized id -> chunk position lookups
+        self._sorted_ids = None
+        self._order = None
+        if store is not None and store.ids is not None and hasattr(index, "id_map"):
+            self._order = np.argsort(store.ids, kind="stable")
+            self._sorted_ids = store.ids[self._order]
+    
+    @property
+    def id_mapped(self) -> bool:
+        """Whether vectors are addressed by stable FAISS ids (older indexes use chunk positions)"""
+        return self._sorted_ids is not None
+    
+    @property
+    def chunks(self):
+        return self.store.texts if self.store is not None else []
+    
+    @property
+    def metadata(self):
+        return self.store.metadata if self.store is not None else []
+    
+    @property
+    def categories(self):
+        return self.store.categories if self.store is not None else []
+    
+    def __len__(self) -> int:
+        return len(self.store) if self.store is not None else 0
+    
+    def memory_bytes(self) -> int:
+        """Approximate memory held by this version (index, BM25 arrays and the mapped chunk store)"""
+        total = index_memory_bytes(self.index)
+        if self.lexical is not None:
+            total += self.lexical.memory_bytes()
+        if self.store is not None:
+            total += self.store.memory_bytes()
+        if self._sorted_ids is not None:
+            total += self._sorted_ids.nbytes + self._order.nbytes
+        return total
+    
+    def _facet_masks(self) -> Dict[Tuple[str, str], np.ndarray]:
+        # Built once per version on the first filtered search, by one pass over the chunk store
+        if self._facets is None:
+            with self._facets_lock:
+                if self._facets is None:
+                    start = time.perf_counter()
+                    members = {}
+                    for position, record in enumerate(self.store or ()):
+                        metadata = record.get("metadata") or {}
+                        for key in (("category", record.get("category")), ("section", metadata.get("section")),
+                                     ("importance", metadata.get("importance"))):
+                            members.setdefault(key, []).append(position)
+                    facets = {}
+                    for key, positions in members.items():
+                        facets[key] = np.zeros(len(self), dtype=bool)
+                        facets[key][positions] = True
+                    self._facets = facets
+                    logger.info(f"Built {len(facets)} metadata bitmaps over {len(self)} chunks "
+                                f"in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return self._facets
+    
+    def mask(self, chunk_filter: Optional[ChunkFilter]) -> Optional[np.ndarray]:
+        """
+        Boolean mask of the chunk positions accepted by a filter
+        
+        Returns:
+            Mask over chunk positions, or None when nothing is filtered
+        """
+        if chunk_filter is None:
+            return None
+        facets = self._facet_masks()
+        empty = np.zeros(len(self), dtype=bool)
+        
+        def any_of(field_name, values):
+            mask = empty.copy()
+            for value in values:
+                mask |= facets.get((field_name, value), empty)
+            return mask
+        
+        mask = np.ones(len(self), dtype=bool)
+        if chunk_filter.section:
+            mask &= any_of("section", chunk_filter.section)
+        if chunk_filter.category:
+            mask &= any_of("category", chunk_filter.category)
+        if chunk_filter.min_importance:
+            mask &= any_of("importance", IMPORTANCE_LEVELS[IMPORTANCE_LEVELS.index(chunk_filter.min_importance):])
+        return mask
+    
+    def search(self, embeddings: np.ndarray, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the FAISS index, restricted to the chunk positions set in `mask`
+        
+        The restriction is applied inside FAISS with an id selector. Indexes or
+        FAISS builds that reject search parameters fall back to over-fetching
+        and post-filtering.
+        
+        Returns:
+            (similarities, FAISS ids), padded with -1 ids like `faiss.Index.search`
+        """
+        if mask is None:
+            return self.index.search(embeddings, k)
+        
+        allowed = np.flatnonzero(mask)
+        if len(allowed) == 0:
+            return (np.full((len(embeddings), k), -np.inf, dtype='float32'),
+                    np.full((len(embeddings), k), -1, dtype='int64'))
+        
+        allowed_ids = np.ascontiguousarray(self.store.ids[allowed] if self.id_mapped else allowed, dtype='int64')
+        try:
+            selector = faiss.IDSelectorBatch(allowed_ids)
+            params = search_parameters(self.index, selector, selectivity=len(allowed) / max(1, self.index.ntotal))
+            return self.index.search(embeddings, k, params=params)
+        except (RuntimeError, TypeError) as e:
+            logger.warning(f"Filtered search not supported by this index ({e}); post-filtering instead")
+        
+        # Over-fetch in proportion to the filter's selectivity, then drop disallowed hits
+        fetch = min(self.index.ntotal, k * max(2, 2 * len(self) // len(allowed)))
+        similarities, ids = self.index.search(embeddings, fetch)
+        keep = self.positions(ids)
+        keep = (keep >= 0) & mask[np.maximum(keep, 0)]
+        out_similarities = np.full((len(embeddings), k), -np.inf, dtype='float32')
+        out_ids = np.full((len(embeddings), k), -1, dtype='int64')
+        for row in range(len(embeddings)):
+            hits = np.flatnonzero(keep[row])[:k]
+            out_similarities[row, :len(hits)] = similarities[row, hits]
+            out_ids[row, :len(hits)] = ids[row, hits]
+        return out_similarities, out_ids
+    
+    def positions(self, ids: np.ndarray) -> np.ndarray:
+        """Map FAISS ids returned by a search to chunk positions (-1 where unknown)"""
+        ids = np.asarray(ids, dtype='int64')
+        if not self.id_mapped:
+            return np.where((ids >= 0) & (ids < len(self)), ids, -1)
+        if len(self._sorted_ids) == 0:
+            return np.full(ids.shape, -1, dtype='int64')
+        idx = np.clip(np.searchsorted(self._sorted_ids, ids), 0, len(self._sorted_ids) - 1)
+        found = (self._sorted_ids[idx] == ids) & (ids >= 0)
+        return np.where(found, self._order[idx], -1)
+
 class RAGSystem:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", index_file: str = "faiss_index.bin", chunks_file: str = "chunks.pkl"):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", index_file: str = "faiss_index.bin", chunks_file: str = "chunks.bin",
+                 cache_size: int = 256, cache_ttl: Optional[float] = None, embedding_backend: str = "sentence-transformers",
+                 index_type: str = "auto", memory_budget_mb: Optional[float] = None, build_workers: int = 1,
+                 retrieval_mode: str = "dense", min_score: float = 0.2, redundancy_threshold: float = 0.8,
+                 max_concurrent_encodes: int = 2, rerank: bool = False, reranker_model: Optional[str] = None,
+                 rerank_candidates: int = 20, rerank_budget_ms: float = 150.0, embedder: Optional["RAGSystem"] = None,
+                 reload_interval: float = 1.0):
         """
         Initialize RAG system with sentence transformer model and FAISS index
         
         Args:
             model_name: Sentence transformer model name
             index_file: Path to save/load FAISS index
-            chunks_file: Path to save/load text chunks
+            chunks_file: Path to save/load text chunks (memory-mapped chunk store)
+            cache_size: Maximum entries in the query embedding and retrieval caches (0 disables them)
+            cache_ttl: Optional lifetime in seconds of cached entries
+            embedding_backend: Encoder implementation, one of embedding_backends.BACKENDS
+            index_type: FAISS index type, one of ann_index.INDEX_TYPES or "auto" to pick by corpus size
+            memory_budget_mb: Memory cap considered when index_type is "auto"
+            build_workers: Embedding processes used when (re)building the index, see `update_chunks`
+            retrieval_mode: Default retrieval mode, one of RETRIEVAL_MODES
+            min_score: Cosine similarity below which dense results are left out of the context
+            redundancy_threshold: Token overlap (Jaccard) above which a chunk counts as a duplicate
+            max_concurrent_encodes: Encode calls allowed to run at once across request threads;
+                each already uses several cores, so more would only oversubscribe the CPU
+            rerank: Rerank first-stage candidates with a cross-encoder by default
+            reranker_model: Cross-encoder model (default: reranker.DEFAULT_RERANK_MODEL)
+            rerank_candidates: First-stage candidates fetched per query when reranking
+            rerank_budget_ms: Time a retrieval waits for rerank scores before keeping the first-stage order
+            embedder: Another RAGSystem whose embedding model, encode slots, query embedding cache
+                and reranker this one uses instead of loading its own (see kb_registry.py);
+                model_name, embedding_backend and max_concurrent_encodes are then taken from it
+            reload_interval: Seconds between checks whether another process (a second worker
+                or ingest.py) published a new index version, which is then loaded
         """
-        self.model = SentenceTransformer(model_name)
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{retrieval_mode}'. Choose from: {', '.join(RETRIEVAL_MODES)}")
+        if max_concurrent_encodes < 1:
+            raise ValueError("max_concurrent_encodes must be at least 1")
+        if embedder is not None:
+            model_name, embedding_backend = embedder.model_name, embedder.embedding_backend
+            max_concurrent_encodes = embedder.max_concurrent_encodes
+        self.embedder = embedder
+        self.model_name = model_name
+        self.embedding_backend = embedding_backend
+        self.index_type = index_type
+        self.memory_budget_mb = memory_budget_mb
+        self.build_workers = build_workers
+        self.retrieval_mode = retrieval_mode
+        self.min_score = min_score
+        self.redundancy_threshold = redundancy_threshold
+        self._model = None  # Loaded lazily on first encode, see `model`
+        self._model_lock = threading.Lock()
+        self.max_concurrent_encodes = max_concurrent_encodes
+        self._encode_slots = threading.BoundedSemaphore(max_concurrent_encodes)
+        self._encode_counts_lock = threading.Lock()
+        self._encodes_active = 0
+        self._encodes_waiting = 0
+        self.rerank = rerank
+        self.reranker_model = reranker_model
+        self.rerank_candidates = rerank_candidates
+        self.rerank_budget_ms = rerank_budget_ms
+        self._reranker = None  # Created on first use, see `reranker`
+        self.startup_timings = {}  # milliseconds per startup phase
         self.index_file = index_file
         self.chunks_file = chunks_file
-        self.index = None
-        self.chunks = []
-        self.chunk_metadata = []
+        self.lexical_file = os.path.splitext(index_file)[0] + ".bm25"  # BM25 index persisted with the FAISS index
+        # Updates hold the lock file exclusively across processes, then rewrite the version marker
+        self.lock_file = os.path.splitext(index_file)[0] + ".lock"
+        self.version_file = os.path.splitext(index_file)[0] + ".version"
+        self.reload_interval = reload_interval
+        self._disk_version = None  # version marker of the files the current snapshot was loaded from
+        self._version_checked_at = time.monotonic()
+        self._snapshot = IndexSnapshot()
+        self._update_lock = threading.RLock()  # Serializes index updates and swaps; searches never take it
+        
+        # Caches for repeated questions; retrieval results are keyed on the index version
+        self.index_version = 0
+        self.embedding_cache = embedder.embedding_cache if embedder is not None else LRUCache(cache_size, cache_ttl)
+        self.retrieval_cache = LRUCache(cache_size, cache_ttl)
         
         # Try to load existing index and chunks
         self.load_index()
     
+    @property
+    def index(self):
+        """FAISS index of the current version"""
+        return self._snapshot.index
+    
+    @property
+    def lexical_index(self) -> Optional[BM25Index]:
+        """BM25 index of the current version"""
+        return self._snapshot.lexical
+    
+    @property
+    def chunks(self):
+        """Chunk texts of the current version"""
+        return self._snapshot.chunks
+    
+    @property
+    def chunk_metadata(self):
+        """Chunk metadata of the current version"""
+        return self._snapshot.metadata
+    
+    @property
+    def chunk_categories(self):
+        """Chunk categories of the current version"""
+        return self._snapshot.categories
+    
+    @property
+    def model(self):
+        """Embedding backend, imported and loaded on first use"""
+        if self.embedder is not None:
+            return self.embedder.model
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = create_backend(self.embedding_backend, self.model_name)
+                    self.startup_timings["model_load"] = (time.perf_counter() - start) * 1000
+                    logger.info(f"Loaded {self.embedding_backend} embedding model {self.model_name} "
+                                f"in {self.startup_timings['model_load']:.0f}ms")
+        return self._model
+    
+    @property
+    def model_loaded(self) -> bool:
+        return self.embedder.model_loaded if self.embedder is not None else self._model is not None
+    
+    @property
+    def reranker_loaded(self) -> bool:
+        """Whether the reranker exists; reading `reranker` creates it"""
+        return self.embedder.reranker_loaded if self.embedder is not None else self._reranker is not None
+    
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the current index version, excluding the embedding model"""
+        return self._snapshot.memory_bytes()
+    
+    @property
+    def reranker(self):
+        """Cross-encoder reranker (its model loads on the first rerank)"""
+        if self.embedder is not None:
+            return self.embedder.reranker
+        if self._reranker is None:
+            with self._model_lock:
+                if self._reranker is None:
+                    from reranker import CrossEncoderReranker, DEFAULT_RERANK_MODEL
+                    self._reranker = CrossEncoderReranker(self.reranker_model or DEFAULT_RERANK_MODEL,
+                                                          budget_ms=self.rerank_budget_ms)
+        return self._reranker
+    
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Encode texts with the embedding model, at most `max_concurrent_encodes` calls at a time
+        
+        Callers beyond the cap wait for a slot; the wait is recorded as the
+        "encode_wait" stage so queueing shows up separately from encode time.
+        
+        Args:
+            texts: Texts to encode
+            batch_size: Number of texts per forward pass
+            
+        Returns:
+            float32 array of shape (len(texts), dimension); not normalized
+        """
+        if self.embedder is not None:
+            return self.embedder.encode(texts, batch_size)
+        model = self.model
+        with self._encode_counts_lock:
+            self._encodes_waiting += 1
+        start = time.perf_counter()
+        with self._encode_slots:
+            with self._encode_counts_lock:
+                self._encodes_waiting -= 1
+                self._encodes_active += 1
+            observe_stage("encode_wait", time.perf_counter() - start)
+            try:
+                return model.encode(texts, batch_size=batch_size)
+            finally:
+                with self._encode_counts_lock:
+                    self._encodes_active -= 1
+    
+    def concurrency_stats(self) -> Dict:
+        """Encode slots in use and callers waiting for one"""
+        if self.embedder is not None:
+            return self.embedder.concurrency_stats()
+        with self._encode_counts_lock:
+            return {
+                "max_concurrent_encodes": self.max_concurrent_encodes,
+                "encodes_active": self._encodes_active,
+                "encodes_waiting": self._encodes_waiting
+            }
+    
+    def warm_up(self, background: bool = False, encode: bool = True) -> Optional[threading.Thread]:
+        """
+        Load the embedding model ahead of the first query
+        
+        Args:
+            background: Load in a daemon thread and return it instead of blocking
+            encode: Also run one dummy encode so lazy kernels are initialized; skip this
+                before forking worker processes, as thread pools do not survive fork
+            
+        Returns:
+            The warm-up thread when background is True, otherwise None
+        """
+        def _warm():
+            try:
+                self.model  # Loads the weights
+                if self.rerank:
+                    self.reranker.model
+                if encode:
+                    start = time.perf_counter()
+                    self.encode(["warm up"])
+                    self.startup_timings["warmup_encode"] = (time.perf_counter() - start) * 1000
+            except Exception as e:
+                logger.warning(f"Embedding model warm-up failed: {e}")
+        
+        if not background:
+            _warm()
+            return None
+        
+        thread = threading.Thread(target=_warm, name="rag-warmup", daemon=True)
+        thread.start()
+        return thread
+    
     def chunk_resume_data(self) -> List[Dict]:
         """
         Create meaningful chunks from resume data
@@ -103,12 +700,13 @@ class RAGSystem:
         
         return resume_chunks
     
-    def create_embeddings(self, force_recreate: bool = False):
+    def create_embeddings(self, force_recreate: bool = False, workers: Optional[int] = None):
         """
         Create embeddings for resume chunks and build FAISS index
         
         Args:
             force_recreate: Whether to recreate embeddings even if they exist
+            workers: Embedding processes, see `update_chunks`
         """
         if os.path.exists(self.index_file) and os.path.exists(self.chunks_file) and not force_recreate:
             logger.info("Embeddings already exist. Use force_recreate=True to rebuild.")
@@ -116,112 +714,707 @@ class RAGSystem:
         
         logger.info("Creating embeddings for resume chunks...")
         
-        # Get chunked data
-        resume_chunks = self.chunk_resume_data()
-        
-        # Extract text content for embedding
-        texts = [chunk["content"] for chunk in resume_chunks]
-        self.chunks = texts
-        self.chunk_metadata = [chunk["metadata"] for chunk in resume_chunks]
-        
-        # Create embeddings
-        embeddings = self.model.encode(texts, convert_to_tensor=False)
-        embeddings = np.array(embeddings).astype('float32')
+        # Re-embed everything into a freshly built index
+        stats = self.update_chunks(self.chunk_resume_data(), replace_sources={BUILTIN_SOURCE}, rebuild=True, workers=workers)
         
-        # Create FAISS index
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)  # Inner Product for cosine similarity
+        logger.info(f"Created embeddings for {stats['total']} chunks in a {describe_index(self.index).get('type')} index")
+    
+    def refresh_builtin_chunks(self) -> Dict:
+        """
+        Incrementally sync the built-in resume chunks into the index
         
-        # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(embeddings)
+        Unchanged chunks keep their vectors; only new or edited chunks are embedded.
         
-        # Add embeddings to index
-        self.index.add(embeddings)
+        Returns:
+            Update statistics, see `update_chunks`
+        """
+        return self.update_chunks(self.chunk_resume_data(), replace_sources={BUILTIN_SOURCE})
+    
+    def update_chunks(self, chunks: Iterable[Dict], delete_ids: Iterable[str] = (), replace_sources: Iterable[str] = (),
+                      rebuild: bool = False, batch_size: int = 64, workers: Optional[int] = None) -> Dict:
+        """
+        Upsert and delete chunks, then atomically swap in the new index version
         
-        # Save index and chunks
-        self.save_index()
+        Chunks are keyed by a stable ID (see `chunk_id`) and a content hash, so
+        unchanged chunks are never re-embedded. New files are written next to the
+        current ones and renamed into place, and in-flight searches keep using
+        the previous in-memory snapshot until the swap. Updates from several
+        processes are serialized by a file lock, and other processes serving the
+        same files load the new version on their next retrieval.
         
-        logger.info(f"Created embeddings for {len(texts)} chunks with dimension {dimension}")
+        Args:
+            chunks: Chunk dictionaries with content, category, metadata and optional id/source
+            delete_ids: Stable IDs of chunks to remove
+            replace_sources: Sources whose chunks missing from `chunks` are removed (sync semantics)
+            rebuild: Re-embed every chunk and build a fresh index instead of updating in place
+            batch_size: Number of chunks embedded per forward pass
+            workers: Embedding processes (default: `build_workers`); above 1, chunks are
+                encoded by a ParallelEncoder pool with length-tuned batch sizes
+            
+        Returns:
+            Counts of added, updated, unchanged, deleted and embedded chunks, total chunks,
+            elapsed seconds and embedding throughput in chunks per second
+        """
+        with self._update_lock, file_lock(self.lock_file):
+            # Build on the latest version on disk, which another process may have written
+            if self._read_disk_version() != self._disk_version:
+                self._load_index(lock=False)
+            start = time.perf_counter()
+            old = self._snapshot
+            delete_ids = set(delete_ids)
+            replace_sources = set(replace_sources)
+            
+            # Update a copy of the current index in place when possible; otherwise rebuild,
+            # reusing the stored vectors of unchanged chunks unless a full rebuild was requested
+            incremental = not rebuild and old.id_mapped and supports_remove(old.index)
+            reuse_vectors = not rebuild and old.id_mapped
+            index = faiss.clone_index(old.index) if incremental else None
+            
+            previous = {}  # stable id -> content hash in the current version
+            if old.id_mapped:
+                for record in old.store:
+                    previous[record["id"]] = record["hash"]
+            
+            stats = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0, "embedded": 0}
+            embed_seconds = 0.0
+            seen = set()
+            pending = []  # records that need (re-)embedding
+            to_remove = []  # FAISS ids to drop from an incrementally updated index
+            rebuild_ids, rebuild_vectors = [], []
+            
+            # Large builds are sharded across worker processes, each holding its own model;
+            # pending chunks are then flushed in windows big enough to keep every worker busy
+            workers = workers or self.build_workers
+            encoder = ParallelEncoder(self.embedding_backend, self.model_name, workers) if workers > 1 else None
+            flush_size = encoder.shard_size * workers if encoder else batch_size
+            
+            def flush():
+                nonlocal embed_seconds
+                if incremental and to_remove:
+                    index.remove_ids(np.array(to_remove, dtype='int64'))
+                    to_remove.clear()
+                if not pending:
+                    return
+                texts = [record["content"] for record in pending]
+                encode_start = time.perf_counter()
+                if encoder:
+                    embeddings = encoder.encode(texts)
+                else:
+                    embeddings = self.encode(texts, batch_size=batch_size)
+                embed_seconds += time.perf_counter() - encode_start
+                stats["embedded"] += len(texts)
+                faiss.normalize_L2(embeddings)
+                ids = np.array([record["faiss_id"] for record in pending], dtype='int64')
+                if incremental:
+                    index.add_with_ids(embeddings, ids)
+                else:
+                    rebuild_vectors.append(embeddings)
+                    rebuild_ids.append(ids)
+                pending.clear()
+            
+            def keep(record, changed):
+                if incremental and not changed:
+                    return record
+                vector = None
+                if reuse_vectors and not changed:
+                    try:
+                        vector = old.index.reconstruct(record["faiss_id"]).reshape(1, -1)
+                    except RuntimeError:
+                        vector = None
+                if vector is not None:
+                    rebuild_vectors.append(vector)
+                    rebuild_ids.append(np.array([record["faiss_id"]], dtype='int64'))
+                else:
+                    pending.append(record)
+                    if len(pending) >= flush_size:
+                        flush()
+                return record
+            
+            def records():
+                for chunk in chunks:
+                    record = make_record(chunk)
+                    if record["id"] in seen:
+                        logger.warning(f"Skipping duplicate chunk id '{record['id']}'")
+                        continue
+                    seen.add(record["id"])
+                    if record["id"] in delete_ids:
+                        continue
+                    
+                    previous_hash = previous.get(record["id"])
+                    changed = previous_hash != record["hash"]
+                    if previous_hash is None:
+                        stats["added"] += 1
+                    elif changed:
+                        stats["updated"] += 1
+                        to_remove.append(record["faiss_id"])
+                    else:
+                        stats["unchanged"] += 1
+                    yield keep(record, changed)
+                
+                # Carry over existing chunks that were not upserted, deleted or replaced
+                if old.store is not None:
+                    for record in old.store:
+                        if "id" not in record:
+                            record = make_record(record)  # Chunk store written before stable IDs
+                        if record["id"] in seen:
+                            continue
+                        if record["id"] in delete_ids or record["source"] in replace_sources:
+                            stats["deleted"] += 1
+                            to_remove.append(record["faiss_id"])
+                            continue
+                        yield keep(record, changed=False)
+                flush()
+            
+            # Per-process temporary names; the file lock keeps the renames of concurrent updates apart
+            tmp_suffix = f".new.{os.getpid()}"
+            new_chunks_file = self.chunks_file + tmp_suffix
+            try:
+                stats["total"] = ChunkStore.write(new_chunks_file, records(), id_field="faiss_id")
+            finally:
+                if encoder:
+                    encoder.close()
+            
+            # The corpus may have outgrown (or shrunk below) the index type "auto" picked for it
+            if incremental and self.index_type == "auto" and index.ntotal:
+                current_type = index_type_of(index)
+                chosen_type = choose_index_type(index.ntotal, index.d, self.memory_budget_mb)
+                if chosen_type != current_type:
+                    logger.info(f"Index now holds {index.ntotal} vectors; rebuilding it as {chosen_type} "
+                                f"instead of {current_type}")
+                    index = rebuild_index(index, chosen_type, self.memory_budget_mb)
+                    incremental = False
+            
+            if not incremental and rebuild_ids:
+                index = build_index(np.concatenate(rebuild_vectors), self.index_type, self.memory_budget_mb,
+                                    ids=np.concatenate(rebuild_ids))
+            
+            # BM25 statistics depend on the whole corpus, so the lexical index is rebuilt from the new store
+            new_store = ChunkStore(new_chunks_file)
+            try:
+                lexical = BM25Index.build(new_store.texts)
+            finally:
+                new_store.close()
+            
+            # Rename the files into place; a reader never sees a partially written file
+            if index is not None:
+                faiss.write_index(index, self.index_file + tmp_suffix)
+                lexical.save(self.lexical_file + tmp_suffix)
+                os.replace(new_chunks_file, self.chunks_file)
+                os.replace(self.lexical_file + tmp_suffix, self.lexical_file)
+                os.replace(self.index_file + tmp_suffix, self.index_file)
+            else:
+                os.replace(new_chunks_file, self.chunks_file)
+                for stale_file in (self.index_file, self.lexical_file):
+                    if os.path.exists(stale_file):
+                        os.remove(stale_file)
+            
+            self._publish(IndexSnapshot(index, ChunkStore(self.chunks_file), lexical))
+            self._disk_version = self._write_disk_version()
+            
+            stats["seconds"] = time.perf_counter() - start
+            stats["chunks_per_sec"] = stats["embedded"] / embed_seconds if embed_seconds else 0.0
+            logger.info(f"Index updated ({'incremental' if incremental else 'rebuild'}): {stats['added']} added, "
+                        f"{stats['updated']} updated, {stats['unchanged']} unchanged, {stats['deleted']} deleted, "
+                        f"{stats['total']} total in {stats['seconds']:.2f}s; embedded {stats['embedded']} chunks "
+                        f"at {stats['chunks_per_sec']:.1f} chunks/s with {workers} worker(s)")
+            return stats
+    
+    def _publish(self, snapshot: IndexSnapshot):
+        """Make a snapshot the current version and invalidate cached results"""
+        with self._update_lock:
+            self.invalidate_cache()
+            snapshot.version = self.index_version
+            self._snapshot = snapshot
     
     def save_index(self):
-        """Save FAISS index and chunks to disk"""
-        if self.index is not None:
-            faiss.write_index(self.index, self.index_file)
-            
-            with open(self.chunks_file, 'wb') as f:
-                pickle.dump({
-                    'chunks': self.chunks,
-                    'metadata': self.chunk_metadata
-                }, f)
+        """Save FAISS index to disk (chunks are written whenever the index is updated)"""
+        index = self.index
+        if index is not None:
+            # Write to a temporary file and rename so readers never see a half-written index
+            tmp_index_file = f"{self.index_file}.tmp.{os.getpid()}"
+            faiss.write_index(index, tmp_index_file)
+            os.replace(tmp_index_file, self.index_file)
             
-            logger.info(f"Saved index to {self.index_file} and chunks to {self.chunks_file}")
+            logger.info(f"Saved index to {self.index_file}")
     
     def load_index(self):
         """Load FAISS index and chunks from disk"""
+        with self._update_lock:
+            self._load_index()
+    
+    def _read_disk_version(self) -> Optional[str]:
+        """Version marker of the files on disk, or None if no update has written one"""
         try:
+            with open(self.version_file, 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def _write_disk_version(self) -> str:
+        """Record that new files were published (file lock held)"""
+        version = f"{os.getpid()}-{time.time_ns()}"
+        tmp_version_file = f"{self.version_file}.tmp.{os.getpid()}"
+        with open(tmp_version_file, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(tmp_version_file, self.version_file)
+        return version
+    
+    def _reload_if_changed(self):
+        """Load the index another process published since this one last loaded, at most every `reload_interval`"""
+        now = time.monotonic()
+        if now - self._version_checked_at < self.reload_interval:
+            return
+        self._version_checked_at = now
+        if self._read_disk_version() == self._disk_version:
+            return
+        with self._update_lock:
+            if self._read_disk_version() != self._disk_version:
+                logger.info(f"Index files changed on disk; reloading {self.index_file}")
+                self._load_index()
+    
+    def _load_index(self, lock: bool = True):
+        # A shared lock keeps an update in another process from renaming files mid-load
+        lock = lock and os.path.isdir(os.path.dirname(self.lock_file) or ".")
+        with file_lock(self.lock_file, exclusive=False) if lock else nullcontext():
+            self._disk_version = self._read_disk_version()
+            self._load_files()
+    
+    def _load_files(self):
+        try:
+            self._migrate_legacy_chunks()
             if os.path.exists(self.index_file) and os.path.exists(self.chunks_file):
-                self.index = faiss.read_index(self.index_file)
+                start = time.perf_counter()
+                index = self._read_index(self.index_file)
                 
-                with open(self.chunks_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.chunks = data['chunks']
-                    self.chunk_metadata = data['metadata']
+                # Chunks stay on disk in a read-only mapping shared across worker processes
+                store = ChunkStore(self.chunks_file)
+                if index.ntotal != len(store):
+                    logger.warning(f"Index has {index.ntotal} vectors but chunk store has {len(store)} chunks")
                 
+                self._publish(IndexSnapshot(index, store, self._load_lexical(store)))
+                self.startup_timings["index_load"] = (time.perf_counter() - start) * 1000
                 logger.info(f"Loaded index and {len(self.chunks)} chunks from disk")
         except Exception as e:
             logger.warning(f"Could not load existing index: {e}")
-            self.index = None
-            self.chunks = []
-            self.chunk_metadata = []
+            self._publish(IndexSnapshot())
+    
+    def _load_lexical(self, store: ChunkStore) -> Optional[BM25Index]:
+        """Load the BM25 index, building it for indexes created before it existed"""
+        try:
+            if os.path.exists(self.lexical_file):
+                try:
+                    lexical = BM25Index.load(self.lexical_file)
+                except BM25IndexError as e:
+                    logger.warning(f"{e}; rebuilding")
+                else:
+                    if lexical.num_docs == len(store):
+                        return lexical
+                    logger.warning(f"BM25 index covers {lexical.num_docs} chunks but chunk store has {len(store)}; "
+                                   f"rebuilding")
+            lexical = BM25Index.build(store.texts)
+            lexical.save(self.lexical_file)
+            logger.info(f"Built BM25 index over {lexical.num_docs} chunks at {self.lexical_file}")
+            return lexical
+        except Exception as e:
+            logger.warning(f"Could not load BM25 index, lexical retrieval disabled: {e}")
+            return None
+    
+    @staticmethod
+    def _read_index(index_file: str):
+        """Memory-map the FAISS index read-only where the index type supports it"""
+        try:
+            return faiss.read_index(index_file, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception as e:
+            logger.info(f"Memory-mapped load not supported for {index_file} ({e}); reading into memory")
+            return faiss.read_index(index_file)
+    
+    def _migrate_legacy_chunks(self):
+        """Convert a chunks.pkl written by older versions into the chunk store format"""
+        legacy_file = os.path.splitext(self.chunks_file)[0] + ".pkl"
+        if legacy_file == self.chunks_file or os.path.exists(self.chunks_file) or not os.path.exists(legacy_file):
+            return
+        
+        with open(legacy_file, 'rb') as f:
+            data = pickle.load(f)
+        
+        ChunkStore.write(self.chunks_file, (
+            {"content": chunk, "category": None, "metadata": metadata}
+            for chunk, metadata in zip(data['chunks'], data['metadata'])
+        ))
+        logger.info(f"Migrated {len(data['chunks'])} chunks from {legacy_file} to {self.chunks_file}")
     
-    def retrieve_relevant_chunks(self, query: str, top_k: int = 3) -> List[Tuple[str, float, Dict]]:
+    def retrieve_relevant_chunks(self, query: str, top_k: int = 3, mode: Optional[str] = None,
+                                 **filters) -> List[Tuple[str, float, Dict]]:
         """
         Retrieve most relevant chunks for a given query
         
         Args:
             query: User question/query
             top_k: Number of top chunks to retrieve
+            mode: Retrieval mode, one of RETRIEVAL_MODES (default: `retrieval_mode`)
+            **filters: section, category and/or min_importance restrictions, see `ChunkFilter.create`
             
         Returns:
             List of tuples (chunk_text, similarity_score, metadata)
         """
-        if self.index is None or len(self.chunks) == 0:
-            logger.warning("Index not found. Creating embeddings...")
-            self.create_embeddings()
+        return list(self.retrieve(query, top_k, mode, **filters))
+    
+    def retrieve(self, query: str, top_k: int = 3, mode: Optional[str] = None, section=None, category=None,
+                 min_importance: Optional[str] = None, rerank: Optional[bool] = None) -> RetrievalResult:
+        """
+        Retrieve most relevant chunks for a given query as a structured result
+        
+        Args:
+            query: User question/query
+            top_k: Number of top chunks to retrieve
+            mode: Retrieval mode, one of RETRIEVAL_MODES (default: `retrieval_mode`)
+            section: Only search chunks of this section (or any of a list of sections)
+            category: Only search chunks of this category (or any of a list of categories)
+            min_importance: Only search chunks at least this important, one of IMPORTANCE_LEVELS
+            rerank: Rerank candidates with the cross-encoder (default: `rerank`)
+            
+        Returns:
+            RetrievalResult with chunks, scores, metadata, query embedding and timings
+        """
+        chunk_filter = ChunkFilter.create(section, category, min_importance)
+        return self.retrieve_batch([query], top_k, mode, chunk_filter, rerank)[0]
+    
+    def retrieve_batch(self, queries: List[str], top_k: int = 3, mode: Optional[str] = None,
+                       chunk_filter: Optional[ChunkFilter] = None, rerank: Optional[bool] = None) -> List[RetrievalResult]:
+        """
+        Retrieve relevant chunks for several queries with a single encode and search
+        
+        Scores are cosine similarities in dense mode, BM25 scores in lexical mode
+        and reciprocal rank fusion scores in hybrid mode. When reranking,
+        `rerank_candidates` chunks are fetched per query and the cross-encoder
+        picks the top_k; if it misses `rerank_budget_ms`, the first-stage order
+        is kept and `rerank["status"]` says why.
+        
+        Args:
+            queries: User questions/queries
+            top_k: Number of top chunks to retrieve per query
+            mode: Retrieval mode, one of RETRIEVAL_MODES (default: `retrieval_mode`)
+            chunk_filter: Metadata restriction applied inside the searches
+            rerank: Rerank candidates with the cross-encoder (default: `rerank`)
+            
+        Returns:
+            One RetrievalResult per query, in the same order as the queries
+        """
+        if not queries:
+            return []
+        
+        mode = mode or self.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}'. Choose from: {', '.join(RETRIEVAL_MODES)}")
+        
+        self._reload_if_changed()
+        if self.rerank if rerank is None else rerank:
+            candidates = self.retrieve_batch(queries, self.candidate_count(top_k, True), mode, chunk_filter, rerank=False)
+            return self.rerank_results(candidates, top_k)
+        
+        snapshot = self._snapshot
+        if snapshot.index is None or len(snapshot) == 0:
+            # Concurrent first requests wait for one build instead of each starting their own
+            with self._update_lock:
+                if self._snapshot.index is None or len(self._snapshot) == 0:
+                    logger.warning("Index not found. Creating embeddings...")
+                    self.create_embeddings()
+            snapshot = self._snapshot
+        if mode != "dense" and snapshot.lexical is None:
+            logger.warning(f"BM25 index unavailable; serving {mode} retrieval with dense search")
+            mode = "dense"
+        
+        keys = [(normalize_query(query), top_k, snapshot.version, mode, chunk_filter) for query in queries]
+        batch_results = [None] * len(queries)
+        misses = []
+        for i, key in enumerate(keys):
+            cached = self.retrieval_cache.get(key)
+            if cached is not None:
+                batch_results[i] = replace(cached, query=queries[i], cached=True)
+            else:
+                misses.append(i)
+        
+        if misses:
+            # Hybrid mode fuses deeper candidate lists from both retrievers
+            depth = max(4 * top_k, 20) if mode == "hybrid" else top_k
+            timings = {"batch_size": len(misses)}
+            mask = snapshot.mask(chunk_filter)
+            
+            if mode != "lexical":
+                # Encode all uncached queries in one forward pass
+                start = time.perf_counter()
+                query_embeddings = self.encode_queries([queries[i] for i in misses])
+                timings["encode"] = (time.perf_counter() - start) * 1000
+                observe_stage("encode", timings["encode"] / 1000)
+                
+                # Search for similar chunks
+                start = time.perf_counter()
+                similarities, ids = snapshot.search(query_embeddings, depth, mask)
+                positions = snapshot.positions(ids)  # FAISS pads missing results with -1
+                timings["search"] = (time.perf_counter() - start) * 1000
+                observe_stage("search", timings["search"] / 1000)
+            
+            if mode != "dense":
+                start = time.perf_counter()
+                lexical_hits = [snapshot.lexical.search(queries[i], depth, mask) for i in misses]
+                timings["lexical"] = (time.perf_counter() - start) * 1000
+                observe_stage("lexical", timings["lexical"] / 1000)
+            
+            for row, i in enumerate(misses):
+                if mode == "dense":
+                    ranked = [(position, float(similarity)) for similarity, position in zip(similarities[row], positions[row])
+                              if position >= 0]
+                elif mode == "lexical":
+                    ranked = [(int(position), float(score)) for position, score in zip(*lexical_hits[row])]
+                else:
+                    dense_ranking = [int(position) for position in positions[row] if position >= 0]
+                    ranked = reciprocal_rank_fusion([dense_ranking, lexical_hits[row][0].tolist()])[:top_k]
+                
+                result = RetrievalResult(
+                    query=queries[i],
+                    top_k=top_k,
+                    embedding=query_embeddings[row].copy() if mode != "lexical" else None,
+                    timings=timings,
+                    mode=mode
+                )
+                for position, score in ranked:
+                    result.chunks.append(snapshot.chunks[position])
+                    result.scores.append(score)
+                    result.metadata.append(snapshot.metadata[position])
+                batch_results[i] = result
+                self.retrieval_cache.put(keys[i], result)
         
-        # Encode query
-        query_embedding = self.model.encode([query], convert_to_tensor=False)
-        query_embedding = np.array(query_embedding).astype('float32')
-        faiss.normalize_L2(query_embedding)
+        if len(queries) == 1:
+            logger.info(f"Retrieved {len(batch_results[0])} relevant chunks for query: '{queries[0][:50]}...'")
+        else:
+            logger.info(f"Retrieved relevant chunks for a batch of {len(queries)} queries ({len(queries) - len(misses)} cached)")
+        return batch_results
+    
+    def candidate_count(self, top_k: int, rerank: Optional[bool] = None) -> int:
+        """First-stage results to fetch for top_k final results (default: `rerank`)"""
+        return max(top_k, self.rerank_candidates) if (self.rerank if rerank is None else rerank) else top_k
+    
+    def rerank_results(self, candidates: List[RetrievalResult], top_k: int) -> List[RetrievalResult]:
+        """
+        Reorder first-stage candidates by cross-encoder score and keep the best top_k
         
-        # Search for similar chunks
-        similarities, indices = self.index.search(query_embedding, top_k)
+        This is the second stage of `retrieve_batch`, for callers that fetch the
+        candidates themselves (rerank=False, `candidate_count` results) and want the
+        wait for scores to happen on their own thread.
+        """
+        start = time.perf_counter()
+        scores, info = self.reranker.rerank_batch([result.query for result in candidates],
+                                                  [result.chunks for result in candidates])
+        observe_stage("rerank", time.perf_counter() - start)
+        if scores is None:
+            logger.info(f"Rerank {info['status']} after {info['ms']:.0f}ms; keeping first-stage order")
         
         results = []
-        for i, (similarity, idx) in enumerate(zip(similarities[0], indices[0])):
-            if idx < len(self.chunks):  # Ensure valid index
-                results.append((
-                    self.chunks[idx],
-                    float(similarity),
-                    self.chunk_metadata[idx]
-                ))
-        
-        logger.info(f"Retrieved {len(results)} relevant chunks for query: '{query[:50]}...'")
+        for i, result in enumerate(candidates):
+            timings = {**result.timings, "rerank": info["ms"]}
+            if scores is None:
+                order = list(range(min(top_k, len(result))))
+                results.append(replace(result.truncate(top_k), timings=timings, rerank={**info, "first_stage_ranks": order}))
+                continue
+            order = np.argsort(-scores[i], kind="stable")[:top_k].tolist()
+            results.append(replace(
+                result,
+                top_k=top_k,
+                chunks=[result.chunks[j] for j in order],
+                scores=[result.scores[j] for j in order],
+                metadata=[result.metadata[j] for j in order],
+                rerank_scores=[float(scores[i][j]) for j in order],
+                timings=timings,
+                rerank={**info, "first_stage_ranks": order}
+            ))
         return results
     
-    def generate_context(self, query: str, top_k: int = 3) -> str:
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Encode queries into L2-normalized float32 embeddings, reusing cached ones
+        
+        Args:
+            queries: Query strings
+            
+        Returns:
+            Array of shape (len(queries), dimension)
+        """
+        keys = [normalize_query(query) for query in queries]
+        cached = [self.embedding_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        
+        if missing:
+            new_embeddings = self.encode([queries[i] for i in missing])
+            faiss.normalize_L2(new_embeddings)
+            for i, embedding in zip(missing, new_embeddings):
+                cached[i] = embedding
+                self.embedding_cache.put(keys[i], embedding.copy())
+        
+        return np.ascontiguousarray(np.stack(cached), dtype='float32')
+    
+    def compare_embedding_backend(self, backend: str, queries: List[str], top_k: int = 3) -> Dict:
+        """
+        Compare retrieval with another embedding backend against this system's backend
+        
+        Args:
+            backend: Backend name to evaluate (e.g. "onnx-int8")
+            queries: Evaluation queries
+            top_k: Number of chunks compared per query
+            
+        Returns:
+            Mean top_k overlap, mean embedding cosine similarity and per-query latencies
+        """
+        if self.index is None or len(self.chunks) == 0:
+            self.create_embeddings()
+        index = self.index
+        
+        candidate = create_backend(backend, self.model_name)
+        report = {"reference": self.embedding_backend, "candidate": backend, "top_k": top_k, "queries": []}
+        
+        for query in queries:
+            start = time.perf_counter()
+            reference_embedding = self.encode([query])
+            reference_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            candidate_embedding = candidate.encode([query])
+            candidate_ms = (time.perf_counter() - start) * 1000
+            
+            faiss.normalize_L2(reference_embedding)
+            faiss.normalize_L2(candidate_embedding)
+            _, reference_ids = index.search(reference_embedding, top_k)
+            _, candidate_ids = index.search(candidate_embedding, top_k)
+            
+            report["queries"].append({
+                "query": query,
+                "overlap": len(set(reference_ids[0]) & set(candidate_ids[0])) / top_k,
+                "cosine": float(np.dot(reference_embedding[0], candidate_embedding[0])),
+                "reference_ms": reference_ms,
+                "candidate_ms": candidate_ms
+            })
+        
+        for key in ("overlap", "cosine", "reference_ms", "candidate_ms"):
+            report[f"mean_{key}"] = float(np.mean([entry[key] for entry in report["queries"]]))
+        return report
+    
+    def invalidate_cache(self):
+        """Bump the index version and drop cached retrieval results"""
+        with self._update_lock:
+            self.index_version += 1
+            self.retrieval_cache.clear()
+    
+    def cache_stats(self) -> Dict:
+        """Return hit/miss counters for the embedding and retrieval caches"""
+        return {
+            "index_version": self.index_version,
+            "embedding_cache": self.embedding_cache.stats(),
+            "retrieval_cache": self.retrieval_cache.stats()
+        }
+    
+    def generate_context(self, query: str, top_k: int = 3, retrieval: Optional[RetrievalResult] = None,
+                         max_tokens: Optional[int] = None) -> str:
         """
         Generate context string from retrieved chunks
         
         Args:
             query: User question/query
             top_k: Number of chunks to retrieve
+            retrieval: Already-retrieved result for the query; skips a second retrieval
+            max_tokens: Optional token budget for the context, see `assemble_context`
             
         Returns:
             Formatted context string
         """
-        relevant_chunks = self.retrieve_relevant_chunks(query, top_k)
+        if retrieval is None:
+            retrieval = self.retrieve(query, top_k)
+        return self.assemble_context(retrieval, max_tokens).text
+    
+    def assemble_context(self, retrieval: RetrievalResult, max_tokens: Optional[int] = None,
+                         min_score: Optional[float] = None, mmr_lambda: float = 0.7) -> AssembledContext:
+        """
+        Select the retrieved chunks worth sending to the LLM
+        
+        Dense results scoring below `min_score` are dropped (lexical and hybrid
+        scores are not similarities, so no cutoff applies to them). The rest are
+        ordered MMR-style, trading relevance against token overlap with chunks
+        already chosen; near-duplicates are dropped. Chunks are then added until
+        `max_tokens` is reached, cutting the last one at a word boundary if at
+        least a few dozen tokens remain.
+        
+        Args:
+            retrieval: Retrieved chunks, best first
+            max_tokens: Token budget for the formatted context, or None for no limit
+            min_score: Similarity cutoff (default: `min_score`)
+            mmr_lambda: Weight of relevance versus novelty in the MMR ordering
+            
+        Returns:
+            AssembledContext with the formatted text, the chunks used and token statistics
+        """
+        min_score = self.min_score if min_score is None else min_score
+        stats = {"chunks_retrieved": len(retrieval), "dropped_low_score": 0, "dropped_redundant": 0,
+                 "dropped_budget": 0, "truncated": 0, "baseline_tokens": estimate_tokens(self.format_context(retrieval))}
+        
+        candidates = list(range(len(retrieval)))
+        if retrieval.mode == "dense":
+            candidates = [i for i in candidates if retrieval.scores[i] >= min_score]
+            stats["dropped_low_score"] = len(retrieval) - len(candidates)
+        
+        # Relevance normalized to [0, 1] so it is comparable with overlap whatever the score scale;
+        # reranked results are ordered by cross-encoder score, the similarity cutoff above still applies
+        relevance_scores = retrieval.rerank_scores if retrieval.rerank_scores is not None else retrieval.scores
+        scores = [relevance_scores[i] for i in candidates]
+        low, high = (min(scores), max(scores)) if scores else (0.0, 0.0)
+        relevance = {i: (relevance_scores[i] - low) / (high - low) if high > low else 1.0 for i in candidates}
+        terms = {i: set(tokenize(retrieval.chunks[i])) for i in candidates}
+        
+        def overlap(i, j):
+            union = terms[i] | terms[j]
+            return len(terms[i] & terms[j]) / len(union) if union else 1.0
+        
+        selected = []
+        while candidates:
+            redundancy = {i: max((overlap(i, j) for j in selected), default=0.0) for i in candidates}
+            best = max(candidates, key=lambda i: mmr_lambda * relevance[i] - (1 - mmr_lambda) * redundancy[i])
+            candidates.remove(best)
+            if redundancy[best] >= self.redundancy_threshold:
+                stats["dropped_redundant"] += 1
+                continue
+            selected.append(best)
+        
+        assembled = AssembledContext(text="", stats=stats)
+        used_tokens = 0
+        for i in selected:
+            chunk = retrieval.chunks[i]
+            chunk_tokens = estimate_tokens(f"[Context {len(assembled.chunks) + 1}] {chunk}\n\n")
+            if max_tokens is not None and used_tokens + chunk_tokens > max_tokens:
+                remaining = max_tokens - used_tokens - estimate_tokens(f"[Context {len(assembled.chunks) + 1}] ...")
+                if remaining < 32:
+                    stats["dropped_budget"] += 1
+                    continue
+                chunk = chunk[:remaining * 4].rsplit(" ", 1)[0] + "..."
+                stats["truncated"] += 1
+            assembled.chunks.append(chunk)
+            assembled.scores.append(retrieval.scores[i])
+            assembled.metadata.append(retrieval.metadata[i])
+            used_tokens += estimate_tokens(f"[Context {len(assembled.chunks)}] {chunk}\n\n")
+        
+        assembled.text = self.format_context(assembled)
+        stats["chunks_used"] = len(assembled.chunks)
+        stats["context_tokens"] = estimate_tokens(assembled.text)
+        stats["tokens_saved"] = max(0, stats["baseline_tokens"] - stats["context_tokens"])
+        return assembled
+    
+    def format_context(self, relevant_chunks) -> str:
+        """
+        Format already-retrieved chunks into a context string
         
+        Args:
+            relevant_chunks: RetrievalResult, AssembledContext or tuples (chunk_text, similarity_score, metadata)
+            
+        Returns:
+            Formatted context string
+        """
+        if isinstance(relevant_chunks, AssembledContext):
+            relevant_chunks = list(zip(relevant_chunks.chunks, relevant_chunks.scores, relevant_chunks.metadata))
         if not relevant_chunks:
             return "No relevant information found in resume."
         
@@ -231,28 +1424,43 @@ class RAGSystem:
         
         return "\n\n".join(context_parts)
 
+# Built-in test queries, also used for backend parity checks
+TEST_QUERIES = [
+    "What programming languages does Devendra know?",
+    "Tell me about his machine learning projects",
+    "What is his educational background?",
+    "How can I contact him?",
+    "What experience does he have with computer vision?"
+]
+
 # Example usage and testing
+# Run `python rag_system.py --parity onnx-int8` to check a backend against the float model
 if __name__ == "__main__":
+    import sys
+    
     # Initialize RAG system
     rag = RAGSystem()
     
-    # Create embeddings (run this once)
-    rag.create_embeddings(force_recreate=True)
+    # Create embeddings (run this once); `--workers N` shards encoding across N processes
+    workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else None
+    rag.create_embeddings(force_recreate=True, workers=workers)
     
-    # Test queries
-    test_queries = [
-        "What programming languages does Devendra know?",
-        "Tell me about his machine learning projects",
-        "What is his educational background?",
-        "How can I contact him?",
-        "What experience does he have with computer vision?"
-    ]
+    if "--parity" in sys.argv:
+        backend = sys.argv[sys.argv.index("--parity") + 1]
+        report = rag.compare_embedding_backend(backend, TEST_QUERIES, top_k=2)
+        print(f"Parity of {backend} vs {report['reference']} (top {report['top_k']}):")
+        for entry in report["queries"]:
+            print(f"  overlap {entry['overlap']:.2f}  cosine {entry['cosine']:.4f}  "
+                  f"{entry['reference_ms']:.1f}ms -> {entry['candidate_ms']:.1f}ms  {entry['query']}")
+        print(f"Mean overlap {report['mean_overlap']:.2f}, mean cosine {report['mean_cosine']:.4f}, "
+              f"mean latency {report['mean_reference_ms']:.1f}ms -> {report['mean_candidate_ms']:.1f}ms")
+        sys.exit(0)
     
     print("=" * 60)
     print("RAG SYSTEM TEST")
     print("=" * 60)
     
-    for query in test_queries:
+    for query in TEST_QUERIES:
         print(f"\nQuery: {query}")
         print("-" * 40)
         
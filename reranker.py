@@ -0,0 +1,141 @@
+# reranker.py
+import time
+import hashlib
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from rag_system import LRUCache, normalize_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+class CrossEncoderReranker:
+    """
+    Second retrieval stage that rescores first-stage candidates with a cross-encoder
+
+    A cross-encoder reads the query and chunk together, so it orders candidates
+    better than bi-encoder cosine similarity but needs a forward pass per pair.
+    Scores are cached per (query, chunk) pair, and all uncached pairs of a call
+    are scored in one batched forward pass on a small worker pool. Callers wait
+    at most the time budget; past it they get no scores and keep the first-stage
+    order, while a pass that already started finishes in the background and
+    fills the cache for the next request.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_RERANK_MODEL, budget_ms: float = 150.0, cache_size: int = 4096,
+                 cache_ttl: Optional[float] = None, max_length: int = 256, workers: int = 1):
+        """
+        Args:
+            model_name: sentence-transformers CrossEncoder model
+            budget_ms: Default time a caller waits for scores before falling back
+            cache_size: Maximum cached (query, chunk) scores
+            cache_ttl: Optional lifetime in seconds of cached scores
+            max_length: Maximum tokens of a (query, chunk) pair
+            workers: Concurrent forward passes; each already uses several cores
+        """
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.max_length = max_length
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rerank")
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "reranked": 0, "timeouts": 0, "errors": 0, "pairs_scored": 0}
+        self.load_ms = None
+
+    @property
+    def model(self):
+        """Cross-encoder, imported and loaded on first use"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    start = time.perf_counter()
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length)
+                    self.load_ms = (time.perf_counter() - start) * 1000
+                    logger.info(f"Loaded reranker {self.model_name} in {self.load_ms:.0f}ms")
+        return self._model
+
+    @property
+    def model_loaded(self) -> bool:
+        return self._model is not None
+
+    @staticmethod
+    def _key(query: str, chunk: str) -> Tuple[str, bytes]:
+        return normalize_query(query), hashlib.blake2b(chunk.encode("utf-8"), digest_size=16).digest()
+
+    def _score(self, pairs: List[Tuple[str, str]], keys: List[Tuple[str, bytes]]) -> np.ndarray:
+        """Run one forward pass over the pairs and cache the scores"""
+        scores = np.asarray(self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False),
+                            dtype='float32').reshape(-1)
+        for key, score in zip(keys, scores):
+            self.cache.put(key, float(score))
+        with self._stats_lock:
+            self._stats["pairs_scored"] += len(pairs)
+        return scores
+
+    def _count(self, outcome: str):
+        with self._stats_lock:
+            self._stats["calls"] += 1
+            self._stats[outcome] += 1
+
+    def rerank_batch(self, queries: List[str], candidates: List[List[str]],
+                     budget_ms: Optional[float] = None) -> Tuple[Optional[List[np.ndarray]], Dict]:
+        """
+        Score each query's candidate chunks within the time budget
+
+        Args:
+            queries: Queries
+            candidates: First-stage chunk texts for each query
+            budget_ms: Time to wait for uncached scores (default: `budget_ms`)
+
+        Returns:
+            (scores, info): one score array per query, higher is more relevant, or
+            None when the budget ran out or scoring failed; info has the status
+            ("reranked", "timeout" or "error"), pair counts and elapsed milliseconds
+        """
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        start = time.perf_counter()
+        pairs = [(query, chunk) for query, chunks in zip(queries, candidates) for chunk in chunks]
+        keys = [self._key(query, chunk) for query, chunk in pairs]
+        flat = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(flat) if score is None]
+        info = {"model": self.model_name, "pairs": len(pairs), "cached_pairs": len(pairs) - len(missing),
+                "budget_ms": budget_ms, "status": "reranked"}
+
+        if missing:
+            future = self._executor.submit(self._score, [pairs[i] for i in missing], [keys[i] for i in missing])
+            try:
+                for i, score in zip(missing, future.result(timeout=budget_ms / 1000)):
+                    flat[i] = float(score)
+            except FutureTimeoutError:
+                future.cancel()  # Drops it if still queued; a running pass completes and fills the cache
+                info["status"] = "timeout"
+            except Exception as e:
+                logger.warning(f"Reranking failed, keeping first-stage order: {e}")
+                info["status"] = "error"
+
+        info["ms"] = (time.perf_counter() - start) * 1000
+        if info["status"] != "reranked":
+            self._count("timeouts" if info["status"] == "timeout" else "errors")
+            return None, info
+        self._count("reranked")
+
+        scores, offset = [], 0
+        for chunks in candidates:
+            scores.append(np.asarray(flat[offset:offset + len(chunks)], dtype='float32'))
+            offset += len(chunks)
+        return scores, info
+
+    def stats(self) -> Dict:
+        """Call outcomes, pairs scored, score cache counters and model state"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(model=self.model_name, model_loaded=self.model_loaded, load_ms=self.load_ms,
+                     budget_ms=self.budget_ms, cache=self.cache.stats())
+        return stats
@@ -0,0 +1,236 @@
+# response_cache.py
+import os
+import json
+import atexit
+import hashlib
+import threading
+import numpy as np
+import faiss
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SemanticResponseCache:
+    """
+    Cache of generated answers looked up by question similarity.
+
+    Past question embeddings live in a small FAISS inner-product index. A new
+    question reuses a stored answer when its cosine similarity to a past
+    question reaches `threshold` and the retrieved context chunks are identical,
+    so an answer is never served against a different knowledge base state.
+
+    New answers are written to disk by a background flush at most once per
+    `flush_interval` seconds and at interpreter exit, never on the request path.
+    """
+
+    def __init__(self, index_file: str = "response_cache.bin", entries_file: str = "response_cache.json",
+                 threshold: float = 0.95, max_entries: int = 500, search_k: int = 5, flush_interval: float = 5.0):
+        """
+        Args:
+            index_file: Path to save/load the FAISS index of question embeddings
+            entries_file: Path to save/load cached questions and answers
+            threshold: Minimum cosine similarity for a cache hit
+            max_entries: Maximum cached answers before evicting the least recently used
+            search_k: Number of nearest past questions checked per lookup
+            flush_interval: Seconds new answers are collected before one background write; 0 writes on every store
+        """
+        self.index_file = index_file
+        self.entries_file = entries_file
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.search_k = search_k
+        self.flush_interval = flush_interval
+        self.index = None
+        self.entries = OrderedDict()  # id -> {"question", "answer", "context_key"}, LRU order
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one writer per process
+        self._flush_timer = None
+        self._dirty = False
+
+        self.load()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def context_key(relevant_chunks: List[Tuple[str, float, Dict]]) -> str:
+        """
+        Fingerprint the retrieved chunks an answer was generated from
+
+        Args:
+            relevant_chunks: Tuples (chunk_text, similarity_score, metadata)
+
+        Returns:
+            Hex digest of the ordered chunk texts
+        """
+        digest = hashlib.sha1()
+        for chunk, _, _ in relevant_chunks:
+            digest.update(chunk.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def lookup(self, query_embedding: np.ndarray, context_key: str) -> Optional[str]:
+        """
+        Find a stored answer for a similar question with the same context
+
+        Args:
+            query_embedding: L2-normalized question embedding (None for lexical-only retrieval, never cached)
+            context_key: Fingerprint from `context_key`
+
+        Returns:
+            Cached answer, or None on a miss
+        """
+        with self._lock:
+            if query_embedding is None or self.index is None or self.index.ntotal == 0:
+                self.misses += 1
+                return None
+
+            query = np.ascontiguousarray(query_embedding.reshape(1, -1), dtype='float32')
+            similarities, ids = self.index.search(query, min(self.search_k, self.index.ntotal))
+            for similarity, entry_id in zip(similarities[0], ids[0]):
+                if similarity < self.threshold:
+                    break
+                entry = self.entries.get(int(entry_id))
+                if entry is not None and entry["context_key"] == context_key:
+                    self.entries.move_to_end(int(entry_id))
+                    self.hits += 1
+                    logger.info(f"Response cache hit (similarity {similarity:.3f}) for: '{entry['question'][:50]}...'")
+                    return entry["answer"]
+
+            self.misses += 1
+            return None
+
+    def store(self, question: str, query_embedding: np.ndarray, context_key: str, answer: str):
+        """
+        Cache a generated answer and schedule a write to disk
+
+        Args:
+            question: Original user question
+            query_embedding: L2-normalized question embedding
+            context_key: Fingerprint of the chunks used to generate the answer
+            answer: Generated answer text
+        """
+        if self.max_entries <= 0 or query_embedding is None:
+            return
+
+        with self._lock:
+            vector = np.ascontiguousarray(query_embedding.reshape(1, -1), dtype='float32')
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+
+            entry_id = self.next_id
+            self.next_id += 1
+            self.index.add_with_ids(vector, np.array([entry_id], dtype='int64'))
+            self.entries[entry_id] = {"question": question, "answer": answer, "context_key": context_key}
+
+            evicted = []
+            while len(self.entries) > self.max_entries:
+                evicted_id, _ = self.entries.popitem(last=False)
+                evicted.append(evicted_id)
+            if evicted:
+                self.index.remove_ids(np.array(evicted, dtype='int64'))
+            self._dirty = True
+
+        if self.flush_interval > 0:
+            self._schedule_flush()
+        else:
+            self.flush()
+
+    def _schedule_flush(self):
+        """Start the debounce timer unless a flush is already pending"""
+        with self._lock:
+            if self._flush_timer is not None:
+                return
+            self._flush_timer = threading.Timer(self.flush_interval, self._scheduled_flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _scheduled_flush(self):
+        with self._lock:
+            self._flush_timer = None
+        self.flush()
+
+    def clear(self):
+        """Drop all cached answers and remove the cache files"""
+        with self._flush_lock, self._lock:
+            self.index = None
+            self.entries.clear()
+            self._dirty = False
+            for path in (self.index_file, self.entries_file):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def save(self):
+        """Save the question index and entries to disk now"""
+        with self._lock:
+            self._dirty = True
+        self.flush()
+
+    def flush(self):
+        """Write the cache to disk if it changed since the last write"""
+        with self._flush_lock:
+            # Snapshot under the lock (entries are never mutated once stored), write without it
+            with self._lock:
+                if not self._dirty or self.index is None:
+                    return
+                index_bytes = faiss.serialize_index(self.index).tobytes()
+                data = {
+                    "next_id": self.next_id,
+                    "index_digest": hashlib.sha1(index_bytes).hexdigest(),
+                    "entries": [[entry_id, entry] for entry_id, entry in self.entries.items()]
+                }
+                self._dirty = False
+            try:
+                # Per-process temporary files, renamed into place, so concurrent workers never
+                # write into each other's files and a crash never leaves a half-written cache
+                tmp_suffix = f".tmp.{os.getpid()}"
+                with open(self.index_file + tmp_suffix, 'wb') as f:
+                    f.write(index_bytes)
+                with open(self.entries_file + tmp_suffix, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(self.index_file + tmp_suffix, self.index_file)
+                os.replace(self.entries_file + tmp_suffix, self.entries_file)
+            except Exception as e:
+                logger.warning(f"Could not persist response cache: {e}")
+                with self._lock:
+                    self._dirty = True
+
+    def load(self):
+        """Load the question index and entries from disk"""
+        try:
+            if os.path.exists(self.index_file) and os.path.exists(self.entries_file):
+                with open(self.index_file, 'rb') as f:
+                    index_bytes = f.read()
+                with open(self.entries_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                # Each worker rewrites both files; skip a pair whose halves came from different workers
+                digest = hashlib.sha1(index_bytes).hexdigest()
+                if data.get("index_digest", digest) != digest:
+                    logger.warning("Response cache files do not belong together; starting with an empty cache")
+                    return
+
+                self.index = faiss.deserialize_index(np.frombuffer(index_bytes, dtype='uint8'))
+                self.entries = OrderedDict((int(entry_id), entry) for entry_id, entry in data["entries"])
+                self.next_id = data["next_id"]
+                logger.info(f"Loaded {len(self.entries)} cached responses from disk")
+        except Exception as e:
+            logger.warning(f"Could not load response cache: {e}")
+            self.index = None
+            self.entries = OrderedDict()
+            self.next_id = 0
+
+    def stats(self) -> Dict:
+        """Return size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -34,6 +34,7 @@ def check_environment():
             f.write("SENDER_EMAIL=your_email@gmail.com\n")
             f.write("SENDER_PASSWORD=your_app_password\n")
             f.write("RECEIVER_EMAIL=your_email@gmail.com\n")
+            f.write("# Optional: point the outbox at a local SMTP stand-in, e.g. SMTP_HOST=localhost SMTP_PORT=1025 SMTP_USE_SSL=0\n")
         
         logger.info(f"📝 Please update {env_file} with your actual API keys")
         return False
@@ -78,6 +79,18 @@ def initialize_rag_system():
         logger.error(f"❌ Failed to initialize RAG system: {e}")
         return False
 
+def build_static_assets():
+    """Build hashed, precompressed front-end assets"""
+    logger.info("📦 Building static assets...")
+    try:
+        from static_assets import build
+        build()
+        logger.info("✅ Static assets built into dist/")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Failed to build static assets: {e}")
+        return False
+
 def main():
     """Main setup function"""
     logger.info("🚀 Setting up RAG system for your portfolio...")
@@ -97,6 +110,11 @@ def main():
         if not initialize_rag_system():
             success = False
     
+    # Step 4: Fingerprint and precompress the front end
+    if success:
+        if not build_static_assets():
+            success = False
+    
     if success:
         logger.info("\n🎉 Setup completed successfully!")
         logger.info("\n📋 Next steps:")
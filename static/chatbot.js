@@ -11,6 +11,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // RAG debug mode (set to true to see RAG retrieval info)
     const RAG_DEBUG_MODE = false;
 
+    // Streaming mode (render answer tokens as they arrive over server-sent events)
+    const STREAMING_MODE = true;
+
     // Function to add message to chat
     function addMessage(message, isUser = false, isDebug = false) {
         const messageDiv = document.createElement('div');
@@ -36,6 +39,8 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Scroll to bottom
         chatbotBody.scrollTop = chatbotBody.scrollHeight;
+        
+        return contentDiv;
     }
 
     // Function to show typing indicator
@@ -98,6 +103,79 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Function to remove the typing indicator if it is still shown
+    function removeTypingIndicator(indicator) {
+        if (indicator && indicator.parentNode) {
+            chatbotBody.removeChild(indicator);
+        }
+    }
+
+    // Function to stream the answer from /chatbot/stream
+    // Returns false if streaming is unavailable and nothing was rendered
+    async function streamResponse(message, indicator) {
+        if (!STREAMING_MODE || !window.ReadableStream || !window.TextDecoder) return false;
+        
+        const response = await fetch('/chatbot/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ question: message }),
+        });
+        
+        if (!response.ok || !response.body) return false;
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let contentDiv = null;
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Server-sent events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let eventType = 'message';
+                let dataLine = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventType = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataLine += line.slice(5).trim();
+                });
+                if (!dataLine) continue;
+                
+                const payload = JSON.parse(dataLine);
+                if (eventType === 'error') {
+                    removeTypingIndicator(indicator);
+                    addMessage("I'm having trouble connecting right now. Please try again later.");
+                    console.error('Error:', payload.error);
+                    return true;
+                }
+                if (eventType === 'done') {
+                    console.log('📊 Response streamed successfully', payload.cached ? '(cached)' : '');
+                    continue;
+                }
+                if (payload.token) {
+                    // Replace the typing indicator with the answer on the first token
+                    if (!contentDiv) {
+                        removeTypingIndicator(indicator);
+                        contentDiv = addMessage('');
+                    }
+                    contentDiv.textContent += payload.token;
+                    chatbotBody.scrollTop = chatbotBody.scrollHeight;
+                }
+            }
+        }
+        
+        removeTypingIndicator(indicator);
+        return true;
+    }
+
     // Enhanced process input function with RAG support
     async function processInput() {
         const message = userInput.value.trim();
@@ -129,6 +207,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
             }
             
+            // Stream the answer when supported, otherwise fall back to a single response
+            if (await streamResponse(message, indicator)) return;
+            
             // Call Flask API to get Gemini response
             const response = await fetch('/chatbot', {
                 method: 'POST',
@@ -141,9 +222,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const data = await response.json();
             
             // Remove typing indicator
-            if (indicator && indicator.parentNode) {
-                chatbotBody.removeChild(indicator);
-            }
+            removeTypingIndicator(indicator);
             
             // Add AI response
             if (data.response) {
@@ -159,9 +238,7 @@ document.addEventListener('DOMContentLoaded', function() {
         } catch (error) {
             console.error('Error:', error);
             // Remove typing indicator if it still exists
-            if (indicator && indicator.parentNode) {
-                chatbotBody.removeChild(indicator);
-            }
+            removeTypingIndicator(indicator);
             addMessage("I'm having trouble connecting right now. Please try again later.");
         }
     }
@@ -0,0 +1,245 @@
+# static_assets.py
+import os
+import sys
+import json
+import gzip
+import shutil
+import hashlib
+import argparse
+import mimetypes
+from typing import Dict, Optional, Tuple
+from flask import Response, request
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Build layout (python static_assets.py):
+#   dist/manifest.json          source name -> hashed name, ETag, type and encodings
+#   dist/assets/styles.<hash>.css (+ .gz / .br variants)
+#   dist/index.html               page pre-rendered against the hashed asset URLs (+ variants)
+DIST_DIR = "dist"
+MANIFEST_FILE = "manifest.json"
+ASSET_URL_PREFIX = "/assets/"
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}  # in order of preference
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# Hashed asset URLs change whenever their content does, so they can be cached forever;
+# pages and unhashed names may be stored but must be revalidated (answered by a 304)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+def hashed_name(filename: str, digest: str) -> str:
+    """styles.css -> styles.<first 12 hex digits of sha256>.css"""
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{digest[:12]}{ext}"
+
+def content_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+def compress(data: bytes, mimetype: str) -> Dict[str, bytes]:
+    """
+    Precompressed variants of a file worth serving
+
+    gzip is always built; brotli only when the optional `brotli` package is installed.
+    Binary formats that are already compressed (images, PDFs) are left alone.
+
+    Returns:
+        Encoding name -> compressed bytes, only for variants smaller than the original
+    """
+    if not mimetype.startswith(COMPRESSIBLE_TYPES):
+        return {}
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}  # mtime=0 keeps builds reproducible
+    try:
+        import brotli
+        variants["br"] = brotli.compress(data, quality=11)
+    except ImportError:
+        pass
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+def _write_file(output_dir: str, name: str, data: bytes, mimetype: str) -> Dict:
+    """Write a file and its compressed variants; return its manifest entry"""
+    path = os.path.join(output_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    variants = compress(data, mimetype)
+    for encoding, body in variants.items():
+        with open(path + ENCODING_SUFFIXES[encoding], "wb") as f:
+            f.write(body)
+    return {
+        "path": name,
+        "etag": hashlib.sha256(data).hexdigest()[:32],
+        "type": mimetype,
+        "size": len(data),
+        "encodings": {encoding: len(body) for encoding, body in variants.items()}
+    }
+
+def build(static_dir: str = "static", template_file: str = "templates/index.html", output_dir: str = DIST_DIR) -> Dict:
+    """
+    Fingerprint, precompress and pre-render the front end into `output_dir`
+
+    The build is written next to the output directory and swapped in once complete.
+
+    Args:
+        static_dir: Directory of source assets (served as /static/... before the build)
+        template_file: Jinja template of the index page; only url_for('static', ...) is available
+        output_dir: Build output directory
+
+    Returns:
+        The manifest
+    """
+    from jinja2 import Environment, FileSystemLoader
+
+    staging_dir = output_dir + ".new"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    manifest = {"assets": {}, "pages": {}, "sources": []}
+
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            source = os.path.join(dirpath, filename)
+            name = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+            entry = _write_file(os.path.join(staging_dir, "assets"), hashed_name(name, hashlib.sha256(data).hexdigest()),
+                                data, content_type(name))
+            manifest["assets"][name] = entry
+            manifest["sources"].append(source)
+
+    def url_for(endpoint: str, filename: Optional[str] = None, **values) -> str:
+        if endpoint != "static":
+            raise ValueError(f"Pre-rendered pages can only link static files, not '{endpoint}'")
+        entry = manifest["assets"].get(filename)
+        if entry is None:
+            logger.warning(f"{template_file} links missing static file '{filename}'")
+            return f"/static/{filename}"
+        return ASSET_URL_PREFIX + entry["path"]
+
+    env = Environment(loader=FileSystemLoader(os.path.dirname(template_file) or "."), autoescape=True)
+    html = env.get_template(os.path.basename(template_file)).render(url_for=url_for).encode("utf-8")
+    manifest["pages"]["index.html"] = _write_file(staging_dir, "index.html", html, "text/html")
+    manifest["sources"].append(template_file)
+
+    with open(os.path.join(staging_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    previous_dir = output_dir + ".old"
+    shutil.rmtree(previous_dir, ignore_errors=True)
+    if os.path.exists(output_dir):
+        os.replace(output_dir, previous_dir)
+    os.replace(staging_dir, output_dir)
+    shutil.rmtree(previous_dir, ignore_errors=True)
+
+    total = sum(entry["size"] for entry in manifest["assets"].values())
+    logger.info(f"Built {len(manifest['assets'])} assets ({total / 1024:.0f}KB) and "
+                f"{len(manifest['pages'])} page(s) into {output_dir}")
+    return manifest
+
+class StaticAssets:
+    """
+    Serves a build produced by `build` from memory
+
+    Every file and its precompressed variants are read once at startup, so a
+    request costs a dictionary lookup. Responses carry a strong ETag per
+    encoding and are answered with 304 Not Modified when the client already
+    has them.
+    """
+
+    def __init__(self, dist_dir: str = DIST_DIR):
+        self.dist_dir = dist_dir
+        self._assets = {}  # hashed name -> (entry, {encoding: bytes})
+        self._sources = {}  # source name -> hashed name
+        self._pages = {}  # page name -> (entry, {encoding: bytes})
+        self.load()
+
+    @property
+    def available(self) -> bool:
+        return bool(self._pages)
+
+    def load(self):
+        """(Re)load the build from disk; without one, callers fall back to live rendering"""
+        manifest_file = os.path.join(self.dist_dir, MANIFEST_FILE)
+        if not os.path.exists(manifest_file):
+            logger.warning(f"No static build in {self.dist_dir}; run `python static_assets.py` for "
+                           f"hashed, precompressed assets. Serving pages unoptimized.")
+            return
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+        assets = {entry["path"]: self._read(os.path.join(self.dist_dir, "assets"), entry)
+                  for entry in manifest["assets"].values()}
+        pages = {name: self._read(self.dist_dir, entry) for name, entry in manifest["pages"].items()}
+        self._assets, self._pages = assets, pages
+        self._sources = {name: entry["path"] for name, entry in manifest["assets"].items()}
+
+        built_at = os.path.getmtime(manifest_file)
+        stale = [source for source in manifest.get("sources", [])
+                 if os.path.exists(source) and os.path.getmtime(source) > built_at]
+        if stale:
+            logger.warning(f"Static build is older than {', '.join(stale)}; re-run `python static_assets.py`")
+        logger.info(f"Loaded static build: {len(assets)} assets, {len(pages)} page(s)")
+
+    @staticmethod
+    def _read(directory: str, entry: Dict) -> Tuple[Dict, Dict[str, bytes]]:
+        path = os.path.join(directory, entry["path"])
+        bodies = {}
+        with open(path, "rb") as f:
+            bodies["identity"] = f.read()
+        for encoding in entry["encodings"]:
+            with open(path + ENCODING_SUFFIXES[encoding], "rb") as f:
+                bodies[encoding] = f.read()
+        return entry, bodies
+
+    def url(self, filename: str) -> Optional[str]:
+        """Hashed URL of a static source file, if it is part of the build"""
+        name = self._sources.get(filename)
+        return ASSET_URL_PREFIX + name if name else None
+
+    def asset_response(self, hashed: str) -> Optional[Response]:
+        """Response for /assets/<hashed name>, cacheable forever"""
+        if hashed not in self._assets:
+            return None
+        return self._respond(*self._assets[hashed], IMMUTABLE_CACHE_CONTROL)
+
+    def source_response(self, filename: str) -> Optional[Response]:
+        """Response for an unhashed source name such as styles.css (/static/styles.css), revalidated on every use"""
+        hashed = self._sources.get(filename)
+        if hashed is None:
+            return None
+        return self._respond(*self._assets[hashed], REVALIDATE_CACHE_CONTROL)
+
+    def page_response(self, name: str = "index.html") -> Optional[Response]:
+        """Response for a pre-rendered page"""
+        if name not in self._pages:
+            return None
+        return self._respond(*self._pages[name], REVALIDATE_CACHE_CONTROL)
+
+    @staticmethod
+    def _respond(entry: Dict, bodies: Dict[str, bytes], cache_control: str) -> Response:
+        encoding = next((encoding for encoding in ENCODING_SUFFIXES
+                         if encoding in bodies and request.accept_encodings[encoding] > 0), "identity")
+        response = Response(bodies[encoding], mimetype=entry["type"])
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = cache_control
+        # Each encoding is a different representation, so it needs its own strong ETag
+        response.set_etag(entry["etag"] if encoding == "identity" else f"{entry['etag']}-{encoding}")
+        return response.make_conditional(request)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build hashed, precompressed static assets and the pre-rendered index page")
+    parser.add_argument("--static-dir", default="static")
+    parser.add_argument("--template", default="templates/index.html")
+    parser.add_argument("--output", default=DIST_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    try:
+        built = build(args.static_dir, args.template, args.output)
+    except Exception as e:
+        logger.error(f"Static build failed: {e}")
+        sys.exit(1)
+    for name, asset in sorted(built["assets"].items()):
+        sizes = ", ".join(f"{encoding} {size / 1024:.1f}KB" for encoding, size in asset["encodings"].items())
+        print(f"{name:<20} -> {asset['path']:<36} {asset['size'] / 1024:8.1f}KB  {sizes}")
@@ -0,0 +1,83 @@
+# tests/conftest.py
+import os
+import sys
+import threading
+import socketserver
+
+import pytest
+
+# The modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    """Local stand-in SMTP server that records connections and messages, or refuses senders"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.port = self.server_address[1]
+        self.reset()
+
+    def reset(self):
+        self.connections = 0
+        self.messages = []
+        self.refuse = False
+        self.received = threading.Event()
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 stub ESMTP")
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 stub")
+            elif command.startswith("MAIL") and self.server.refuse:
+                self.reply("451 try again later")
+            elif command == "DATA":
+                self.reply("354 end data with <CR><LF>.<CR><LF>")
+                body = []
+                for data in self.rfile:
+                    if data == b".\r\n":
+                        break
+                    body.append(data.decode())
+                self.server.messages.append("".join(body))
+                self.server.received.set()
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+@pytest.fixture(scope="session")
+def smtp_stub():
+    server = SMTPStub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def smtp_server(smtp_stub):
+    """The local SMTP stub, with nothing received yet"""
+    smtp_stub.reset()
+    return smtp_stub
+
+@pytest.fixture(scope="session")
+def chat_app(tmp_path_factory, smtp_stub):
+    """The Flask app on the fake LLM with lexical retrieval, so no model is downloaded, mailing the SMTP stub"""
+    pytest.importorskip("flask")
+    pytest.importorskip("flask_cors")
+    pytest.importorskip("dotenv")
+    for name, value in {"LLM_BACKEND": "fake", "RAG_RETRIEVAL_MODE": "lexical", "RAG_WARMUP": "lazy",
+                        "DATA_DIR": str(tmp_path_factory.mktemp("data"))}.items():
+        os.environ.setdefault(name, value)
+    os.environ.update({"SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(smtp_stub.port), "SMTP_USE_SSL": "0"})
+    import app
+    return app
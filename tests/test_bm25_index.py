@@ -0,0 +1,36 @@
+# tests/test_bm25_index.py
+import numpy as np
+import pytest
+
+from bm25_index import BM25Index, BM25IndexError
+
+TEXTS = ["Python and PyTorch projects", "YOLOv11n object detector", "Contact: name@example.com", "",
+         "Python Flask backend in Python"]
+
+def test_loaded_index_is_memory_mapped_and_searches_like_the_built_one(tmp_path):
+    built = BM25Index.build(TEXTS)
+    built.save(str(tmp_path / "index.bm25"))
+    loaded = BM25Index.load(str(tmp_path / "index.bm25"))
+
+    assert loaded.stats() == built.stats()
+    assert not loaded.docs.flags.owndata  # a view of the mapping, not a private copy
+    for query in ["python", "yolov11n", "name@example.com", "flask python", "unknown"]:
+        for built_array, loaded_array in zip(built.search(query, 3), loaded.search(query, 3)):
+            assert np.array_equal(built_array, loaded_array)
+    assert loaded.search("python", 3)[0].tolist() == [4, 0]
+
+def test_vocabulary_costs_its_utf8_size_not_longest_term_per_entry():
+    index = BM25Index.build(["a " * 10 + "x" * 64])
+    assert index.terms.buffer.nbytes == 1 + 64
+
+def test_rejects_older_or_truncated_files(tmp_path):
+    with open(tmp_path / "old.bm25", "wb") as f:
+        np.savez(f, terms=np.array(["python"]))
+    with pytest.raises(BM25IndexError):
+        BM25Index.load(str(tmp_path / "old.bm25"))
+
+    BM25Index.build(TEXTS).save(str(tmp_path / "index.bm25"))
+    data = (tmp_path / "index.bm25").read_bytes()
+    (tmp_path / "truncated.bm25").write_bytes(data[:-1])
+    with pytest.raises(BM25IndexError):
+        BM25Index.load(str(tmp_path / "truncated.bm25"))
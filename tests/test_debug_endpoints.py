@@ -0,0 +1,19 @@
+# tests/test_debug_endpoints.py
+import pytest
+
+@pytest.mark.parametrize("flag", [False, "false", "0", "no"])
+def test_debug_rerank_flag_off_values_do_not_rerank(chat_app, monkeypatch, flag):
+    monkeypatch.setattr(chat_app.rag_system, "rerank_results",
+                        lambda *args, **kwargs: pytest.fail("reranked although the flag was off"))
+    response = chat_app.app.test_client().post("/chatbot/debug", json={"question": "Python projects", "rerank": flag})
+
+    assert response.status_code == 200
+    assert "first_stage" not in response.get_json()
+
+def test_status_does_not_create_reranker_when_rerank_is_off(chat_app):
+    assert not chat_app.rag_system.rerank
+    response = chat_app.app.test_client().get("/rag/status")
+
+    assert response.status_code == 200
+    assert response.get_json()["reranker"] == {"enabled": False, "candidates": chat_app.rag_system.rerank_candidates}
+    assert not chat_app.rag_system.reranker_loaded
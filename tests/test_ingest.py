@@ -0,0 +1,28 @@
+# tests/test_ingest.py
+from ingest import iter_chunks
+
+PARAGRAPHS = [" ".join(f"{topic}{i}" for i in range(100)) for topic in ("alpha", "beta", "gamma", "delta", "epsilon")]
+
+def chunk_ids(tmp_path, paragraphs):
+    path = tmp_path / "notes.md"
+    path.write_text("# Projects\n\n" + "\n\n".join(paragraphs) + "\n")
+    return [chunk["id"] for chunk in iter_chunks([str(path)])]
+
+def test_editing_one_paragraph_changes_only_its_chunk_id(tmp_path):
+    before = chunk_ids(tmp_path, PARAGRAPHS)
+    edited = PARAGRAPHS[:2] + [PARAGRAPHS[2].replace("gamma7", "gamma seven")] + PARAGRAPHS[3:]
+    after = chunk_ids(tmp_path, edited)
+
+    assert len(before) == len(after) == len(PARAGRAPHS)
+    assert [old != new for old, new in zip(before, after)] == [False, False, True, False, False]
+
+def test_removing_a_paragraph_keeps_later_chunk_ids(tmp_path):
+    before = chunk_ids(tmp_path, PARAGRAPHS)
+    after = chunk_ids(tmp_path, PARAGRAPHS[:1] + PARAGRAPHS[2:])
+
+    assert set(before) - set(after) == {before[1]}
+    assert set(after) <= set(before)
+
+def test_repeated_text_gets_distinct_ids(tmp_path):
+    ids = chunk_ids(tmp_path, [PARAGRAPHS[0], PARAGRAPHS[0]])
+    assert len(ids) == len(set(ids)) == 2
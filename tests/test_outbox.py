@@ -0,0 +1,78 @@
+# tests/test_outbox.py
+import time
+import sqlite3
+from contextlib import closing
+
+from outbox import EmailOutbox, OutboxSender
+
+def outbox_rows(outbox: EmailOutbox):
+    with closing(sqlite3.connect(outbox.db_file)) as conn:
+        return conn.execute("SELECT subject, status, attempts, next_attempt_at FROM outbox ORDER BY id").fetchall()
+
+def queue(outbox: EmailOutbox, count: int):
+    for i in range(count):
+        outbox.enqueue("site@example.com", "owner@example.com", f"Message {i}", f"Body {i}")
+
+def test_batch_is_sent_over_one_connection(smtp_server, tmp_path):
+    outbox = EmailOutbox(str(tmp_path / "outbox.db"))
+    sender = OutboxSender(outbox, host="127.0.0.1", port=smtp_server.port, use_ssl=False)
+    queue(outbox, 3)
+
+    assert sender.send_batch() == 3
+    assert len(smtp_server.messages) == 3
+    assert smtp_server.connections == 1
+    assert outbox.stats() == {"sent": 3}
+
+    queue(outbox, 2)
+    assert sender.send_batch() == 2
+    assert smtp_server.connections == 1  # the idle connection is reused for the next batch
+    sender.stop()
+
+def test_refused_batch_is_retried_with_backoff(smtp_server, tmp_path):
+    outbox = EmailOutbox(str(tmp_path / "outbox.db"))
+    sender = OutboxSender(outbox, host="127.0.0.1", port=smtp_server.port, use_ssl=False, base_backoff=0.2)
+    queue(outbox, 3)
+    smtp_server.refuse = True
+
+    assert sender.send_batch() == 3
+    first, *rest = outbox_rows(outbox)
+    # The failed message waits out its backoff; the rest of the batch is released without counting an attempt
+    assert first[1:3] == ("pending", 1) and first[3] > time.time()
+    assert [row[1:3] for row in rest] == [("pending", 0), ("pending", 0)]
+
+    smtp_server.refuse = False
+    assert sender.send_batch() == 2
+    assert [row[1] for row in outbox_rows(outbox)] == ["pending", "sent", "sent"]
+
+    time.sleep(0.25)
+    assert sender.send_batch() == 1
+    assert outbox.stats() == {"sent": 3}
+    assert all(any(f"Subject: Message {i}" in message for message in smtp_server.messages) for i in range(3))
+    sender.stop()
+
+def test_refused_message_is_given_up_after_max_attempts(smtp_server, tmp_path):
+    outbox = EmailOutbox(str(tmp_path / "outbox.db"))
+    sender = OutboxSender(outbox, host="127.0.0.1", port=smtp_server.port, use_ssl=False,
+                          max_attempts=2, base_backoff=0.01)
+    queue(outbox, 1)
+    smtp_server.refuse = True
+
+    sender.send_batch()
+    time.sleep(0.02)
+    sender.send_batch()
+    assert outbox.stats() == {"failed": 1}
+    assert smtp_server.messages == []
+    sender.stop()
+
+def test_contact_is_accepted_and_delivered_in_background(chat_app, smtp_server, monkeypatch):
+    monkeypatch.setenv("SENDER_EMAIL", "site@example.com")
+    monkeypatch.setenv("SENDER_PASSWORD", "secret")
+    assert (chat_app.email_sender.port, chat_app.email_sender.use_ssl) == (smtp_server.port, False)
+
+    response = chat_app.app.test_client().post("/contact", json={"name": "Ada", "email": "ada@example.com",
+                                                                 "message": "Hello there"})
+
+    assert response.status_code == 202
+    assert smtp_server.received.wait(5)
+    assert "New message from Ada (ada@example.com)" in smtp_server.messages[0]
+    chat_app.email_sender.stop()
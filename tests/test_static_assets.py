@@ -0,0 +1,32 @@
+# tests/test_static_assets.py
+import pytest
+
+@pytest.fixture
+def built_app(chat_app, tmp_path, monkeypatch):
+    """The app serving a fresh build of static/ and templates/index.html"""
+    from static_assets import StaticAssets, build
+    build(output_dir=str(tmp_path / "dist"))
+    monkeypatch.setattr(chat_app, "static_assets", StaticAssets(str(tmp_path / "dist")))
+    return chat_app
+
+def test_static_url_is_served_precompressed_with_strong_etag(built_app):
+    client = built_app.app.test_client()
+    response = client.get("/static/styles.css", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Cache-Control"] == "no-cache"
+    etag, weak = response.get_etag()
+    assert etag and not weak
+
+    revalidated = client.get("/static/styles.css", headers={"Accept-Encoding": "gzip", "If-None-Match": f'"{etag}"'})
+    assert revalidated.status_code == 304
+
+def test_static_url_falls_back_to_source_without_build(chat_app, tmp_path, monkeypatch):
+    from static_assets import StaticAssets
+    monkeypatch.setattr(chat_app, "static_assets", StaticAssets(str(tmp_path / "missing")))
+    client = chat_app.app.test_client()
+
+    assert client.get("/static/styles.css").status_code == 200
+    assert client.get("/styles.css").status_code == 200
+    assert client.get("/static/../app.py").status_code == 404
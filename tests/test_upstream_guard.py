@@ -0,0 +1,232 @@
+# tests/test_upstream_guard.py
+import time
+import asyncio
+import threading
+
+import pytest
+
+from fake_llm import FakeGenerativeModel
+from metrics import STAGE_SECONDS
+from upstream_guard import UpstreamGuard, UpstreamUnavailable
+
+def hold_slot(guard: UpstreamGuard, llm: FakeGenerativeModel) -> threading.Thread:
+    """Occupy one concurrency slot with a slow fake LLM call running in the background"""
+    active = guard.active
+    thread = threading.Thread(target=guard.call, args=(llm.generate_content, "hold"), daemon=True)
+    thread.start()
+    while guard.active == active:
+        time.sleep(0.001)
+    return thread
+
+def reason(func, *args, **kwargs) -> str:
+    with pytest.raises(UpstreamUnavailable) as excinfo:
+        func(*args, **kwargs)
+    return excinfo.value.reason
+
+def test_call_returns_upstream_result_and_frees_slot():
+    guard = UpstreamGuard("test-ok", max_concurrency=2)
+    response = guard.call(FakeGenerativeModel(latency_ms=5).generate_content, "hello")
+
+    assert response.text.startswith("Fake answer")
+    assert guard.stats()["in_flight"] == 0
+    assert guard.stats()["calls"]["success"] == 1
+
+def test_sheds_when_queue_is_full():
+    guard = UpstreamGuard("test-queue-full", max_concurrency=1, max_queue=0)
+    holder = hold_slot(guard, FakeGenerativeModel(latency_ms=300))
+
+    start = time.perf_counter()
+    assert reason(guard.call, FakeGenerativeModel(latency_ms=5).generate_content, "shed") == "queue_full"
+    assert time.perf_counter() - start < 0.1  # rejected immediately, not after waiting
+    assert guard.stats()["shed"]["queue_full"] == 1
+
+    holder.join()
+    assert guard.active == 0
+
+def test_sheds_after_queue_timeout():
+    guard = UpstreamGuard("test-queue-timeout", max_concurrency=1, max_queue=4, queue_timeout=0.05)
+    holder = hold_slot(guard, FakeGenerativeModel(latency_ms=300))
+
+    start = time.perf_counter()
+    assert reason(guard.call, FakeGenerativeModel(latency_ms=5).generate_content, "wait") == "queue_timeout"
+    assert 0.04 < time.perf_counter() - start < 0.25
+    assert guard.stats()["queue_depth"] == 0
+
+    holder.join()
+    assert guard.active == 0
+
+def test_queued_call_gets_the_released_slot():
+    guard = UpstreamGuard("test-handover", max_concurrency=1, max_queue=1, queue_timeout=1.0)
+    holder = hold_slot(guard, FakeGenerativeModel(latency_ms=50))
+
+    assert guard.call(FakeGenerativeModel(latency_ms=5).generate_content, "next").text
+    holder.join()
+    assert guard.active == 0
+
+def test_deadline_abandons_slow_call_but_keeps_its_slot_until_it_returns():
+    guard = UpstreamGuard("test-deadline", max_concurrency=1, max_queue=0, deadline=0.05)
+    llm = FakeGenerativeModel(latency_ms=200)
+
+    start = time.perf_counter()
+    assert reason(guard.call, llm.generate_content, "slow") == "deadline"
+    assert time.perf_counter() - start < 0.15
+    assert guard.stats()["calls"]["deadline"] == 1
+    # The abandoned call still runs upstream, so it still counts against the limit
+    assert guard.active == 1
+    time.sleep(0.3)
+    assert guard.active == 0
+
+def test_breaker_opens_fails_fast_then_closes_after_successful_probe():
+    guard = UpstreamGuard("test-breaker", failure_threshold=2, recovery_time=0.1)
+    failing = FakeGenerativeModel(latency_ms=0, failure_rate=1.0)
+    healthy = FakeGenerativeModel(latency_ms=5)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            guard.call(failing.generate_content, "boom")
+    assert guard.state == "open"
+
+    # Open: rejected without reaching the upstream
+    assert reason(guard.call, healthy.generate_content, "fast") == "circuit_open"
+    assert healthy.calls == 0
+
+    time.sleep(0.15)
+    states = []
+
+    def probe(prompt):
+        states.append(guard.state)
+        # Only one probe is let through while half-open
+        assert reason(guard.call, healthy.generate_content, "second") == "circuit_open"
+        return healthy.generate_content(prompt)
+
+    guard.call(probe, "probe")
+    assert states == ["half_open"]
+    assert guard.state == "closed"
+    assert guard.stats()["consecutive_failures"] == 0
+    assert guard.stats()["shed"]["circuit_open"] == 2
+
+def test_failed_probe_reopens_breaker():
+    guard = UpstreamGuard("test-breaker-reopen", failure_threshold=1, recovery_time=0.05)
+    failing = FakeGenerativeModel(latency_ms=0, failure_rate=1.0)
+
+    with pytest.raises(RuntimeError):
+        guard.call(failing.generate_content, "boom")
+    time.sleep(0.08)
+    with pytest.raises(RuntimeError):
+        guard.call(failing.generate_content, "probe")
+
+    assert guard.state == "open"
+    assert reason(guard.call, failing.generate_content, "again") == "circuit_open"
+
+def test_stream_releases_slot_when_exhausted_or_closed():
+    guard = UpstreamGuard("test-stream", max_concurrency=1, max_queue=0)
+    llm = FakeGenerativeModel(latency_ms=40, stream_chunks=4)
+
+    chunks = guard.stream(lambda: llm.generate_content("p", stream=True))
+    assert guard.active == 1
+    assert reason(guard.stream, lambda: llm.generate_content("p", stream=True)) == "queue_full"
+    assert "".join(chunk.text for chunk in chunks).startswith("Fake answer")
+    assert guard.active == 0
+
+    chunks = guard.stream(lambda: llm.generate_content("p", stream=True))
+    next(chunks)
+    chunks.close()
+    assert guard.active == 0
+    assert guard.state == "closed"
+
+class StallingStream:
+    """Yields `before` chunks, then blocks on each read for `stall` seconds; records whether it was closed"""
+
+    def __init__(self, before: int, stall: float):
+        self.before = before
+        self.stall = stall
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed.is_set():
+            raise StopIteration
+        if self.before:
+            self.before -= 1
+        else:
+            time.sleep(self.stall)
+        return "chunk"
+
+    def close(self):
+        self.closed.set()
+
+def test_stream_stalling_mid_way_is_cut_off_at_deadline():
+    guard = UpstreamGuard("test-stream-stall", max_concurrency=1, deadline=0.1)
+    upstream = StallingStream(before=2, stall=0.3)
+
+    chunks = guard.stream(lambda: upstream)
+    start = time.perf_counter()
+    assert reason(list, chunks) == "deadline"
+    assert time.perf_counter() - start < 0.25  # not held for the whole stalled read
+    assert guard.active == 1  # the stalled read still occupies the upstream
+
+    assert upstream.closed.wait(1)
+    time.sleep(0.01)
+    assert guard.active == 0
+    chunks.close()  # consumer cleanup after the deadline is harmless
+    assert guard.stats()["calls"]["deadline"] == 1
+
+def test_stream_missing_first_chunk_deadline_is_closed_once_started():
+    guard = UpstreamGuard("test-stream-first", max_concurrency=1, deadline=0.05)
+    upstream = StallingStream(before=0, stall=0.2)
+
+    assert reason(guard.stream, lambda: upstream) == "deadline"
+    assert upstream.closed.wait(1)
+    time.sleep(0.01)
+    assert guard.active == 0
+
+def test_async_call_is_cancelled_at_deadline_and_sheds_when_full():
+    async def scenario():
+        guard = UpstreamGuard("test-async", max_concurrency=1, max_queue=0, deadline=0.05)
+        slow = FakeGenerativeModel(latency_ms=1000)
+
+        start = time.perf_counter()
+        with pytest.raises(UpstreamUnavailable) as excinfo:
+            await guard.call_async(lambda: slow.generate_content_async("slow"))
+        assert excinfo.value.reason == "deadline"
+        assert time.perf_counter() - start < 0.5
+        assert guard.active == 0  # cancelled, so the slot is free at once
+
+        fast = FakeGenerativeModel(latency_ms=50)
+        results = await asyncio.gather(
+            guard.call_async(lambda: fast.generate_content_async("a"), deadline=1),
+            guard.call_async(lambda: fast.generate_content_async("b"), deadline=1),
+            return_exceptions=True
+        )
+        assert sorted(type(result).__name__ for result in results) == ["FakeResponse", "UpstreamUnavailable"]
+        assert guard.active == 0
+
+    asyncio.run(scenario())
+
+def test_chatbot_serves_retrieval_only_answer_when_llm_is_shed(chat_app, monkeypatch):
+    guard = UpstreamGuard("test-chatbot", failure_threshold=1, recovery_time=60)
+    with pytest.raises(RuntimeError):
+        guard.call(FakeGenerativeModel(latency_ms=0, failure_rate=1.0).generate_content, "boom")
+    monkeypatch.setattr(chat_app, "llm_guard", guard)
+    monkeypatch.setattr(chat_app.response_cache, "lookup", lambda *args, **kwargs: None)
+    stored = []
+    monkeypatch.setattr(chat_app.response_cache, "store", lambda *args, **kwargs: stored.append(args))
+    llm_samples = STAGE_SECONDS.count("llm")
+
+    response = chat_app.app.test_client().post("/chatbot", json={"question": "What projects has Devendra built?"})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["degraded"] is True
+    assert body["reason"] == "circuit_open"
+    assert body["response"].startswith("The AI assistant is busy right now")
+    assert "[Context" not in body["response"]
+    assert len(body["response"]) > len(chat_app.DEGRADED_RESPONSE.format(context=""))
+    assert stored == []  # degraded answers are never cached
+    assert STAGE_SECONDS.count("llm") == llm_samples  # shed calls are not LLM latency
+
+def test_degraded_answer_without_retrieved_chunks(chat_app):
+    empty = chat_app.RetrievalResult(query="anything", top_k=3, mode="lexical")
+    assert chat_app.degraded_answer("anything", empty) == chat_app.DEGRADED_EMPTY_RESPONSE
@@ -0,0 +1,464 @@
+# upstream_guard.py
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterable, Optional
+import logging
+
+from metrics import registry, observe_stage
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_STATES = ("closed", "half_open", "open")
+
+_guards = []  # every UpstreamGuard, for the gauges below
+
+UPSTREAM_SHED = registry.counter("upstream_shed_total", "Upstream calls rejected by admission control",
+                                 ("upstream", "reason"))
+UPSTREAM_CALLS = registry.counter("upstream_calls_total", "Admitted upstream calls by outcome", ("upstream", "outcome"))
+registry.gauge("upstream_in_flight", "Upstream calls holding a concurrency slot", ("upstream",),
+               callback=lambda: {(guard.name,): guard.active for guard in _guards})
+registry.gauge("upstream_queue_depth", "Calls waiting for an upstream concurrency slot", ("upstream",),
+               callback=lambda: {(guard.name,): len(guard._waiters) for guard in _guards})
+registry.gauge("upstream_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("upstream",),
+               callback=lambda: {(guard.name,): CIRCUIT_STATES.index(guard.state) for guard in _guards})
+
+class UpstreamUnavailable(Exception):
+    """
+    An upstream call was shed or gave up
+
+    `reason` is one of "queue_full", "queue_timeout", "circuit_open" or "deadline".
+    """
+
+    def __init__(self, upstream: str, reason: str):
+        super().__init__(f"{upstream} unavailable: {reason.replace('_', ' ')}")
+        self.upstream = upstream
+        self.reason = reason
+
+class UpstreamGuard:
+    """
+    Admission control, deadlines and a circuit breaker around one upstream dependency
+
+    At most `max_concurrency` calls run at once; up to `max_queue` more wait in
+    FIFO order for at most `queue_timeout` seconds, and anything beyond that is
+    shed immediately. Every call has a deadline covering queueing and the call
+    itself. After `failure_threshold` consecutive errors or deadline misses the
+    circuit opens and calls fail fast for `recovery_time` seconds, then a single
+    probe call decides whether it closes again. Rejections raise
+    UpstreamUnavailable so callers can degrade instead of piling up.
+
+    Sync calls run on a worker pool so the caller can stop waiting at the
+    deadline; the slot is only freed when the upstream call actually returns,
+    so abandoned calls still count against the concurrency limit. Async calls
+    are cancelled at the deadline.
+    """
+
+    def __init__(self, name: str = "llm", max_concurrency: int = 8, max_queue: int = 16, queue_timeout: float = 2.0,
+                 deadline: float = 20.0, failure_threshold: int = 5, recovery_time: float = 30.0):
+        """
+        Args:
+            name: Upstream name used in logs and metric labels
+            max_concurrency: Calls allowed in flight at once
+            max_queue: Calls allowed to wait for a slot; further calls are shed
+            queue_timeout: Longest wait for a slot, in seconds
+            deadline: Default time budget of a call including queueing, in seconds
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_time: Seconds the circuit stays open before a probe call is let through
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.active = 0
+        self.state = "closed"
+        self._waiters = deque()  # wake-up callbacks of queued callers, oldest first
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"{name}-upstream")
+        _guards.append(self)
+
+    # Admission
+
+    def _shed(self, reason: str):
+        UPSTREAM_SHED.inc(self.name, reason)
+        raise UpstreamUnavailable(self.name, reason)
+
+    def _try_admit(self, wake: Callable[[], bool]) -> bool:
+        """Take a slot, or queue `wake` for one (lock held); raises when shedding"""
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.recovery_time:
+                self._shed("circuit_open")
+            self.state = "half_open"
+            logger.info(f"{self.name} circuit half-open; letting a probe call through")
+        if self.state == "half_open":
+            # One probe at a time, and only with a free slot so it is never left queued
+            if self._probing or self.active >= self.max_concurrency:
+                self._shed("circuit_open")
+            self._probing = True
+            self.active += 1
+            return True
+        if self.active < self.max_concurrency:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self._shed("queue_full")
+        self._waiters.append(wake)
+        return False
+
+    def _abandon(self, wake: Callable[[], bool]):
+        """Give up waiting unless a slot was already handed over"""
+        with self._lock:
+            if wake in self._waiters:
+                self._waiters.remove(wake)
+                self._shed("queue_timeout")
+
+    def _release(self):
+        """Hand the slot to the oldest waiter that can still take it, or free it"""
+        with self._lock:
+            while self._waiters:
+                if self._waiters.popleft()():
+                    return
+            self.active -= 1
+
+    def _deadline_at(self, deadline: Optional[float]) -> float:
+        return time.monotonic() + (self.deadline if deadline is None else deadline)
+
+    def _enter(self, deadline_at: float):
+        start = time.monotonic()
+        event = threading.Event()
+
+        def wake() -> bool:
+            event.set()
+            return True
+
+        with self._lock:
+            admitted = self._try_admit(wake)
+        if not admitted and not event.wait(max(0.0, min(self.queue_timeout, deadline_at - start))):
+            self._abandon(wake)
+        observe_stage(f"{self.name}_queue", time.monotonic() - start)
+
+    async def _enter_async(self, deadline_at: float):
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake() -> bool:
+            try:
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+                return True
+            except RuntimeError:  # loop closed; pass the slot on
+                return False
+
+        with self._lock:
+            admitted = self._try_admit(wake)
+        if not admitted:
+            # asyncio.wait leaves the future alone on timeout, so a late hand-over is never lost
+            await asyncio.wait({future}, timeout=max(0.0, min(self.queue_timeout, deadline_at - start)))
+            if not future.done():
+                self._abandon(wake)
+        observe_stage(f"{self.name}_queue", time.monotonic() - start)
+
+    # Circuit breaker
+
+    def _record(self, outcome: str):
+        UPSTREAM_CALLS.inc(self.name, outcome)
+        with self._lock:
+            self._probing = False
+            if outcome == "success":
+                if self.state != "closed":
+                    logger.info(f"{self.name} circuit closed after a successful probe")
+                self.state = "closed"
+                self._failures = 0
+                return
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"{self.name} circuit open after {self._failures} consecutive failure(s); "
+                                   f"failing fast for {self.recovery_time:g}s")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def _forget_probe(self):
+        """A call ended without telling whether the upstream is healthy (e.g. the client went away)"""
+        with self._lock:
+            self._probing = False
+
+    # Calls
+
+    def call(self, func: Callable[..., Any], *args, deadline: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run a blocking upstream call under admission control and a deadline
+
+        Raises:
+            UpstreamUnavailable: If the call was shed or missed its deadline;
+                errors raised by `func` propagate unchanged
+        """
+        deadline_at = self._deadline_at(deadline)
+        self._enter(deadline_at)
+        future = self._executor.submit(func, *args, **kwargs)
+        future.add_done_callback(lambda _: self._release())
+        try:
+            result = future.result(timeout=max(0.0, deadline_at - time.monotonic()))
+        except FutureTimeoutError:
+            self._record("deadline")
+            raise UpstreamUnavailable(self.name, "deadline")
+        except Exception:
+            self._record("error")
+            raise
+        self._record("success")
+        return result
+
+    def stream(self, start: Callable[[], Iterable], deadline: Optional[float] = None) -> "GuardedStream":
+        """
+        Start a streaming upstream call and wait for its first chunk
+
+        Admission, the circuit and the time to first chunk are checked before
+        this returns, so callers can still fall back before sending anything.
+        Later chunks are read on the worker pool too, so a stream that stalls
+        mid-way is cut off at the deadline.
+
+        Args:
+            start: Starts the call and returns an iterable of chunks
+
+        Raises:
+            UpstreamUnavailable: If the call was shed or no chunk arrived before the deadline
+        """
+        deadline_at = self._deadline_at(deadline)
+        self._enter(deadline_at)
+
+        def first():
+            iterator = iter(start())
+            return iterator, next(iterator, GuardedStream.END)
+
+        def abandoned(future):
+            # The caller gave up; stop the stream once it has started instead of letting it read on
+            if future.exception() is None:
+                _close(future.result()[0])
+            self._release()
+
+        future = self._executor.submit(first)
+        try:
+            iterator, head = future.result(timeout=max(0.0, deadline_at - time.monotonic()))
+        except FutureTimeoutError:
+            future.add_done_callback(abandoned)
+            self._record("deadline")
+            raise UpstreamUnavailable(self.name, "deadline")
+        except Exception:
+            self._release()
+            self._record("error")
+            raise
+        return GuardedStream(self, iterator, head, deadline_at)
+
+    async def call_async(self, start: Callable[[], Any], deadline: Optional[float] = None) -> Any:
+        """
+        Await an upstream coroutine under admission control; it is cancelled at the deadline
+
+        Args:
+            start: Returns the coroutine to await, e.g. `lambda: model.generate_content_async(prompt)`
+
+        Raises:
+            UpstreamUnavailable: If the call was shed or missed its deadline
+        """
+        deadline_at = self._deadline_at(deadline)
+        await self._enter_async(deadline_at)
+        try:
+            result = await asyncio.wait_for(start(), timeout=max(0.0, deadline_at - time.monotonic()))
+        except asyncio.TimeoutError:
+            self._record("deadline")
+            raise UpstreamUnavailable(self.name, "deadline")
+        except asyncio.CancelledError:
+            self._forget_probe()
+            raise
+        except Exception:
+            self._record("error")
+            raise
+        finally:
+            self._release()
+        self._record("success")
+        return result
+
+    async def stream_async(self, start: Callable[[], Any], deadline: Optional[float] = None) -> "AsyncGuardedStream":
+        """
+        Async counterpart of `stream`
+
+        Args:
+            start: Returns a coroutine resolving to an async iterable of chunks
+        """
+        deadline_at = self._deadline_at(deadline)
+        await self._enter_async(deadline_at)
+        try:
+            response = await asyncio.wait_for(start(), timeout=max(0.0, deadline_at - time.monotonic()))
+            iterator = response.__aiter__()
+            try:
+                head = await asyncio.wait_for(iterator.__anext__(), timeout=max(0.0, deadline_at - time.monotonic()))
+            except StopAsyncIteration:
+                head = AsyncGuardedStream.END
+        except asyncio.TimeoutError:
+            self._release()
+            self._record("deadline")
+            raise UpstreamUnavailable(self.name, "deadline")
+        except asyncio.CancelledError:
+            self._release()
+            self._forget_probe()
+            raise
+        except Exception:
+            self._release()
+            self._record("error")
+            raise
+        return AsyncGuardedStream(self, iterator, head, deadline_at)
+
+    def stats(self) -> Dict:
+        """Limits, current load, circuit state and shed/outcome counters"""
+        with self._lock:
+            stats = {
+                "in_flight": self.active,
+                "queue_depth": len(self._waiters),
+                "circuit": self.state,
+                "consecutive_failures": self._failures
+            }
+        stats.update({
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout,
+            "deadline_s": self.deadline,
+            "shed": {reason: UPSTREAM_SHED.value(self.name, reason)
+                     for reason in ("queue_full", "queue_timeout", "circuit_open")},
+            "calls": {outcome: UPSTREAM_CALLS.value(self.name, outcome) for outcome in ("success", "error", "deadline")}
+        })
+        return stats
+
+def _close(iterator):
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+
+class GuardedStream:
+    """
+    Chunks of an admitted streaming call; frees the slot when exhausted, failed or closed
+
+    Each chunk is read on the guard's worker pool and must arrive before the
+    deadline. A read that misses it keeps the slot until it returns and then
+    closes the upstream stream. Consumers that may stop early should call
+    `close` (e.g. in a finally block).
+    """
+
+    END = object()
+
+    def __init__(self, guard: UpstreamGuard, iterator, head, deadline_at: float):
+        self._guard = guard
+        self._iterator = iterator
+        self._head = head
+        self._deadline_at = deadline_at
+        self._done = False
+        self._stalled = False  # a read missed the deadline and is still running
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        if self._head is not None:
+            chunk, self._head = self._head, None
+        else:
+            future = self._guard._executor.submit(next, self._iterator, self.END)
+            try:
+                chunk = future.result(timeout=max(0.0, self._deadline_at - time.monotonic()))
+            except FutureTimeoutError:
+                self._done = self._stalled = True
+                self._guard._record("deadline")
+                future.add_done_callback(lambda _: self._abandon())
+                raise UpstreamUnavailable(self._guard.name, "deadline")
+            except Exception:
+                self._finish("error")
+                raise
+        if chunk is self.END:
+            self._finish("success")
+            raise StopIteration
+        return chunk
+
+    def _finish(self, outcome: Optional[str]):
+        if self._done:
+            return
+        self._done = True
+        self._guard._release()
+        if outcome is None:
+            self._guard._forget_probe()
+        else:
+            self._guard._record(outcome)
+
+    def _abandon(self):
+        """The read that missed the deadline returned; stop the stream and free its slot"""
+        _close(self._iterator)
+        self._guard._release()
+
+    def close(self):
+        """Stop early; the upstream is not blamed"""
+        self._finish(None)
+        if not self._stalled:  # a stalled read closes the stream itself when it returns
+            _close(self._iterator)
+
+    def __del__(self):
+        # Safety net for consumers that never finished or closed the stream
+        if not self._done:
+            self._finish(None)
+
+class AsyncGuardedStream:
+    """Async counterpart of GuardedStream; each chunk must arrive before the deadline"""
+
+    END = GuardedStream.END
+
+    def __init__(self, guard: UpstreamGuard, iterator, head, deadline_at: float):
+        self._guard = guard
+        self._iterator = iterator
+        self._head = head
+        self._deadline_at = deadline_at
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._done:
+            raise StopAsyncIteration
+        if self._head is not None:
+            chunk, self._head = self._head, None
+        else:
+            try:
+                chunk = await asyncio.wait_for(self._iterator.__anext__(),
+                                               timeout=max(0.0, self._deadline_at - time.monotonic()))
+            except StopAsyncIteration:
+                chunk = self.END
+            except asyncio.TimeoutError:
+                self._finish("deadline")
+                raise UpstreamUnavailable(self._guard.name, "deadline")
+            except asyncio.CancelledError:
+                self._finish(None)
+                raise
+            except Exception:
+                self._finish("error")
+                raise
+        if chunk is self.END:
+            self._finish("success")
+            raise StopAsyncIteration
+        return chunk
+
+    _finish = GuardedStream._finish
+
+    async def aclose(self):
+        """Stop early; the upstream is not blamed"""
+        self._finish(None)
+        aclose = getattr(self._iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    def __del__(self):
+        if not self._done:
+            self._finish(None)